@@ -1,203 +1,261 @@
 import argparse
-import time
+import sys
 
-import numpy as np
-import pyvisa
+import mpptlib
 
 # Parse folder path, file name, and measurement parameters from command line
 # arguments. Remember to include the "python" keyword before the call to the
 # python file from the command line, e.g. python example.py "arg1" "arg2".
-# Folder paths must use forward slashes to separate subfolders.
+# Folder paths must use forward slashes to separate subfolders. The
+# positional arguments aren't needed in server mode, where the same values
+# are sent with each track command instead (see
+# mpptlib.MaxPowerPointTracker.serve).
 parser = argparse.ArgumentParser(description='Process data files')
 parser.add_argument(
     'folder_path',
     metavar='folder_path',
+    nargs='?',
     type=str,
     help='Absolute path to the folder containing max P stabilisation data')
 parser.add_argument('file_name',
                     metavar='file_name',
+                    nargs='?',
                     type=str,
                     help='Name of the file to save the data to')
 parser.add_argument('initial_V',
                     metavar='initial_V',
+                    nargs='?',
                     type=float,
                     help='Seed voltage for max power tracker')
 parser.add_argument('t_track',
                     metavar='t_track',
+                    nargs='?',
                     type=float,
                     help='Time in seconds to track max power for')
 parser.add_argument('area',
                     metavar='area',
+                    nargs='?',
                     type=float,
                     help='Device area in cm^2')
 parser.add_argument('num_of_suns',
                     metavar='num_of_suns',
+                    nargs='?',
                     type=float,
                     help='Number of suns equivalent illumination intensity')
-args = parser.parse_args()
-
-# Filepath for saving data
-folderpath = args.folder_path
-filename = args.file_name
-# folderpath = r'C:/SolarSimData/James B/2016/11-Nov/01-11-2016 Manual test2/Max P Stabilisation/'
-# filename = r'x_1_Light_scan0_MaxPStab.txt'
-
-# Assign the VISA resource to a variable
-rm = pyvisa.ResourceManager()
-keithley2400 = rm.open_resource('GPIB0::24::INSTR')
-keithley2400.query('*IDN?')
-keithley2400.write('*RST')
-keithley2400.encoding = 'latin-1'
-
-# Settings
-V_range = 2  # voltage range
-I_range = 0.1  # current range
-compliance_I = 0.1  # compliance level
-initial_V = args.initial_V
-nplc = 0.01  # integration filter number of power-line cycles
-delay = 0  # source delay in seconds
-t_track = args.t_track
-area = args.area
-suns = args.num_of_suns
-
-# Initialise Keithley
-keithley2400.write('OUTP OFF')  # Disable the output
-keithley2400.write(':SYST:RSEN 1')  # Enable 4-wire sense
-keithley2400.write(':SOUR:CLE:AUTO OFF')  # Don't auto-off source after meas.
-keithley2400.write(':SOUR:FUNC VOLT')  # Set source mode to voltage
-keithley2400.write(':SOUR:VOLT:RANG ' + str(V_range))  # Set the voltage range
-keithley2400.write(':SOUR:CURR:RANG ' + str(I_range))  # Set the current range
-keithley2400.write(':SOUR:DEL ' + str(delay))  # Set the delay
-keithley2400.write(
-    ':SENS:CURR:PROT ' + str(compliance_I))  # Set the compliance
-keithley2400.write(
-    ':SENS:CURR:NPLC ' + str(nplc))  # Set the integration filter
-keithley2400.write(':DISP:ENAB 0')  # Turn off display
-
-
-# Function for tracking maximum power point
-def track_max_power(initial_V, t_track):
+parser.add_argument('--resource',
+                    type=str,
+                    default='GPIB0::24::INSTR',
+                    help='VISA resource name of the Keithley, or SIM for a '
+                    'simulated device (see mpptlib.open_keithley)')
+parser.add_argument('--channel',
+                    nargs=5,
+                    action='append',
+                    default=[],
+                    metavar=('RESOURCE', 'FILE_NAME', 'INITIAL_V', 'AREA',
+                             'NUM_OF_SUNS'),
+                    help='Track another pixel on a different Keithley at the '
+                    'same time, saving its data to FILE_NAME in folder_path. '
+                    'Can be given more than once. Only the first Keithley '
+                    'controls the shutter.')
+parser.add_argument('--buffered',
+                    action='store_true',
+                    help='Source short voltage lists from the Keithley source '
+                    'memory and read back each block of readings in one '
+                    'transfer instead of one query per point')
+parser.add_argument('--block_size',
+                    type=int,
+                    default=10,
+                    help='Number of points per buffered transfer (2-100)')
+parser.add_argument('--pipelined',
+                    action='store_true',
+                    help='Talk to the Keithley from an acquisition thread and '
+                    'parse readings and update the setpoint in a separate '
+                    'consumer, then print per-stage latencies')
+parser.add_argument('--algorithm',
+                    default=None,
+                    choices=list(mpptlib.ALGORITHMS),
+                    help='Tracking algorithm: steepest descent (steepest), '
+                    'adaptive-step perturb and observe (po), incremental '
+                    'conductance (inccond), or steepest descent with a '
+                    'gradient-scaled step (adaptive). Defaults to inccond '
+                    'with --pipelined and steepest otherwise')
+parser.add_argument('--rate_test',
+                    action='store_true',
+                    help='Measure and print the points per second of the '
+                    'per-point and buffered modes in the dark before tracking')
+parser.add_argument('--flush_points',
+                    type=int,
+                    default=1000,
+                    help='Maximum number of points held in memory before '
+                    'they are written to the data file')
+parser.add_argument('--flush_interval',
+                    type=float,
+                    default=5,
+                    help='Maximum time in seconds between writes to the data '
+                    'file')
+parser.add_argument('--output_interval',
+                    type=float,
+                    default=None,
+                    help='Record one row of averages per interval of this '
+                    'many seconds instead of every point, while still '
+                    'tracking at full speed')
+parser.add_argument('--aggregates',
+                    action='store_true',
+                    help='Add the minimum and maximum of each quantity and '
+                    'the number of points to every row recorded with '
+                    '--output_interval')
+parser.add_argument('--server',
+                    action='store_true',
+                    help='Keep the Keithley open and configured and run '
+                    'track commands from stdin, or from TCP clients if '
+                    '--port is given, until told to quit')
+parser.add_argument('--port',
+                    type=int,
+                    default=None,
+                    help='Local TCP port to listen on in server mode')
+parser.add_argument('--fsync',
+                    action='store_true',
+                    help='Force every write of the data file to disk')
+
+
+def main(argv=None):
     """
-    Function for tracking the maximum power point of a solar cell starting at
-    the seed voltage (initial_V) for a fixed amount of time (t_track), taking
-    as many measurements as possible.
-
-    Tracking is based on the method of steepest descent as follows:
-
-    V_i+1 = V_i - a * (P_i - P_i-1) / (V_i - V_i-1)
-
-    where V is the applied voltage, P is the power output, i is the current
-    time step, i-1 is the previous step, and i+1 will be the next step. The
-    learning rate, a, limits or increases the step size and should be tuned to
-    ensure the voltage step can update fast enough to follow changes in the
-    output but without overshooting. When the voltage stabilises at the
-    maximum power point (V_i+1 = V_i) a small purturbation is either added or
-    subtracted randomly to ensure that the algorithm can still track changes
-    after a period of stability.
+    Run the max power point tracker with the command line arguments in argv
+    (sys.argv by default).
     """
 
-    # Initialise empty lists for storing data
-    times = []
-    voltages = []
-    currents = []
-    powers = []
-    current_densities = []
-    efficiencies = []
-
-    # Start timing
-    t_start = time.time()
-    t = time.time()
-
-    # Set the learning rate
-    a = 0.1
-
-    # Turn on the Keithley output at zero volts and measure for 4s in the dark
-    keithley2400.write(':SOUR:VOLT ' + '0')
-    keithley2400.write('OUTP ON')
-    while t - t_start < 3:
-        times.append(t - t_start)
-        data = keithley2400.query(':MEAS:CURR?')  # Measure the current
-        data = data.split(',')
-        data = [float(item) for item in data]
-        current_density = data[1] * 1000 / area
-        power = data[0] * data[1]
-        current = data[1]
-        voltage = data[0]
-        efficiency = np.absolute(power * 1000 * 100 / (100 * suns * area))
-        current_densities.append(current_density)
-        powers.append(power)
-        currents.append(current)
-        voltages.append(voltage)
-        efficiencies.append(efficiency)
-        t = time.time()
-
-    # Open the shutter of the solar simulator and take a few measurements
-    # around the seed voltage to initialise the tracking algorithm.
-    keithley2400.write(':SOUR2:TTL 0')  # open the shutter
-    initial_V = initial_V - 0.02
-    for i in range(2):
-        times.append(t - t_start)
-        keithley2400.write(':SOUR:VOLT ' + str(initial_V))
-        data = keithley2400.query(':MEAS:CURR?')  # Measure the current
-        data = data.split(',')
-        data = [float(item) for item in data]
-        current_density = data[1] * 1000 / area
-        power = data[0] * data[1]
-        current = data[1]
-        voltage = data[0]
-        efficiency = np.absolute(power * 1000 * 100 / (100 * suns * area))
-        current_densities.append(current_density)
-        powers.append(power)
-        currents.append(current)
-        voltages.append(voltage)
-        efficiencies.append(efficiency)
-        initial_V += 0.02
-        t = time.time()
-
-    # Start tracking the maximum point using method of steepest descent
-    i = len(voltages) - 1
-    while t - t_start < t_track + 3:
-        if voltages[i] != voltages[i - 1]:
-            dP_dV = (powers[i] - powers[i - 1]) / (
-                voltages[i] - voltages[i - 1])
+    args = parser.parse_args(argv)
+    if (not args.server) and (args.num_of_suns is None):
+        parser.error('the positional arguments are required unless --server '
+                     'is used')
+    if args.server and (len(args.channel) > 0):
+        parser.error('--channel can not be used with --server')
+    if (args.output_interval is not None) and (args.output_interval <= 0):
+        parser.error('--output_interval must be greater than zero')
+
+    # Filepath for saving data
+    folderpath = args.folder_path
+    filename = args.file_name
+    # folderpath = r'C:/SolarSimData/James B/2016/11-Nov/01-11-2016 Manual test2/Max P Stabilisation/'
+    # filename = r'x_1_Light_scan0_MaxPStab.txt'
+
+    # Settings
+    t_track = args.t_track
+    block_size = args.block_size
+    if args.buffered and args.pipelined:
+        raise ValueError(
+            '--buffered and --pipelined can not be used together')
+    elif args.buffered:
+        mode = 'buffered'
+    elif args.pipelined:
+        mode = 'pipelined'
+    else:
+        mode = 'point'
+    if (block_size < 2) or (block_size > 100):
+        # The source memory list of the 2400 holds at most 100 points
+        raise ValueError('block_size must be between 2 and 100')
+
+    # In server mode keep a single Keithley open and configured and run track
+    # commands until told to quit
+    if args.server:
+        tracker = mpptlib.MaxPowerPointTracker(
+            args.resource,
+            mode,
+            block_size,
+            algorithm=args.algorithm,
+            flush_points=args.flush_points,
+            flush_interval=args.flush_interval,
+            fsync=args.fsync,
+            output_interval=args.output_interval,
+            aggregates=args.aggregates)
+        try:
+            if args.port is None:
+                tracker.serve(sys.stdin, sys.stdout)
+            else:
+                tracker.serve_tcp(args.port)
+        finally:
+            tracker.close()
+        return
+
+    # Build a list of channels to track, one for each Keithley, with the pixel
+    # given by the positional arguments first
+    channel_args = [[args.resource, filename, args.initial_V, args.area,
+                     args.num_of_suns]] + args.channel
+
+    # Assign the VISA resources to variables, initialise the Keithleys, and
+    # stream the results of each channel to its own data file in the
+    # background while tracking
+    channels = []
+    for i, (resource, file_name, initial_V, area, suns) in enumerate(
+            channel_args):
+        keithley2400 = mpptlib.open_keithley(resource)
+        mpptlib.configure_keithley(keithley2400)
+        if args.output_interval is None:
+            decimator = None
         else:
-            dP_dV = np.sign((1 - (-1)) * np.random.random_sample() + (
-                -1)) * 0.002
-        initial_V = voltages[i] - a * dP_dV
-        times.append(t - t_start)
-        keithley2400.write(':SOUR:VOLT ' + str(initial_V))
-        data = keithley2400.query(':MEAS:CURR?')  # Measure the current
-        data = data.split(',')
-        data = [float(item) for item in data]
-        current_density = data[1] * 1000 / area
-        power = data[0] * data[1]
-        current = data[1]
-        voltage = data[0]
-        efficiency = np.absolute(power * 1000 * 100 / (100 * suns * area))
-        current_densities.append(current_density)
-        powers.append(power)
-        currents.append(current)
-        voltages.append(voltage)
-        efficiencies.append(efficiency)
-        t = time.time()
-        i += 1
-
-    return times, voltages, currents, current_densities, powers, efficiencies
-
-# Track max power
-mppt_results = track_max_power(initial_V, t_track)
-
-# Close measurement
-keithley2400.write('OUTP OFF')  # Disable output
-keithley2400.write(':SOUR2:TTL 1')  # Close shutter
-keithley2400.write(':DISP:ENAB 1')  # Turn off display
-
-# Format and save the results
-np.savetxt(folderpath + filename,
-           np.transpose(np.array(mppt_results)),
-           fmt='%.9f',
-           delimiter='\t',
-           newline='\r\n',
-           header='Time (s)' + '\t' + 'V' + '\t' + 'I (A)' + '\t' +
-           'J (mA/cm^2)' + '\t' + 'P (W)' + '\t' + 'PCE (%)',
-           comments='')
+            decimator = mpptlib.Decimator(args.output_interval,
+                                          args.aggregates)
+        writer = mpptlib.DataWriter(folderpath + file_name,
+                                    fsync=args.fsync,
+                                    decimator=decimator)
+        samples = mpptlib.SampleBuffer(float(area),
+                                       float(suns),
+                                       writer=writer,
+                                       flush_points=args.flush_points,
+                                       flush_interval=args.flush_interval)
+        channels.append({'resource': resource,
+                         'keithley': keithley2400,
+                         'initial_V': float(initial_V),
+                         'writer': writer,
+                         'samples': samples,
+                         'counters': mpptlib.LatencyCounters(),
+                         'shutter': i == 0})
+
+    # Compare acquisition rates if requested
+    if args.rate_test:
+        rate_point, rate_buffered = mpptlib.measure_sample_rates(
+            channels[0]['keithley'], 500, block_size)
+        print('Per-point: ' + str(round(rate_point, 1)) +
+              ' points/s, buffered (' + str(block_size) + ' point blocks): ' +
+              str(round(rate_buffered, 1)) + ' points/s')
+
+    # Track max power. Write any remaining data and close the measurement of
+    # every channel even if tracking, or writing the data of a channel, fails
+    # part way through. The first error writing data is raised afterwards.
+    try:
+        rate = mpptlib.track_max_power_parallel(channels, t_track, mode,
+                                                block_size, args.algorithm)
+    finally:
+        write_error = None
+        for channel in channels:
+            try:
+                channel['samples'].flush()
+                channel['writer'].close()
+            except Exception as e:
+                if write_error is None:
+                    write_error = e
+            finally:
+                # Close measurement
+                mpptlib.close_keithley(channel['keithley'],
+                                       channel['shutter'])
+        if write_error is not None:
+            raise write_error
+
+    # Report the timing of each channel
+    for channel in channels:
+        print(channel['resource'] + ': ' + str(channel['points']) +
+              ' points in ' + str(round(channel['time'], 1)) + ' s (' +
+              str(round(channel['rate'], 1)) + ' points/s)')
+        if mode == 'pipelined':
+            print(channel['counters'].report())
+    if len(channels) > 1:
+        print('Aggregate: ' + str(round(rate, 1)) + ' points/s')
+
+    # Raise the first error from any channel now the measurement is closed
+    for channel in channels:
+        if channel['error'] is not None:
+            raise channel['error']
+
+
+if __name__ == '__main__':
+    main()
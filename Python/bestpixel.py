@@ -0,0 +1,294 @@
+# Library and local service for looking up the best pixel of each substrate
+# and the maximum power voltage of each pixel while an experiment runs, e.g.
+# to seed the max power point tracker, without reading the whole log.
+
+import argparse
+import socket
+import sys
+
+import pandas as pd
+
+import measurementdb
+
+# Columns of the log read to update a BestPixelIndex
+INDEX_COLUMNS = ['id', 'Label', 'Pixel', 'Condition', 'Variable', 'Value',
+                 'PCE', 'Vmp', 'Scan_direction', 'scan_num']
+
+# Columns of the rows kept for each best scan
+BEST_COLUMNS = ['Label', 'Pixel', 'Variable', 'Value', 'PCE', 'Vmp',
+                'Scan_direction', 'scan_num']
+
+
+def _key(values):
+    # Return a dictionary key for a list of values, with missing values as
+    # None so that they are equal to each other. Other values are text,
+    # parsed like a value of the log first, so that a value read as a number
+    # equals the same value read as text from a column that also holds text,
+    # e.g. the Value 100 of a log with a Control substrate, or given as text
+    # to a lookup.
+    return tuple(None if pd.isnull(x) else str(
+        measurementdb.parse_value(str(x))) for x in values)
+
+
+class BestPixelIndex:
+    """
+
+    Running index of the light scan with the highest PCE of each substrate,
+    i.e. each combination of Label, Variable, and Value, of each label, and
+    of each pixel, i.e. each combination of Label and Pixel, in a J-V log.
+
+    The index starts empty. sync() adds the rows appended to the log since
+    the last call to the measurement database and then to the index, so each
+    row is only read once. Lookups are dictionary lookups, with the values of
+    each key compared as text, so a value read as a number matches the same
+    value read or given as text.
+
+    db = measurementdb.MeasurementDB holding the rows of the log
+    log_path = path of the J-V log
+
+    """
+
+    def __init__(self, db, log_path):
+        self.db = db
+        self.log_path = log_path
+        self.clear()
+
+    def clear(self):
+        """
+        Empty the index.
+        """
+
+        self.last_id = 0
+        self.substrates = {}  # (Label, Variable, Value): best scan
+        self.labels = {}  # (Label, ): best scan
+        self.pixels = {}  # (Label, Pixel): best scan
+
+    def update(self, rows):
+        """
+        Add the rows of a DataFrame with the columns in BEST_COLUMNS and a
+        Condition column to the index.
+        """
+
+        # Find the best light scan of each substrate and pixel among the new
+        # rows and keep the ones better than those already indexed
+        light = rows[(rows['Condition'] == 'Light') & rows['PCE'].notnull()]
+        light = light.sort_values('PCE', ascending=False, kind='mergesort')
+        for key_columns, table in [(['Label', 'Variable', 'Value'],
+                                    self.substrates),
+                                   (['Label'], self.labels),
+                                   (['Label', 'Pixel'], self.pixels)]:
+            best = light.drop_duplicates(key_columns)
+            for values in zip(*[best[column].tolist()
+                                for column in BEST_COLUMNS]):
+                scan = dict(zip(BEST_COLUMNS, values))
+                key = _key([scan[column] for column in key_columns])
+                if (key not in table) or (scan['PCE'] > table[key]['PCE']):
+                    table[key] = scan
+
+    def sync(self):
+        """
+        Add the rows appended to the log since the last sync to the index
+        and return how many there were. If the log has been replaced, the
+        index is built again from all of its rows.
+        """
+
+        self.db.sync_log(self.log_path)
+
+        # The rows of a replaced log are deleted from the database and read
+        # again, so the last row indexed is gone
+        last_row = self.db.connection.execute(
+            'SELECT id FROM measurements WHERE id = ? AND Source = ?',
+            (self.last_id, self.log_path)).fetchone()
+        if (self.last_id > 0) and (last_row is None):
+            self.clear()
+        rows = self.db.read_log(self.log_path, INDEX_COLUMNS, self.last_id)
+        if len(rows) > 0:
+            self.update(rows)
+            self.last_id = int(rows['id'].iloc[-1])
+        return len(rows)
+
+    def best_pixel(self, label, variable=None, value=None):
+        """
+        Return a dictionary of the columns in BEST_COLUMNS of the best light
+        scan of the substrate label with the given variable and value, or of
+        any variable and value if they are both None, or None if it has no
+        light scans.
+        """
+
+        if (variable is None) and (value is None):
+            return self.labels.get(_key([label]))
+        return self.substrates.get(_key([label, variable, value]))
+
+    def max_power_voltage(self, label, pixel):
+        """
+        Return the maximum power voltage (V) of the best light scan of a pixel
+        of the substrate label, or None if it has no light scans.
+        """
+
+        scan = self.pixels.get(_key([label, pixel]))
+        if scan is None:
+            return None
+        return scan['Vmp']
+
+
+class BestPixelService:
+    """
+
+    Local service that keeps a BestPixelIndex of every J-V log it is asked
+    about, so each lookup only has to read the rows logged since the last
+    one.
+
+    Commands are read by the command loop of serve() and serve_tcp(), in the
+    same way as mpptlib.MaxPowerPointTracker. close() closes the database.
+
+    db_path = path of the measurement database (see measurementdb)
+
+    """
+
+    def __init__(self, db_path):
+        self.db = measurementdb.MeasurementDB(db_path)
+        self.indexes = {}  # log path: BestPixelIndex
+
+    def sync(self, log_path):
+        """
+        Sync the BestPixelIndex of the J-V log at log_path, creating it if
+        needed, and return the number of rows added to it.
+        """
+
+        if log_path not in self.indexes:
+            self.indexes[log_path] = BestPixelIndex(self.db, log_path)
+        return self.indexes[log_path].sync()
+
+    def serve(self, rfile, wfile):
+        """
+        Run a command loop that reads one tab-separated command per line from
+        rfile and writes one tab-separated reply line to wfile for each.
+
+        The commands are:
+
+            sync log_path
+                Adds the rows appended to the log to its index and replies
+                'OK rows'.
+            append log_path fields...
+                Appends a row with the given fields to the log (see
+                measurementdb.MeasurementDB.append) and replies 'OK rows'.
+            best log_path label [variable value]
+                Replies 'OK pixel Vmp PCE' for the best light scan of the
+                substrate, or 'NONE' if it has none.
+            vmp log_path label pixel
+                Replies 'OK Vmp' for the best light scan of the pixel, or
+                'NONE' if it has none.
+            ping
+                Replies 'OK'.
+            quit
+                Replies 'OK' and ends the loop.
+
+        Any failed command replies 'ERROR message' and the loop carries on.
+        Returns True if the loop ended with 'quit' or False if rfile ended.
+        """
+
+        for line in rfile:
+            command = line.rstrip('\r\n').split('\t')
+            try:
+                if command[0] == 'sync':
+                    reply = 'OK\t' + str(self.sync(command[1]))
+                elif command[0] == 'append':
+                    rows = self.db.append(command[1],
+                                          ['\t'.join(command[2:])])
+                    self.sync(command[1])
+                    reply = 'OK\t' + str(rows)
+                elif command[0] == 'best':
+                    values = [measurementdb.parse_value(arg)
+                              for arg in command[2:5]]
+                    self.sync(command[1])
+                    scan = self.indexes[command[1]].best_pixel(*values)
+                    if scan is None:
+                        reply = 'NONE'
+                    else:
+                        reply = ('OK\t' + str(scan['Pixel']) + '\t' +
+                                 str(scan['Vmp']) + '\t' + str(scan['PCE']))
+                elif command[0] == 'vmp':
+                    label, pixel = [measurementdb.parse_value(arg)
+                                    for arg in command[2:4]]
+                    self.sync(command[1])
+                    Vmp = self.indexes[command[1]].max_power_voltage(label,
+                                                                     pixel)
+                    if Vmp is None:
+                        reply = 'NONE'
+                    else:
+                        reply = 'OK\t' + str(Vmp)
+                elif command[0] in ['ping', 'quit']:
+                    reply = 'OK'
+                else:
+                    raise ValueError('Unknown command: ' + command[0])
+            except Exception as e:
+                reply = 'ERROR\t' + str(e).replace('\n', ' ')
+            wfile.write(reply + '\n')
+            wfile.flush()
+            if command[0] == 'quit':
+                return True
+        return False
+
+    def serve_tcp(self, port, host='127.0.0.1'):
+        """
+        Listen for TCP connections on host and port and run the serve()
+        command loop for each client in turn until one sends 'quit'.
+        """
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        try:
+            quit = False
+            while not quit:
+                connection, address = server.accept()
+                with connection:
+                    rfile = connection.makefile('r', encoding='utf-8',
+                                                newline='')
+                    wfile = connection.makefile('w', encoding='utf-8',
+                                                newline='')
+                    quit = self.serve(rfile, wfile)
+                    rfile.close()
+                    wfile.close()
+        finally:
+            server.close()
+
+    def close(self):
+        """
+        Close the measurement database.
+        """
+
+        self.db.close()
+
+
+def main(argv=None):
+    """
+    Run the best pixel service with the command line arguments in argv
+    (sys.argv by default), reading commands from stdin, or from TCP clients
+    if a port is given.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Look up best pixels and maximum power voltages')
+    parser.add_argument('db_path',
+                        type=str,
+                        help='Path of the measurement database')
+    parser.add_argument('--port',
+                        type=int,
+                        default=None,
+                        help='Local TCP port to listen on')
+    args = parser.parse_args(argv)
+
+    service = BestPixelService(args.db_path)
+    try:
+        if args.port is None:
+            service.serve(sys.stdin, sys.stdout)
+        else:
+            service.serve_tcp(args.port)
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# Library for fitting the single diode model of a solar cell to many J-V
+# curves at once.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import constants, special
+
+# Names of the fitted parameters, in the order of the parameter arrays,
+# followed by the root mean square residual of the fit
+PARAMETERS = ['J0', 'n', 'Rs', 'Rsh', 'Jph']
+RESULTS = PARAMETERS + ['RMSE']
+
+# Number of curves fitted together in one batch, which bounds the memory
+# used by the Jacobian
+CHUNK_SIZE = 2000
+
+# Limits of the fitted parameters, which are ln(J0), n, ln(Rs), ln(Rsh),
+# and Jph with current densities in A/cm^2 and resistances in ohm cm^2
+LOWER = np.array([np.log(1e-30), 0.3, np.log(1e-6), np.log(1e-1), -np.inf])
+UPPER = np.array([np.log(1), 10, np.log(1e4), np.log(1e9), np.inf])
+
+
+def lambertw_exp(x):
+    """
+    Return the principal branch of the Lambert W function of exp(x) for an
+    array x, without overflowing for large x.
+    """
+
+    x = np.asarray(x, dtype=float)
+    w = np.empty_like(x)
+    small = x < 500
+    w[small] = special.lambertw(np.exp(x[small])).real
+
+    # For large arguments solve w + ln(w) = x by Newton's method, starting
+    # from the asymptotic expansion
+    xb = x[~small]
+    wb = xb - np.log(xb)
+    for i in range(4):
+        wb = wb * (1 + xb - np.log(wb)) / (1 + wb)
+    w[~small] = wb
+    return w
+
+
+def diode_current(V, p, T=300):
+    """
+    Return the current density (A/cm^2) generated by a single diode solar
+    cell at the voltages V (V), from the explicit Lambert W form of
+
+    J = Jph - J0 * (exp((V + J * Rs) / (n * kB * T / q)) - 1) -
+        (V + J * Rs) / Rsh
+
+    V is a 2D array with one curve per row and p a 2D array with one row of
+    parameters per curve: ln(J0), n, ln(Rs), ln(Rsh), and Jph, with current
+    densities in A/cm^2 and resistances in ohm cm^2. Also returns a
+    dictionary of the intermediate results used by diode_jacobian.
+    """
+
+    Vt = constants.Boltzmann * T / constants.elementary_charge
+    J0 = np.exp(p[:, 0])[:, None]
+    a = p[:, 1][:, None] * Vt
+    Rs = np.exp(p[:, 2])[:, None]
+    Rsh = np.exp(p[:, 3])[:, None]
+    Jph = p[:, 4][:, None]
+    G = Rs + Rsh
+    K = Jph + J0
+    u = Rsh * (Rs * K + V) / (a * G)
+    W = lambertw_exp(np.log(Rs * Rsh * J0 / (a * G)) + u)
+    J = (Rsh * K - V) / G - a * W / Rs
+    return J, {'V': V, 'Vt': Vt, 'J0': J0, 'a': a, 'Rs': Rs, 'Rsh': Rsh,
+               'G': G, 'K': K, 'u': u, 'W': W}
+
+
+def diode_jacobian(state):
+    """
+    Return the analytic Jacobian of diode_current with respect to each of
+    its parameters, from the intermediate results it returned, as a 3D
+    array indexed by curve, voltage, and parameter.
+    """
+
+    V = state['V']
+    J0 = state['J0']
+    a = state['a']
+    Rs = state['Rs']
+    Rsh = state['Rsh']
+    G = state['G']
+    K = state['K']
+    W = state['W']
+    M = Rs * K + V
+
+    # W / (1 + W) is the derivative of W with respect to the log of its
+    # argument
+    Wf = W / (1 + W)
+    dJ_dJph = Rsh * (1 - Wf) / G
+    dJ_dlnJ0 = dJ_dJph * J0 - a * Wf / Rs
+    dJ_dn = (Wf * (1 + state['u']) - W) * state['Vt'] / Rs
+    dJ_dlnRs = Rs * (-(Rsh * K - V) / G**2 + a * W / Rs**2 - a * Wf / Rs *
+                     (1 / Rs - 1 / G + Rsh * (K * Rsh - V) / (a * G**2)))
+    dJ_dlnRsh = Rsh * (M / G**2 - a * Wf / Rs *
+                       (1 / Rsh - 1 / G + M * Rs / (a * G**2)))
+    return np.stack([dJ_dlnJ0, dJ_dn, dJ_dlnRs, dJ_dlnRsh, dJ_dJph], axis=2)
+
+
+def initial_guess(V, J, T=300):
+    """
+    Estimate the parameters of diode_current for each row of the 2D arrays
+    of voltage V (V) and generated current density J (A/cm^2): Jph from the
+    current nearest short-circuit, Rsh from the slope of the points within
+    0.1 V of short-circuit, and J0 from the point at the highest voltage,
+    assuming n = 1.5 and Rs = 1 ohm cm^2.
+    """
+
+    rows = np.arange(len(V))
+    n = 1.5
+    Rs = 1.0
+
+    # Photocurrent
+    Jph = J[rows, np.argmin(np.absolute(V), axis=1)]
+
+    # Shunt resistance from a least squares line through the points near
+    # short-circuit
+    near = np.absolute(V) <= 0.1
+    count = np.maximum(near.sum(axis=1), 1)
+    V_mean = (V * near).sum(axis=1) / count
+    J_mean = (J * near).sum(axis=1) / count
+    dV = (V - V_mean[:, None]) * near
+    slope = (dV * (J - J_mean[:, None])).sum(axis=1) / np.maximum(
+        (dV**2).sum(axis=1), 1e-12)
+    with np.errstate(divide='ignore'):
+        Rsh = np.where(slope < 0, -1 / slope, 1e4)
+    Rsh = np.clip(Rsh, 10, 1e7)
+
+    # Saturation current from the diode current at the highest voltage
+    i = np.argmax(V, axis=1)
+    V_m = V[rows, i]
+    J_m = J[rows, i]
+    J_diode = np.maximum(Jph - J_m - V_m / Rsh, 1e-20)
+    J0 = J_diode * np.exp(-(V_m + J_m * Rs) /
+                          (n * constants.Boltzmann * T /
+                           constants.elementary_charge))
+
+    p = np.column_stack((np.log(np.maximum(J0, 1e-30)), np.full(len(V), n),
+                         np.full(len(V), np.log(Rs)), np.log(Rsh), Jph))
+    return np.clip(p, LOWER, UPPER)
+
+
+def fit_curves(V, J, T=300, max_iterations=200, tolerance=1e-10):
+    """
+    Fit the single diode model to every row of the 2D arrays of voltage V
+    (V) and generated current density J (A/cm^2) at once by the
+    Levenberg-Marquardt method, using the explicit Lambert W form of the
+    model (diode_current) and its analytic Jacobian (diode_jacobian).
+
+    The damping of each curve is adapted separately and curves stop being
+    updated once they have converged, i.e. a step reduces the sum of squared
+    residuals by less than tolerance times its value. Returns a 2D array
+    with a row of J0 (A/cm^2), n, Rs (ohm cm^2), Rsh (ohm cm^2), Jph
+    (A/cm^2), and the root mean square residual (A/cm^2) for each curve.
+    Rows of curves that couldn't be fitted are NaN.
+    """
+
+    V = np.asarray(V, dtype=float)
+    J = np.asarray(J, dtype=float)
+    p = initial_guess(V, J, T)
+    J_fit, state = diode_current(V, p, T)
+    r = J_fit - J
+    cost = np.sum(r**2, axis=1)
+    damping = np.full(len(V), 1e-3)
+    active = np.isfinite(cost)
+    for iteration in range(max_iterations):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+
+        # Solve the damped normal equations of every active curve
+        jac = diode_jacobian({k: (v[idx] if np.ndim(v) > 0 else v)
+                              for k, v in state.items()})
+        A = np.einsum('ijk,ijl->ikl', jac, jac)
+        g = np.einsum('ijk,ij->ik', jac, r[idx])
+        diagonal = np.diagonal(A, axis1=1, axis2=2)
+        diagonal = np.maximum(diagonal,
+                              1e-12 * diagonal.max(axis=1, keepdims=True))
+        A = A + damping[idx, None, None] * (
+            diagonal[:, :, None] * np.eye(len(PARAMETERS)))
+        try:
+            step = np.linalg.solve(A, -g[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = np.einsum('ikl,il->ik', np.linalg.pinv(A), -g)
+
+        # Keep the steps that reduce the residuals and adapt the damping
+        p_new = np.clip(p[idx] + step, LOWER, UPPER)
+        with np.errstate(all='ignore'):
+            J_new, state_new = diode_current(V[idx], p_new, T)
+            r_new = J_new - J[idx]
+            cost_new = np.sum(r_new**2, axis=1)
+        better = np.isfinite(cost_new) & (cost_new < cost[idx])
+        converged = better & (cost[idx] - cost_new <= tolerance * cost[idx])
+        accepted = idx[better]
+        p[accepted] = p_new[better]
+        r[accepted] = r_new[better]
+        cost[accepted] = cost_new[better]
+        for k, v in state_new.items():
+            if np.ndim(v) > 0:
+                state[k][accepted] = v[better]
+        damping[accepted] /= 3
+        damping[idx[~better]] *= 4
+        active[idx[converged]] = False
+        active[damping > 1e12] = False
+
+    results = np.column_stack((np.exp(p[:, 0]), p[:, 1], np.exp(p[:, 2]),
+                               np.exp(p[:, 3]), p[:, 4],
+                               np.sqrt(cost / V.shape[1])))
+    results[~np.isfinite(cost)] = np.nan
+    return results
+
+
+def fit_curves_parallel(V, J, T=300, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Fit the single diode model to every row of V and J like fit_curves, in
+    chunks of chunk_size curves. The chunks are fitted by a pool of workers
+    processes, or in this process if workers is 1 or there is only one
+    chunk.
+    """
+
+    starts = range(0, len(V), chunk_size)
+    if (workers == 1) or (len(starts) < 2):
+        chunks = [fit_curves(V[i:i + chunk_size], J[i:i + chunk_size], T)
+                  for i in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(fit_curves, V[i:i + chunk_size],
+                                   J[i:i + chunk_size], T) for i in starts]
+            chunks = [future.result() for future in futures]
+    if len(chunks) == 0:
+        return np.empty((0, len(RESULTS)))
+    return np.concatenate(chunks)
+
+
+def fit_jv_curves(curves, polarity, T=300, workers=None):
+    """
+    Fit the single diode model to a list of J-V curves, each an array with
+    columns of voltage (V) and current density (mA/cm^2) in the sign
+    convention of the Keithley, i.e. negative when the cell generates power.
+    polarity is an array of 1 for each curve, or -1 for curves measured with
+    inverted polarity. Curves with the same number of points are fitted
+    together (see fit_curves_parallel).
+
+    Returns a 2D array with a row of J0 (mA/cm^2), n, Rs (ohm cm^2), Rsh
+    (ohm cm^2), Jph (mA/cm^2), and the root mean square residual (mA/cm^2)
+    for each curve, in the order of RESULTS. Curves with fewer points than
+    parameters give NaN.
+    """
+
+    polarity = np.asarray(polarity, dtype=float)
+    results = np.full((len(curves), len(RESULTS)), np.nan)
+    lengths = np.array([len(JV) for JV in curves], dtype=int)
+    for n in np.unique(lengths):
+        if n <= len(PARAMETERS):
+            continue
+        idx = np.flatnonzero(lengths == n)
+        JV = np.stack([curves[i][:, :2] for i in idx])
+        sign = polarity[idx, None]
+        results[idx] = fit_curves_parallel(sign * JV[:, :, 0],
+                                           -sign * JV[:, :, 1] / 1000, T,
+                                           workers)
+
+    # Convert current densities to mA/cm^2
+    for column in ['J0', 'Jph', 'RMSE']:
+        results[:, RESULTS.index(column)] *= 1000
+    return results
@@ -0,0 +1,235 @@
+# Simulated Keithley 2400 source measure unit for testing and benchmarking
+# the max power point tracker without hardware.
+
+import time
+
+import numpy as np
+from scipy import constants
+
+# Order of the data elements returned by the Keithley for each reading
+ELEMENTS = ['VOLT', 'CURR', 'RES', 'TIME', 'STAT']
+
+# Commands that are accepted but don't change the behaviour of the simulation
+IGNORED = [':SYST:RSEN', ':SOUR:CLE:AUTO', ':SOUR:FUNC', ':SOUR:VOLT:RANG',
+           ':SOUR:CURR:RANG', ':SOUR:DEL', ':DISP:ENAB']
+
+
+class SimulatedKeithley2400:
+    """
+    Stand-in for a pyvisa resource connected to a Keithley 2400 with a solar
+    cell and the shutter of a solar simulator attached.
+
+    The subset of SCPI used by the max power point tracker is understood,
+    including compound commands separated by ';'. Currents are calculated
+    from a single diode model with series and shunt resistance:
+
+    I = I0 * (exp((V - I * Rs) / (n * kB * T / q)) - 1) + (V - I * Rs) / Rsh -
+        Iph
+
+    using the sign convention of the Keithley, i.e. the current is negative
+    when the cell generates power. The photocurrent is only present while the
+    shutter is open (':SOUR2:TTL 0') and changes by a fraction drift per
+    second to mimic a device that is degrading or improving under light. If
+    step_time is set, the light intensity is also multiplied by step_factor
+    step_time seconds after the timestamp was zeroed to mimic a sudden change
+    of illumination.
+    Gaussian noise with a standard deviation of noise (A) is added to every
+    current reading and readings are clipped at the compliance current.
+
+    Every write and query takes latency seconds to mimic the bus and every
+    reading takes the integration time set by ':SENS:CURR:NPLC' at a line
+    frequency of line_freq.
+
+    jsc = short-circuit current density at 1 sun in mA/cm^2
+    j0 = reverse saturation current density in mA/cm^2
+    n = ideality factor
+    rs = series resistance in ohm cm^2
+    rsh = shunt resistance in ohm cm^2
+    area = device area in cm^2
+    suns = number of suns equivalent illumination intensity
+    temperature = device temperature in K
+    drift = fractional change of the photocurrent per second
+    step_time = time of a step change in light intensity in s
+    step_factor = factor the light intensity changes by at step_time
+    noise = standard deviation of the current noise in A
+    latency = time taken by each bus transaction in seconds
+    line_freq = power line frequency in Hz
+    seed = seed for the random number generator
+    """
+
+    def __init__(self,
+                 jsc=20,
+                 j0=1e-11,
+                 n=1.5,
+                 rs=2,
+                 rsh=2000,
+                 area=0.15,
+                 suns=1,
+                 temperature=300,
+                 drift=0,
+                 step_time=None,
+                 step_factor=1,
+                 noise=1e-7,
+                 latency=0.001,
+                 line_freq=50,
+                 seed=None):
+        self.Iph = jsc * area * suns / 1000
+        self.I0 = j0 * area / 1000
+        self.nVt = n * constants.Boltzmann * temperature / (
+            constants.elementary_charge)
+        self.Rs = rs / area
+        self.Rsh = rsh / area
+        self.drift = drift
+        self.step_time = step_time
+        self.step_factor = step_factor
+        self.noise = noise
+        self.latency = latency
+        self.line_freq = line_freq
+        self.encoding = 'ascii'
+        self._random = np.random.RandomState(seed)
+        self.reset()
+
+    def reset(self):
+        """
+        Return the instrument settings to their power-on values.
+        """
+
+        self.output = False
+        self.shutter_open = False
+        self.V = 0.0
+        self.mode = 'FIXED'
+        self.voltage_list = [0.0]
+        self.trigger_count = 1
+        self.nplc = 1.0
+        self.compliance_I = 0.105
+        self.elements = list(ELEMENTS)
+        self.t_zero = time.time()
+
+    def current(self, V, t=0):
+        """
+        Return the current (A) of the simulated cell at the voltages V (V) and
+        time t (s) since the timestamp was zeroed, without noise.
+        """
+
+        V = np.asarray(V, dtype=float)
+        if self.shutter_open:
+            Iph = self.Iph * (1 + self.drift * t)
+            if self.step_time is not None:
+                Iph = np.where(t >= self.step_time, Iph * self.step_factor,
+                               Iph)
+        else:
+            Iph = 0
+
+        # Solve the implicit diode equation for the current by Newton's
+        # method, starting from the solution without series resistance
+        I = self.I0 * (np.exp(np.minimum(V / self.nVt, 100)) -
+                       1) + V / self.Rsh - Iph
+        for i in range(50):
+            Vd = V - I * self.Rs
+            exp = np.exp(np.minimum(Vd / self.nVt, 100))
+            f = self.I0 * (exp - 1) + Vd / self.Rsh - Iph - I
+            df = -self.Rs * self.I0 * exp / self.nVt - self.Rs / self.Rsh - 1
+            step = f / df
+            I = I - step
+            if np.all(np.absolute(step) < 1e-15):
+                break
+        return I
+
+    def max_power(self, t=0):
+        """
+        Return the voltage (V) and power (W) at the maximum power point of the
+        simulated cell under illumination at time t (s).
+        """
+
+        shutter_open = self.shutter_open
+        self.shutter_open = True
+        V = np.linspace(0, 2, 20001)
+        P = V * self.current(V, t)
+        self.shutter_open = shutter_open
+        i = np.argmin(P)
+        return V[i], -P[i]
+
+    def _read(self, voltages):
+        # Take a reading at each voltage in turn, one integration time apart,
+        # and format them as the Keithley would
+        t_integration = self.nplc / self.line_freq
+        t = time.time() - self.t_zero + t_integration * np.arange(
+            1, len(voltages) + 1)
+        time.sleep(len(voltages) * t_integration)
+        V = np.array(voltages, dtype=float)
+        I = self.current(V, t) + self._random.normal(0, self.noise, len(V))
+        I = np.clip(I, -self.compliance_I, self.compliance_I)
+        columns = {'VOLT': V,
+                   'CURR': I,
+                   'RES': np.full(len(V), 9.91e37),
+                   'TIME': t,
+                   'STAT': np.full(len(V), 0.0)}
+        readings = np.column_stack(
+            [columns[e] for e in ELEMENTS if e in self.elements])
+        return ','.join(['%e' % x for x in readings.flatten()])
+
+    def _command(self, command):
+        # Act on a single SCPI command and return any reply
+        command = command.strip()
+        header, _, argument = command.partition(' ')
+        header = header.upper()
+        if header == '*IDN?':
+            return 'KEITHLEY INSTRUMENTS INC.,MODEL 2400,SIMULATED,0'
+        elif header == '*RST':
+            self.reset()
+        elif header == '*OPC?':
+            return '1'
+        elif header == 'OUTP':
+            self.output = argument.strip().upper() in ['ON', '1']
+        elif header == ':SOUR:VOLT':
+            self.V = float(argument)
+        elif header == ':SOUR:VOLT:MODE':
+            self.mode = argument.strip().upper()
+        elif header == ':SOUR:LIST:VOLT':
+            self.voltage_list = [float(v) for v in argument.split(',')]
+        elif header == ':TRIG:COUN':
+            self.trigger_count = int(argument)
+        elif header == ':SOUR2:TTL':
+            self.shutter_open = int(argument) == 0
+        elif header == ':SENS:CURR:PROT':
+            self.compliance_I = float(argument)
+        elif header == ':SENS:CURR:NPLC':
+            self.nplc = float(argument)
+        elif header == ':FORM:ELEM':
+            self.elements = [e.strip().upper() for e in argument.split(',')]
+        elif header == ':SYST:TIME:RES':
+            self.t_zero = time.time()
+        elif header == ':MEAS:CURR?':
+            self.trigger_count = 1
+            return self._read([self.V])
+        elif header == ':READ?':
+            if self.mode == 'LIST':
+                voltages = (self.voltage_list * self.trigger_count)[
+                    :self.trigger_count]
+            else:
+                voltages = [self.V] * self.trigger_count
+            return self._read(voltages)
+        elif header not in IGNORED:
+            raise ValueError('Unsupported command: ' + command)
+
+    def write(self, message):
+        """
+        Send a message of one or more SCPI commands separated by ';'.
+        """
+
+        time.sleep(self.latency)
+        for command in message.split(';'):
+            self._command(command)
+
+    def query(self, message):
+        """
+        Send a message of one or more SCPI commands separated by ';' and
+        return the reply.
+        """
+
+        time.sleep(self.latency)
+        replies = [self._command(command) for command in message.split(';')]
+        return ';'.join([r for r in replies if r is not None])
+
+    def close(self):
+        pass
@@ -0,0 +1,390 @@
+# Library for keeping the rows of master J-V log files in an indexed SQLite
+# database, so they can be queried without reading and sorting the whole log
+# every time.
+
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+
+import pandas as pd
+
+# Columns of the J-V log files
+LOG_COLUMNS = ['Label', 'Pixel', 'Condition', 'Variable', 'Value', 'Position',
+               'Jsc', 'Voc', 'PCE', 'FF', 'Area', 'Stabil_Level',
+               'Stabil_time', 'Meas_delay', 'Vmp', 'File_Path', 'Scan_rate',
+               'Scan_direction', 'Intensity']
+
+# Version of the tables below, stored as the user_version of the database.
+# A database with another version is emptied when it is opened, and its rows
+# are read from the logs again.
+SCHEMA_VERSION = 3
+
+# Number of bytes at the end of the part of a log already read whose digest
+# is kept to tell whether the log has been replaced
+DIGEST_WINDOW = 4096
+
+# Columns of the measurements table. Source is the path of the log file a row
+# was read from and scan_num the scan number in the file name of its data
+# file. Columns without a type keep the type each value was parsed as, like
+# a column of a DataFrame read from the log. The sources table holds how
+# far each log has been read, its size and modification time (ns) when it
+# was last read, and the SHA-1 digest of the last DIGEST_WINDOW bytes of the
+# part read, after the header. Ids are never
+# reused, even after the rows of a replaced log are deleted, so a row with an
+# id read earlier only exists if it hasn't been replaced.
+COLUMNS = ['Source'] + LOG_COLUMNS + ['scan_num']
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Source TEXT NOT NULL,
+    Label, Pixel, Condition TEXT, Variable, Value, Position,
+    Jsc REAL, Voc REAL, PCE REAL, FF REAL, Area REAL, Stabil_Level REAL,
+    Stabil_time REAL, Meas_delay REAL, Vmp REAL, File_Path TEXT,
+    Scan_rate REAL, Scan_direction TEXT, Intensity REAL,
+    scan_num INTEGER
+);
+CREATE INDEX IF NOT EXISTS measurements_pixel ON measurements
+    (Label, Pixel, Condition, Scan_direction, scan_num);
+CREATE INDEX IF NOT EXISTS measurements_best ON measurements
+    (Label, Condition, PCE);
+CREATE INDEX IF NOT EXISTS measurements_source ON measurements (Source);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    header TEXT,
+    offset INTEGER,
+    size INTEGER,
+    mtime INTEGER,
+    digest TEXT
+);
+"""
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS measurements;
+DROP TABLE IF EXISTS sources;
+"""
+
+
+def parse_log_rows(text):
+    """
+    Return a DataFrame of the tab-separated rows of a J-V log in text,
+    without a header line, with the scan number of each row added.
+    """
+
+    rows = pd.read_csv(io.StringIO(text),
+                       delimiter='\t',
+                       header=None,
+                       names=LOG_COLUMNS)
+    rows['scan_num'] = pd.to_numeric(
+        rows['File_Path'].astype(str).str.extract(r'scan(\d+)\.txt$',
+                                                  expand=False))
+    return rows
+
+
+def parse_value(text):
+    """
+    Return a value of a log given as text as the type it is stored as: an
+    int or float if it is a number, like pandas parses it, None if it is
+    empty, or otherwise the text.
+    """
+
+    if text == '':
+        return None
+    for parse in [int, float]:
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
+
+
+class MeasurementDB:
+    """
+
+    SQLite database of the rows of master J-V log files.
+
+    Rows are only ever appended, either read from the end of a log file by
+    sync_log() or written to a log file and the database together by
+    append(). Lookups of single pixels and of the best pixel of a substrate
+    use indexes, so they take O(log n) time however many rows have been
+    logged.
+
+    path = path of the database file, created if it doesn't exist
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.connection.executescript(DROP_SCHEMA)
+        self.connection.executescript(SCHEMA)
+        self.connection.execute('PRAGMA user_version = ' +
+                                str(SCHEMA_VERSION))
+
+    def close(self):
+        """
+        Close the database.
+        """
+
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _insert(self, source, rows):
+        # Insert the rows of a DataFrame, converting each column to a list of
+        # Python values that sqlite3 can store
+        columns = [[source] * len(rows)] + [
+            [None if pd.isnull(x) else x for x in rows[column].tolist()]
+            for column in COLUMNS[1:]
+        ]
+        self.connection.executemany(
+            'INSERT INTO measurements (' + ', '.join(COLUMNS) +
+            ') VALUES (' + ', '.join(['?'] * len(COLUMNS)) + ')',
+            zip(*columns))
+
+    def sync_log(self, log_path):
+        """
+        Add the rows appended to the J-V log at log_path since it was last
+        synced and return the number of rows added.
+
+        Only the end of the file after the last row read is parsed. A last
+        line without a line ending is left for the next sync, unless it has
+        a value for every column. The file isn't read at all if its size and
+        modification time haven't changed since the last sync. If the header
+        line has changed, the file is shorter than what has been read, its
+        modification time has gone back, or the last DIGEST_WINDOW bytes
+        already read have different contents, the log has been replaced, so
+        its rows are dropped and read again. Only that window is compared,
+        so the time taken doesn't grow with the size of the log.
+        """
+
+        with open(log_path, 'rb') as f:
+            header_line = f.readline()
+            header = header_line.rstrip(b'\r\n').decode('utf-8', 'replace')
+            stat = os.fstat(f.fileno())
+            known = self.connection.execute(
+                'SELECT header, offset, size, mtime, digest FROM sources '
+                'WHERE path = ?', (log_path, )).fetchone()
+            if (known is not None) and (known[2] == stat.st_size) and (
+                    known[3] == stat.st_mtime_ns):
+                return 0
+            replaced = ((known is None) or (known[0] != header) or
+                        (known[1] > stat.st_size) or
+                        (known[3] > stat.st_mtime_ns))
+
+            # Check the end of the part already read is unchanged, keeping it
+            # to find the window of the next sync
+            window = b''
+            if not replaced:
+                start = max(len(header_line), known[1] - DIGEST_WINDOW)
+                f.seek(start)
+                window = f.read(known[1] - start)
+                replaced = hashlib.sha1(window).hexdigest() != known[4]
+            if replaced:
+                window = b''
+                offset = len(header_line)
+            else:
+                offset = known[1]
+            f.seek(offset)
+            data = f.read()
+
+        # Only parse complete lines
+        end = data.rfind(b'\n') + 1
+        if (end < len(data)) and (data[end:].count(b'\t') ==
+                                  len(LOG_COLUMNS) - 1):
+            end = len(data)
+        text = data[:end].decode('utf-8')
+        window = window + data[max(end - DIGEST_WINDOW, 0):end]
+        digest = hashlib.sha1(window[-DIGEST_WINDOW:]).hexdigest()
+
+        with self.connection:
+            if (known is not None) and replaced:
+                self.connection.execute(
+                    'DELETE FROM measurements WHERE Source = ?', (log_path, ))
+            if text.strip() != '':
+                rows = parse_log_rows(text)
+                self._insert(log_path, rows)
+            else:
+                rows = []
+            self.connection.execute(
+                'INSERT OR REPLACE INTO sources (path, header, offset, size, '
+                'mtime, digest) VALUES (?, ?, ?, ?, ?, ?)',
+                (log_path, header, offset + end, stat.st_size,
+                 stat.st_mtime_ns, digest))
+        return len(rows)
+
+    def append(self, log_path, lines):
+        """
+        Append lines, each a tab-separated row of a J-V log, to the log file
+        at log_path, creating it with a header line if needed, and add them to
+        the database. If the last line of the file has no line ending, one is
+        written first so the new lines aren't joined to it. Returns the number
+        of rows added.
+        """
+
+        if os.path.exists(log_path):
+            self.sync_log(log_path)
+        with open(log_path, 'a+b') as f:
+            if f.tell() == 0:
+                f.write(('\t'.join(LOG_COLUMNS) + '\n').encode('utf-8'))
+            else:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+            for line in lines:
+                f.write((line.rstrip('\r\n') + '\n').encode('utf-8'))
+        return self.sync_log(log_path)
+
+    def read_log(self, log_path, columns=None, after=0):
+        """
+        Return the rows of the J-V log at log_path in the database as a
+        DataFrame with the given columns (all of COLUMNS after Source by
+        default), in the order they were logged. Only rows with an id greater
+        than after are returned, e.g. to read the rows added since an earlier
+        read that included the id column.
+        """
+
+        if columns is None:
+            columns = COLUMNS[1:]
+        data = pd.read_sql_query(
+            'SELECT ' + ', '.join(columns) +
+            ' FROM measurements WHERE Source = ? AND id > ? ORDER BY id',
+            self.connection,
+            params=(log_path, after))
+
+        # Columns with both text and numbers in different rows hold text, as
+        # when the whole log is parsed at once
+        for column in data.columns[data.dtypes == object]:
+            values = data[column].dropna()
+            is_text = values.map(lambda x: isinstance(x, str))
+            if is_text.any() and not is_text.all():
+                data.loc[values.index, column] = values.astype(str)
+        return data
+
+    def _lookup(self, where, params, order, columns, source):
+        # Return the first row matching a query as a dictionary, or None
+        if source is not None:
+            where += ' AND Source = ?'
+            params += (source, )
+        cursor = self.connection.execute(
+            'SELECT ' + ', '.join(columns) + ' FROM measurements WHERE ' +
+            where + ' ORDER BY ' + order + ' LIMIT 1', params)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(columns, row))
+
+    def best_pixel(self, label, condition='Light', source=None):
+        """
+        Return a dictionary of the columns of the scan with the highest PCE
+        of any pixel of the substrate label, or None if it has none. Only
+        scans of the given condition in the log at source are considered, or
+        of all logs if source is None.
+        """
+
+        return self._lookup('Label = ? AND Condition = ? AND PCE IS NOT NULL',
+                            (label, condition), 'PCE DESC', COLUMNS, source)
+
+    def max_power_voltage(self,
+                          label,
+                          pixel,
+                          condition='Light',
+                          scan_direction=None,
+                          source=None):
+        """
+        Return the maximum power voltage (V) of the scan with the highest PCE
+        of a pixel of the substrate label, or None if it has none. Only scans
+        of the given condition and scan direction (either by default) in the
+        log at source are considered, or of all logs if source is None.
+        """
+
+        where = 'Label = ? AND Pixel = ? AND Condition = ?'
+        params = (label, pixel, condition)
+        if scan_direction is not None:
+            where += ' AND Scan_direction = ?'
+            params += (scan_direction, )
+        row = self._lookup(where + ' AND PCE IS NOT NULL', params, 'PCE DESC',
+                           ['Vmp'], source)
+        if row is None:
+            return None
+        return row['Vmp']
+
+
+def main(argv=None):
+    """
+    Sync or append to the database, or look up the best pixel of a substrate
+    or the maximum power voltage of a pixel, from the command line arguments
+    in argv (sys.argv by default), and print the results tab-separated.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Store and query J-V log rows in a database')
+    parser.add_argument('db_path',
+                        type=str,
+                        help='Path of the database file')
+    commands = parser.add_subparsers(dest='command')
+    sync = commands.add_parser('sync',
+                               help='Add new rows of a log and print how '
+                               'many were added')
+    sync.add_argument('log_path', type=str, help='Path of the J-V log')
+    append = commands.add_parser('append',
+                                 help='Append rows to a log and the database')
+    append.add_argument('log_path', type=str, help='Path of the J-V log')
+    append.add_argument('rows',
+                        type=str,
+                        nargs='+',
+                        help='Tab-separated rows of the log')
+    best = commands.add_parser('best_pixel',
+                               help='Print the pixel, Vmp, and PCE of the '
+                               'best scan of a substrate')
+    best.add_argument('label', type=str, help='Substrate label')
+    vmp = commands.add_parser('vmp',
+                              help='Print the Vmp of the best scan of a pixel')
+    vmp.add_argument('label', type=str, help='Substrate label')
+    vmp.add_argument('pixel', type=int, help='Pixel number')
+    vmp.add_argument('--scan_direction',
+                     type=str,
+                     default=None,
+                     help='Only consider scans in this direction, LH or HL')
+    for command in [best, vmp]:
+        command.add_argument('--source',
+                             type=str,
+                             default=None,
+                             help='Only consider rows of this J-V log')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('a command is required')
+
+    if args.command in ['best_pixel', 'vmp']:
+        args.label = parse_value(args.label)
+
+    with MeasurementDB(args.db_path) as db:
+        if args.command == 'sync':
+            print(db.sync_log(args.log_path))
+        elif args.command == 'append':
+            print(db.append(args.log_path, args.rows))
+        elif args.command == 'best_pixel':
+            row = db.best_pixel(args.label, source=args.source)
+            if row is None:
+                parser.exit(1, 'No light scans of ' + str(args.label) + '\n')
+            print(str(row['Pixel']) + '\t' + str(row['Vmp']) + '\t' +
+                  str(row['PCE']))
+        elif args.command == 'vmp':
+            Vmp = db.max_power_voltage(args.label,
+                                       args.pixel,
+                                       scan_direction=args.scan_direction,
+                                       source=args.source)
+            if Vmp is None:
+                parser.exit(1, 'No light scans of ' + str(args.label) +
+                            ' pixel ' + str(args.pixel) + '\n')
+            print(Vmp)
+
+
+if __name__ == '__main__':
+    main()
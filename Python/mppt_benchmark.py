@@ -0,0 +1,184 @@
+# This script benchmarks the throughput and convergence speed of the max power
+# point tracker and its tracking algorithms against simulated Keithley 2400s,
+# so it can be run without any hardware attached.
+
+import argparse
+
+import numpy as np
+
+import keithleysim
+import mpptlib
+
+# Parse benchmark settings from command line arguments, e.g.
+# python mppt_benchmark.py --t_track 10 --latency 0.002
+parser = argparse.ArgumentParser(
+    description='Benchmark the max power point tracker on simulated devices')
+parser.add_argument('--modes',
+                    nargs='+',
+                    default=['point', 'buffered', 'pipelined'],
+                    choices=['point', 'buffered', 'pipelined'],
+                    help='Tracking modes to benchmark')
+parser.add_argument('--algorithms',
+                    nargs='+',
+                    default=['steepest'],
+                    choices=list(mpptlib.ALGORITHMS),
+                    help='Tracking algorithms to benchmark')
+parser.add_argument('--t_track',
+                    type=float,
+                    default=5,
+                    help='Time in seconds to track max power for')
+parser.add_argument('--initial_V',
+                    type=float,
+                    default=0.7,
+                    help='Seed voltage for max power tracker')
+parser.add_argument('--block_size',
+                    type=int,
+                    default=10,
+                    help='Number of points per buffered transfer')
+parser.add_argument('--channels',
+                    type=int,
+                    default=1,
+                    help='Number of simulated Keithleys to track in parallel')
+parser.add_argument('--latency',
+                    type=float,
+                    default=0.001,
+                    help='Time taken by each bus transaction in seconds')
+parser.add_argument('--noise',
+                    type=float,
+                    default=1e-7,
+                    help='Standard deviation of the current noise in A')
+parser.add_argument('--drift',
+                    type=float,
+                    default=0,
+                    help='Fractional change of the photocurrent per second')
+parser.add_argument('--step_time',
+                    type=float,
+                    default=None,
+                    help='Time after the start of tracking in seconds at '
+                    'which the light intensity changes')
+parser.add_argument('--step_factor',
+                    type=float,
+                    default=0.5,
+                    help='Factor the light intensity changes by at step_time')
+parser.add_argument('--seed',
+                    type=int,
+                    default=0,
+                    help='Seed for the random number generators')
+args = parser.parse_args()
+
+# Device area and light intensity of every simulated pixel
+area = 0.15
+suns = 1
+
+# Fraction of the maximum power that counts as converged
+threshold = 0.99
+
+
+def convergence(data, device, t_light, t_end=None):
+    """
+    Find how long the tracker took to reach the maximum power point of a
+    simulated device after the light was turned on or changed at t_light,
+    from the derived data of a SampleBuffer, considering samples up to t_end.
+
+    Returns the time (s) and the number of samples taken until the power first
+    reached the threshold fraction of the maximum, or None for both if it
+    never did, and the mean fraction of the maximum power extracted after
+    that.
+    """
+
+    # The maximum power changes if the photocurrent drifts, so interpolate it
+    # between a few points in time
+    light = data[data[:, 0] >= t_light]
+    if t_end is not None:
+        light = light[light[:, 0] < t_end]
+    t_grid = np.linspace(light[0, 0], light[-1, 0], 20)
+    P_max = np.interp(light[:, 0], t_grid,
+                      [device.max_power(t)[1] for t in t_grid])
+    fraction = -light[:, 4] / P_max
+
+    converged = np.nonzero(fraction >= threshold)[0]
+    if len(converged) == 0:
+        return None, None, np.mean(fraction)
+    i = converged[0]
+    return light[i, 0] - t_light, i + 1, np.mean(fraction[i:])
+
+
+def transfers(mode, n_conv):
+    """
+    Return the number of round-trips to the instrument taken for n_conv
+    samples in mode, or None if n_conv is None.
+    """
+
+    if n_conv is None:
+        return None
+    if mode == 'buffered':
+        return int(np.ceil(n_conv / args.block_size))
+    return n_conv
+
+
+def format_result(t_conv, n_conv, mean_fraction, mode):
+    # Format the results of convergence() as columns of the table
+    return (str(t_conv if t_conv is None else round(t_conv, 3)) + '\t' +
+            str(n_conv) + '\t' + str(transfers(mode, n_conv)) + '\t' +
+            str(round(mean_fraction, 4)))
+
+
+# Run each algorithm in each mode and print a table of the results
+columns = ['Time to ' + str(threshold * 100) + '% Pmax (s)',
+           'Samples to ' + str(threshold * 100) + '% Pmax',
+           'Round-trips to ' + str(threshold * 100) + '% Pmax',
+           'Mean fraction of Pmax']
+header = ['Algorithm', 'Mode', 'Channel', 'Points', 'Points/s'] + columns
+if args.step_time is not None:
+    header += ['After step: ' + c for c in columns]
+print('\t'.join(header))
+
+# The timestamps of every tracker start when tracking starts and the shutter
+# is opened after 3 s in the dark
+t_light = 3
+if args.step_time is not None:
+    t_step = t_light + args.step_time
+else:
+    t_step = None
+
+np.random.seed(args.seed)
+for algorithm in args.algorithms:
+    for mode in args.modes:
+        channels = []
+        for i in range(args.channels):
+            device = keithleysim.SimulatedKeithley2400(
+                area=area,
+                suns=suns,
+                drift=args.drift,
+                step_time=t_step,
+                step_factor=args.step_factor,
+                noise=args.noise,
+                latency=args.latency,
+                seed=args.seed + i)
+            mpptlib.configure_keithley(device)
+            channels.append({'keithley': device,
+                             'initial_V': args.initial_V,
+                             'samples': mpptlib.SampleBuffer(area, suns),
+                             'counters': mpptlib.LatencyCounters(),
+                             'shutter': True})
+
+        rate = mpptlib.track_max_power_parallel(channels, args.t_track, mode,
+                                                args.block_size, algorithm)
+
+        for i, channel in enumerate(channels):
+            mpptlib.close_keithley(channel['keithley'])
+            if channel['error'] is not None:
+                raise channel['error']
+
+            data = channel['samples'].derived()
+            row = (algorithm + '\t' + mode + '\t' + str(i) + '\t' +
+                   str(channel['points']) + '\t' +
+                   str(round(channel['rate'], 1)) + '\t' +
+                   format_result(*convergence(data, channel['keithley'],
+                                              t_light, t_step), mode))
+            if t_step is not None:
+                row += '\t' + format_result(
+                    *convergence(data, channel['keithley'], t_step), mode)
+            print(row)
+        if args.channels > 1:
+            print(algorithm + '\t' + mode + '\tall\t\t' + str(round(rate, 1)))
@@ -0,0 +1,1251 @@
+# Library of functions and classes for acquiring and storing maximum power
+# point tracking data.
+
+import collections
+import os
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+
+import keithleysim
+
+# Header of max power stabilisation data files
+HEADER = ('Time (s)' + '\t' + 'V' + '\t' + 'I (A)' + '\t' + 'J (mA/cm^2)' +
+          '\t' + 'P (W)' + '\t' + 'PCE (%)')
+
+# VISA resource manager, created when the first real instrument is opened
+_resource_manager = None
+
+
+class SampleBuffer:
+    """
+    Column-oriented store for raw maximum power point tracking samples.
+
+    Time, voltage, and current are written into preallocated arrays of
+    chunk_size samples with one row per column. When a chunk is full a new one
+    is allocated, so appending never copies data that has already been stored.
+    Current density, power, and efficiency are not stored. They are derived
+    from the raw columns in one vectorised pass when the data are read out
+    with derived().
+
+    If a DataWriter is given, samples that have not yet been written are
+    derived and handed to it every flush_points samples or flush_interval
+    seconds, whichever comes first. Chunks that have been written in full are
+    then released, so memory use stays bounded however long the run is.
+
+    area = device area in cm^2
+    suns = number of suns equivalent illumination intensity
+    chunk_size = number of samples allocated at a time
+    writer = DataWriter to stream samples to (optional)
+    flush_points = maximum number of samples held before writing
+    flush_interval = maximum time in seconds between writes
+    """
+
+    def __init__(self,
+                 area,
+                 suns,
+                 chunk_size=10000,
+                 writer=None,
+                 flush_points=1000,
+                 flush_interval=5):
+        self.area = area
+        self.suns = suns
+        self.chunk_size = chunk_size
+        self.writer = writer
+        self.flush_points = flush_points
+        self.flush_interval = flush_interval
+        self._chunks = []
+        self._n = chunk_size  # number of samples used in the last chunk
+        self._offset = 0  # number of samples released from memory
+        self._flushed = 0  # number of samples handed to the writer
+        self._t_flush = time.time()
+
+    def __len__(self):
+        return (self._offset + (len(self._chunks) - 1) * self.chunk_size +
+                self._n)
+
+    def _check_flush(self):
+        if self.writer is not None:
+            if ((len(self) - self._flushed >= self.flush_points) or
+                    (time.time() - self._t_flush >= self.flush_interval)):
+                self.flush()
+
+    def _new_chunk(self):
+        self._chunks.append(np.empty((3, self.chunk_size)))
+        self._n = 0
+
+    def append(self, t, V, I):
+        """
+        Add a single sample of time (s), voltage (V), and current (A).
+        """
+
+        if self._n == self.chunk_size:
+            self._new_chunk()
+        chunk = self._chunks[-1]
+        chunk[0, self._n] = t
+        chunk[1, self._n] = V
+        chunk[2, self._n] = I
+        self._n += 1
+        self._check_flush()
+
+    def extend(self, t, V, I):
+        """
+        Add a block of samples given as equal length arrays of time (s),
+        voltage (V), and current (A).
+        """
+
+        block = np.vstack((t, V, I))
+        i = 0
+        while i < block.shape[1]:
+            if self._n == self.chunk_size:
+                self._new_chunk()
+            n = min(self.chunk_size - self._n, block.shape[1] - i)
+            self._chunks[-1][:, self._n:self._n + n] = block[:, i:i + n]
+            self._n += n
+            i += n
+        self._check_flush()
+
+    def raw(self, start=0):
+        """
+        Return the samples held in memory from index start onwards as a (3, n)
+        array of time, voltage, and current. Indices count from the first
+        sample held in memory.
+        """
+
+        if len(self._chunks) == 0:
+            return np.empty((3, 0))
+        raw = np.concatenate(self._chunks, axis=1)
+        return raw[:, start:len(self) - self._offset]
+
+    def derived(self, start=0):
+        """
+        Return an (n, 6) array with columns of time (s), voltage (V), current
+        (A), current density (mA/cm^2), power (W), and efficiency (%), as
+        saved in max power stabilisation data files, for the samples held in
+        memory from index start onwards.
+        """
+
+        t, V, I = self.raw(start)
+        P = V * I
+        J = I * 1000 / self.area
+        PCE = np.absolute(P * 1000 * 100 / (100 * self.suns * self.area))
+        return np.column_stack((t, V, I, J, P, PCE))
+
+    def flush(self):
+        """
+        Hand all samples that haven't been written yet to the writer and
+        release the chunks that have been written in full.
+        """
+
+        if (self.writer is None) or (len(self) == self._flushed):
+            return
+        self.writer.write(self.derived(self._flushed - self._offset))
+        self._flushed = len(self)
+        self._t_flush = time.time()
+        if len(self._chunks) > 1:
+            self._offset += (len(self._chunks) - 1) * self.chunk_size
+            del self._chunks[:-1]
+
+
+class Decimator:
+    """
+    Reduces blocks of derived samples to one row per fixed output interval,
+    so the size of a data file depends on the length of the run rather than
+    on how fast the tracker measures.
+
+    Samples are grouped into consecutive intervals of interval seconds
+    counted from zero. Each interval with samples becomes a single row of the
+    mean of every column, timed at the middle of the interval. If aggregates
+    is True the minimum and maximum of every column except time, and the
+    number of samples in the interval, are added as extra columns after the
+    usual ones. The last interval of a block may still receive samples, so it
+    is held back until the next block or until reduce() is called with final
+    set to True.
+
+    interval = output interval in s
+    aggregates = whether to add min/max columns and the sample count
+    """
+
+    def __init__(self, interval, aggregates=False):
+        if interval <= 0:
+            raise ValueError('interval must be greater than zero')
+        self.interval = interval
+        self.aggregates = aggregates
+        self._pending = None
+
+    def header(self, header=HEADER):
+        """
+        Return the header line of a file of reduced data given the header of
+        the raw data.
+        """
+
+        if not self.aggregates:
+            return header
+        names = header.split('\t')[1:]
+        return '\t'.join([header] + ['Min ' + name for name in names] +
+                         ['Max ' + name
+                          for name in names] + ['Samples'])
+
+    def reduce(self, block, final=False):
+        """
+        Return the rows of reduced data for all complete intervals in an
+        (n, m) array of samples ordered by time, with column 0 as time, and
+        any samples held back from the previous block. block can be None if
+        there are no new samples. All intervals are treated as complete if
+        final is True.
+        """
+
+        if block is None:
+            block = self._pending
+        elif self._pending is not None:
+            block = np.concatenate((self._pending, block))
+        self._pending = None
+        if block is None:
+            return np.empty((0, 0))
+        bins = np.floor(block[:, 0] / self.interval)
+        if (not final) and (len(block) > 0):
+            last = bins == bins[-1]
+            self._pending = block[last]
+            block = block[~last]
+            bins = bins[~last]
+        if len(block) == 0:
+            return block
+
+        # Find the first sample of each interval and reduce the samples
+        # between them in one pass per statistic
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        counts = np.diff(np.r_[starts, len(block)])
+        mean = np.add.reduceat(block, starts, axis=0) / counts[:, None]
+        mean[:, 0] = (bins[starts] + 0.5) * self.interval
+        if not self.aggregates:
+            return mean
+        return np.column_stack(
+            (mean, np.minimum.reduceat(block[:, 1:], starts, axis=0),
+             np.maximum.reduceat(block[:, 1:], starts, axis=0), counts))
+
+
+class DataWriter(threading.Thread):
+    """
+    Background thread that streams blocks of samples to a max power
+    stabilisation data file.
+
+    The file is created with the usual tab-separated header when the writer
+    is, so a path that can't be written raises before the measurement
+    starts. Every block passed to write() is appended with CRLF line endings
+    and flushed to the operating system, so the data measured so far survive
+    a crash of the measurement. If fsync is True each block is also forced
+    to disk. write() only queues the block, so the caller never waits for the
+    disk. Any error raised while writing is re-raised by close().
+
+    If a Decimator is given, blocks are reduced by it in the writer thread
+    before they are written, so the tracker can measure at full speed while
+    the file is recorded at a fixed cadence.
+
+    path = path of the data file
+    header = header line of the raw data
+    fmt = format of each number in the data file
+    fsync = whether to force each block to disk after writing it
+    decimator = Decimator to reduce blocks with (optional)
+    """
+
+    def __init__(self,
+                 path,
+                 header=HEADER,
+                 fmt='%.9f',
+                 fsync=False,
+                 decimator=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.path = path
+        self.decimator = decimator
+        if decimator is not None:
+            header = decimator.header(header)
+        self.header = header
+        self.fmt = fmt
+        self.fsync = fsync
+        self.error = None
+        self._queue = queue.Queue()
+        self._file = open(path, 'wb')
+        try:
+            self._file.write((header + '\r\n').encode('latin-1'))
+        except Exception:
+            self._file.close()
+            raise
+        self.start()
+
+    def write(self, block):
+        """
+        Queue an (n, m) array of samples to be appended to the file.
+        """
+
+        self._queue.put(block)
+
+    def close(self):
+        """
+        Write any queued blocks, close the file, and stop the thread.
+        """
+
+        self._queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def _save(self, f, block):
+        # Append a block to the open file and flush it
+        if self.decimator is not None:
+            block = self.decimator.reduce(block, final=block is None)
+        np.savetxt(f, block, fmt=self.fmt, delimiter='\t', newline='\r\n')
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def run(self):
+        try:
+            with self._file as f:
+                block = self._queue.get()
+                while block is not None:
+                    self._save(f, block)
+                    block = self._queue.get()
+                if self.decimator is not None:
+                    # Write the interval held back by the decimator
+                    self._save(f, None)
+        except Exception as e:
+            self.error = e
+
+
+class LatencyCounters:
+    """
+    Thread-safe accumulators for the time spent in each stage of a
+    measurement loop.
+
+    Stages are identified by name and are reported in the order they were
+    first added.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = collections.OrderedDict()
+
+    def add(self, stage, seconds):
+        """
+        Add one timing of seconds to the named stage.
+        """
+
+        with self._lock:
+            if stage not in self._stats:
+                self._stats[stage] = [0, 0.0, 0.0]
+            stats = self._stats[stage]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def summary(self):
+        """
+        Return a dictionary containing the count, total time, mean time, and
+        maximum time in seconds of each stage.
+        """
+
+        with self._lock:
+            return collections.OrderedDict(
+                (stage, {'count': count,
+                         'total': total,
+                         'mean': total / count,
+                         'max': max_t})
+                for stage, (count, total, max_t) in self._stats.items())
+
+    def report(self):
+        """
+        Return the summary formatted as a table with one line per stage and
+        times in milliseconds.
+        """
+
+        lines = ['Stage\tCount\tMean (ms)\tMax (ms)\tTotal (s)']
+        for stage, stats in self.summary().items():
+            lines.append(stage + '\t' + str(stats['count']) + '\t' +
+                         ('%.3f' % (stats['mean'] * 1000)) + '\t' +
+                         ('%.3f' % (stats['max'] * 1000)) + '\t' +
+                         ('%.3f' % stats['total']))
+        return '\n'.join(lines)
+
+
+def scaled_step(I, dP_dV, k, min_step, max_step):
+    """
+    Return a voltage step scaled by the local gradient of the power relative
+    to the current, k * |dP/dV| / |I|, limited to between min_step and
+    max_step. The ratio is 1 at short-circuit and 0 at the maximum power
+    point whatever the device area or light intensity. min_step is returned
+    if the gradient is unknown.
+    """
+
+    if (dP_dV is None) or (I == 0):
+        return min_step
+    return min(max(k * abs(dP_dV) / abs(I), min_step), max_step)
+
+
+class TrackingAlgorithm:
+    """
+    Base class for maximum power point tracking algorithms.
+
+    update() is called with the voltage and current measured at each new
+    setpoint and returns the next setpoint. Powers follow the sign convention
+    of the Keithley, so P = V * I is negative when the cell generates power and
+    the maximum power point is the minimum of P. A block of readings swept
+    around a setpoint can be passed as arrays instead, in which case the local
+    gradients dP/dV and dI/dV are found from linear fits to the block rather
+    than from the difference to the previous setpoint.
+
+    Subclasses implement next_voltage(V, I, P, dP_dV, dI_dV), which returns
+    the next setpoint. The gradients are None when they can't be found, e.g.
+    when the voltage hasn't changed. While it is called, V_prev, I_prev, and
+    P_prev hold the values of the previous setpoint (None the first time).
+    """
+
+    def __init__(self):
+        self.V_prev = None
+        self.I_prev = None
+        self.P_prev = None
+
+    def update(self, V, I):
+        """
+        Return the next setpoint given the voltage(s) V and current(s) I
+        measured at the current setpoint.
+        """
+
+        V = np.atleast_1d(np.asarray(V, dtype=float))
+        I = np.atleast_1d(np.asarray(I, dtype=float))
+        V_mean = np.mean(V)
+        I_mean = np.mean(I)
+        P = np.mean(V * I)
+        dP_dV = None
+        dI_dV = None
+        if np.ptp(V) > 0:
+            dP_dV = np.polyfit(V, V * I, 1)[0]
+            dI_dV = np.polyfit(V, I, 1)[0]
+        elif (self.V_prev is not None) and (V_mean != self.V_prev):
+            dP_dV = (P - self.P_prev) / (V_mean - self.V_prev)
+            dI_dV = (I_mean - self.I_prev) / (V_mean - self.V_prev)
+        V_next = self.next_voltage(V_mean, I_mean, P, dP_dV, dI_dV)
+        self.V_prev = V_mean
+        self.I_prev = I_mean
+        self.P_prev = P
+        return V_next
+
+    def next_voltage(self, V, I, P, dP_dV, dI_dV):
+        raise NotImplementedError
+
+
+class SteepestDescent(TrackingAlgorithm):
+    """
+    Tracking based on the method of steepest descent as follows:
+
+    V_i+1 = V_i - a * (P_i - P_i-1) / (V_i - V_i-1)
+
+    where V is the applied voltage, P is the power output, i is the current
+    time step, i-1 is the previous step, and i+1 will be the next step. The
+    learning rate, a, limits or increases the step size and should be tuned to
+    ensure the voltage step can update fast enough to follow changes in the
+    output but without overshooting. When the voltage stabilises at the
+    maximum power point (V_i+1 = V_i) a small purturbation is either added or
+    subtracted randomly to ensure that the algorithm can still track changes
+    after a period of stability.
+
+    a = learning rate
+    """
+
+    def __init__(self, a=0.1):
+        TrackingAlgorithm.__init__(self)
+        self.a = a
+
+    def next_voltage(self, V, I, P, dP_dV, dI_dV):
+        if dP_dV is None:
+            dP_dV = np.sign((1 - (-1)) * np.random.random_sample() + (
+                -1)) * 0.002
+        return V - self.a * dP_dV
+
+
+class PerturbObserve(TrackingAlgorithm):
+    """
+    Adaptive-step perturb and observe tracking.
+
+    The voltage keeps stepping in the same direction while the power output
+    increases and reverses direction when it falls. The step is scaled by
+    the local gradient (see scaled_step), so it is large far from the maximum
+    power point and shrinks to min_step, which keeps perturbing the voltage,
+    close to it.
+
+    k = step scaling factor in V
+    min_step = minimum step in V
+    max_step = maximum step in V
+    """
+
+    def __init__(self, k=0.05, min_step=0.001, max_step=0.05):
+        TrackingAlgorithm.__init__(self)
+        self.k = k
+        self.min_step = min_step
+        self.max_step = max_step
+        self.direction = 1
+
+    def next_voltage(self, V, I, P, dP_dV, dI_dV):
+        if (self.P_prev is not None) and (P > self.P_prev):
+            self.direction = -self.direction
+        return V + self.direction * scaled_step(I, dP_dV, self.k,
+                                                self.min_step, self.max_step)
+
+
+class IncrementalConductance(TrackingAlgorithm):
+    """
+    Variable-step incremental conductance tracking.
+
+    At the maximum power point dP/dV = I + V * dI/dV = 0, i.e. the
+    incremental conductance dI/dV equals -I/V. The voltage steps down the
+    sign of I + V * dI/dV by a step scaled by the local gradient (see
+    scaled_step) and holds once |I + V * dI/dV| is within tol of |I|. While
+    the voltage is held, a change in current shows that the light intensity
+    has changed, and the voltage steps by min_step in the direction the
+    maximum power point moves: up if the photocurrent increased and down if
+    it decreased.
+
+    k = step scaling factor in V
+    min_step = minimum step in V
+    max_step = maximum step in V
+    tol = relative tolerance for being at the maximum power point
+    """
+
+    def __init__(self, k=0.05, min_step=0.001, max_step=0.05, tol=0.01):
+        TrackingAlgorithm.__init__(self)
+        self.k = k
+        self.min_step = min_step
+        self.max_step = max_step
+        self.tol = tol
+
+    def next_voltage(self, V, I, P, dP_dV, dI_dV):
+        if dI_dV is None:
+            if (self.I_prev is None) or (
+                    abs(I - self.I_prev) <= self.tol * abs(I)):
+                return V
+            return V - np.sign(I - self.I_prev) * self.min_step
+        error = I + V * dI_dV
+        if abs(error) <= self.tol * abs(I):
+            return V
+        return V - np.sign(error) * scaled_step(I, error, self.k,
+                                                self.min_step, self.max_step)
+
+
+class AdaptiveStep(TrackingAlgorithm):
+    """
+    Steepest descent with a step size scheduled by the local gradient:
+
+    V_i+1 = V_i - sign(dP/dV) * step
+
+    where the step is scaled by dP/dV relative to the current (see
+    scaled_step), so the same settings work for any device area or light
+    intensity. min_step keeps perturbing the voltage at steady state. If the
+    gradient is unknown the voltage steps by min_step in a random direction.
+
+    k = step scaling factor in V
+    min_step = minimum step in V
+    max_step = maximum step in V
+    """
+
+    def __init__(self, k=0.05, min_step=0.001, max_step=0.05):
+        TrackingAlgorithm.__init__(self)
+        self.k = k
+        self.min_step = min_step
+        self.max_step = max_step
+
+    def next_voltage(self, V, I, P, dP_dV, dI_dV):
+        if dP_dV is None:
+            direction = np.sign(np.random.random_sample() - 0.5)
+        else:
+            direction = np.sign(dP_dV)
+        return V - direction * scaled_step(I, dP_dV, self.k, self.min_step,
+                                           self.max_step)
+
+
+# Tracking algorithms that can be selected by name
+ALGORITHMS = collections.OrderedDict([('steepest', SteepestDescent),
+                                      ('po', PerturbObserve),
+                                      ('inccond', IncrementalConductance),
+                                      ('adaptive', AdaptiveStep)])
+
+
+def default_algorithm(mode):
+    """
+    Return the name of the tracking algorithm used by the tracker selected by
+    mode (see run_tracker) if none is given.
+
+    The pipelined tracker can only use every other reply, since the reply
+    measured while the next setpoint is computed is out of date. Steepest
+    descent moves by a fixed fraction of dP/dV per setpoint, so it needs
+    about twice as many round-trips in that mode to converge. The
+    pipelined tracker therefore uses incremental conductance, whose step is
+    scaled to the distance from the maximum power point. The others use
+    steepest descent.
+    """
+
+    if mode == 'pipelined':
+        return 'inccond'
+    return 'steepest'
+
+
+def open_keithley(resource):
+    """
+    Open the Keithley 2400 with the VISA resource name (resource) and return
+    it.
+
+    Resource names beginning with 'SIM' return a simulated Keithley instead,
+    a keithleysim.SimulatedKeithley2400 configured by any 'name=value' fields
+    separated by '::', e.g. 'SIM::jsc=22::latency=0.002'. pyvisa is only
+    imported when a real instrument is opened, so the simulation also works
+    where it isn't installed.
+    """
+
+    global _resource_manager
+
+    fields = resource.split('::')
+    if fields[0].upper() == 'SIM':
+        kwargs = {}
+        for field in fields[1:]:
+            name, value = field.split('=')
+            if name == 'seed':
+                kwargs[name] = int(value)
+            else:
+                kwargs[name] = float(value)
+        return keithleysim.SimulatedKeithley2400(**kwargs)
+
+    if _resource_manager is None:
+        import pyvisa
+        _resource_manager = pyvisa.ResourceManager()
+    return _resource_manager.open_resource(resource)
+
+
+def configure_keithley(keithley,
+                       V_range=2,
+                       I_range=0.1,
+                       compliance_I=0.1,
+                       nplc=0.01,
+                       delay=0):
+    """
+    Reset a Keithley 2400 (keithley) and configure it to source voltage and
+    measure current for maximum power point tracking.
+
+    V_range = voltage range
+    I_range = current range
+    compliance_I = compliance level
+    nplc = integration filter number of power-line cycles
+    delay = source delay in seconds
+    """
+
+    keithley.query('*IDN?')
+    keithley.write('*RST')
+    keithley.encoding = 'latin-1'
+    keithley.write('OUTP OFF')  # Disable the output
+    keithley.write(':SYST:RSEN 1')  # Enable 4-wire sense
+    keithley.write(':SOUR:CLE:AUTO OFF')  # Don't auto-off source after meas.
+    keithley.write(':SOUR:FUNC VOLT')  # Set source mode to voltage
+    keithley.write(':SOUR:VOLT:RANG ' + str(V_range))  # Set the voltage range
+    keithley.write(':SOUR:CURR:RANG ' + str(I_range))  # Set the current range
+    keithley.write(':SOUR:DEL ' + str(delay))  # Set the delay
+    keithley.write(':SENS:CURR:PROT ' + str(compliance_I))  # Set compliance
+    keithley.write(':SENS:CURR:NPLC ' + str(nplc))  # Set integration filter
+    keithley.write(':FORM:ELEM VOLT,CURR,TIME')  # Only return V, I, and t
+    keithley.write(':DISP:ENAB 0')  # Turn off display
+
+
+def close_keithley(keithley, shutter=True):
+    """
+    Disable the output of a Keithley 2400 (keithley), close the shutter of the
+    solar simulator if shutter is True, and turn the display back on.
+    """
+
+    keithley.write('OUTP OFF')  # Disable output
+    if shutter:
+        keithley.write(':SOUR2:TTL 1')  # Close shutter
+    keithley.write(':DISP:ENAB 1')  # Turn on display
+
+
+def measure_voltage_list(keithley, voltage_list):
+    """
+    Source a list of voltages (voltage_list) from the source memory of the
+    Keithley and return the readings for every point as an array with columns
+    of voltage, current, and instrument timestamp.
+
+    The whole list is sourced and measured at instrument speed with a single
+    bus transfer for the readings, rather than a write and a query per point.
+    The source must be in list mode (':SOUR:VOLT:MODE LIST') before calling.
+    The fixed source level is set to the last voltage in the list so the
+    output holds near it between blocks.
+    """
+
+    keithley.write(':SOUR:VOLT ' + str(voltage_list[-1]) +
+                       ';:SOUR:LIST:VOLT ' +
+                       ','.join([str(v) for v in voltage_list]) +
+                       ';:TRIG:COUN ' + str(len(voltage_list)))
+    data = keithley.query(':READ?')  # Sweep the list and fetch all data
+    data = np.array(data.split(','), dtype=float)
+    return data.reshape(-1, 3)
+
+
+def measure_sample_rates(keithley, num_points, block_size):
+    """
+    Measure the number of points per second that can be acquired at 0 V in the
+    dark using a query per point and using buffered voltage lists of
+    block_size points. Returns the two rates as a tuple.
+
+    On a simulated Keithley taking 1 ms per bus transaction (the keithleysim
+    default) the per-point loop reaches about 300 points/s, and buffered
+    lists about 1,900 points/s with 10 point blocks and 4,000 points/s with
+    100 point blocks.
+    """
+
+    keithley.write(':SOUR:VOLT 0')
+    keithley.write('OUTP ON')
+
+    # Time the per-point loop
+    t_start = time.time()
+    for i in range(num_points):
+        keithley.write(':SOUR:VOLT 0')
+        keithley.query(':MEAS:CURR?')
+    rate_point = num_points / (time.time() - t_start)
+
+    # Time the buffered loop
+    keithley.write(':SOUR:VOLT:MODE LIST')
+    points = 0
+    t_start = time.time()
+    while points < num_points:
+        points += len(measure_voltage_list(keithley, [0] * block_size))
+    rate_buffered = points / (time.time() - t_start)
+    keithley.write(':SOUR:VOLT:MODE FIXED')
+    keithley.write(':TRIG:COUN 1')
+    keithley.write('OUTP OFF')
+
+    return rate_point, rate_buffered
+
+
+# Function for tracking maximum power point
+def track_max_power(keithley,
+                    initial_V,
+                    t_track,
+                    samples,
+                    shutter=True,
+                    algorithm=None):
+    """
+    Function for tracking the maximum power point of a solar cell starting at
+    the seed voltage (initial_V) for a fixed amount of time (t_track), taking
+    as many measurements as possible.
+
+    The setpoint is updated after every measurement by algorithm, a
+    TrackingAlgorithm, which is SteepestDescent by default.
+
+    The raw samples are added to samples, a SampleBuffer. The shutter of the
+    solar simulator is only opened by the Keithley (keithley) if shutter is
+    True.
+    """
+
+    if algorithm is None:
+        algorithm = SteepestDescent()
+
+    # Start timing
+    t_start = time.time()
+    t = time.time()
+
+    # Turn on the Keithley output at zero volts and measure for 4s in the dark
+    keithley.write(':SOUR:VOLT ' + '0')
+    keithley.write('OUTP ON')
+    while t - t_start < 3:
+        data = keithley.query(':MEAS:CURR?')  # Measure the current
+        data = data.split(',')
+        samples.append(t - t_start, float(data[0]), float(data[1]))
+        t = time.time()
+
+    # Open the shutter of the solar simulator and take a few measurements
+    # around the seed voltage to initialise the tracking algorithm.
+    if shutter:
+        keithley.write(':SOUR2:TTL 0')  # open the shutter
+    for V in [initial_V - 0.02, initial_V]:
+        keithley.write(':SOUR:VOLT ' + str(V))
+        data = keithley.query(':MEAS:CURR?')  # Measure the current
+        data = data.split(',')
+        voltage = float(data[0])
+        current = float(data[1])
+        samples.append(t - t_start, voltage, current)
+        V = algorithm.update(voltage, current)
+        t = time.time()
+
+    # Start tracking the maximum point
+    while t - t_start < t_track + 3:
+        keithley.write(':SOUR:VOLT ' + str(V))
+        data = keithley.query(':MEAS:CURR?')  # Measure the current
+        data = data.split(',')
+        voltage = float(data[0])
+        current = float(data[1])
+        samples.append(t - t_start, voltage, current)
+        V = algorithm.update(voltage, current)
+        t = time.time()
+
+
+# Function for tracking maximum power point using buffered voltage lists
+def track_max_power_buffered(keithley,
+                             initial_V,
+                             t_track,
+                             block_size,
+                             samples,
+                             shutter=True,
+                             algorithm=None):
+    """
+    Function for tracking the maximum power point of a solar cell starting at
+    the seed voltage (initial_V) for a fixed amount of time (t_track) using
+    blocks of block_size points sourced from the Keithley source memory.
+
+    Each block sweeps a short list of voltages spanning V_span around the
+    current setpoint. The whole block is passed to algorithm, a
+    TrackingAlgorithm (SteepestDescent by default), which finds the local
+    gradients from linear fits to the block and returns the next setpoint.
+
+    Sweeping the block around the operating point keeps perturbing the
+    voltage so changes in the output can still be tracked after a period of
+    stability. Times are taken from the instrument timestamps, which are
+    zeroed when tracking starts. The raw samples are added to samples, a
+    SampleBuffer, and the shutter is only opened if shutter is True.
+    """
+
+    if algorithm is None:
+        algorithm = SteepestDescent()
+
+    def add_readings(readings):
+        # Add a block of readings to the buffer and return the next setpoint
+        samples.extend(readings[:, 2], readings[:, 0], readings[:, 1])
+        return algorithm.update(readings[:, 0], readings[:, 1])
+
+    # Set the voltage span of each block
+    V_span = 0.02
+
+    # Turn on the Keithley output at zero volts and measure for 3s in the dark
+    keithley.write(':SOUR:VOLT 0')
+    keithley.write(':SOUR:VOLT:MODE LIST')
+    keithley.write(':SYST:TIME:RES')  # Zero the instrument timestamps
+    keithley.write('OUTP ON')
+    t_start = time.time()
+    t = time.time()
+    while t - t_start < 3:
+        samples.extend(
+            *measure_voltage_list(keithley, [0] * block_size)[:, [2, 0, 1]].T)
+        t = time.time()
+
+    # Open the shutter of the solar simulator and take a block of
+    # measurements up to the seed voltage to initialise the tracking algorithm.
+    if shutter:
+        keithley.write(':SOUR2:TTL 0')  # open the shutter
+    V = add_readings(
+        measure_voltage_list(
+            keithley, np.linspace(initial_V - V_span, initial_V, block_size)))
+    t = time.time()
+
+    # Start tracking the maximum point
+    while t - t_start < t_track + 3:
+        V = add_readings(
+            measure_voltage_list(
+                keithley,
+                np.linspace(V - V_span / 2, V + V_span / 2, block_size)))
+        t = time.time()
+
+    # Return the source to fixed mode at the last operating point
+    keithley.write(':SOUR:VOLT:MODE FIXED')
+    keithley.write(':TRIG:COUN 1')
+
+
+# Function for tracking maximum power point with separate acquisition and
+# tracking threads
+def track_max_power_pipelined(keithley,
+                              initial_V,
+                              t_track,
+                              samples,
+                              counters,
+                              shutter=True,
+                              algorithm=None):
+    """
+    Function for tracking the maximum power point of a solar cell starting at
+    the seed voltage (initial_V) for a fixed amount of time (t_track) in the
+    same way as track_max_power, but with instrument communication and
+    tracking computation in separate threads.
+
+    An acquisition thread only talks to the Keithley. It repeatedly applies
+    the latest setpoint it has been given and queries the current, passing
+    the unparsed replies to a queue. The calling thread consumes the replies,
+    parses them, adds them to samples (a SampleBuffer), and computes
+    the next setpoint with algorithm (a TrackingAlgorithm,
+    IncrementalConductance by default, see default_algorithm), which it
+    passes back to the acquisition thread through a second queue. Python
+    overhead therefore overlaps with the integration time of the instrument
+    rather than adding to it.
+
+    Each setpoint is tagged with a sequence number that is returned with
+    every reply measured at it. Replies measured at an out of date setpoint,
+    while the next one was being computed, are stored but not used for
+    tracking. The time spent in each stage is added to counters, a
+    LatencyCounters, and the shutter is only opened if shutter is True.
+    """
+
+    if algorithm is None:
+        algorithm = IncrementalConductance()
+
+    setpoints = queue.Queue()
+    replies = queue.Queue()
+    stop = threading.Event()
+
+    def acquire():
+        # Apply the latest setpoint and any command sent with it, measure, and
+        # queue the raw reply, until told to stop. If talking to the Keithley
+        # fails, queue the exception instead and stop, so the calling thread
+        # raises it rather than waiting for replies forever.
+        seq = -1
+        V = None
+        try:
+            while not stop.is_set():
+                t_loop = time.perf_counter()
+                try:
+                    while True:
+                        seq, V, command = setpoints.get_nowait()
+                        t_write = time.perf_counter()
+                        keithley.write(':SOUR:VOLT ' + str(V))
+                        if command is not None:
+                            keithley.write(command)
+                        counters.add('write', time.perf_counter() - t_write)
+                except queue.Empty:
+                    pass
+                t = time.time() - t_start
+                t_query = time.perf_counter()
+                data = keithley.query(':MEAS:CURR?')  # Measure the current
+                t_put = time.perf_counter()
+                counters.add('query', t_put - t_query)
+                replies.put((seq, t, data, t_put))
+                counters.add('acquisition loop',
+                             time.perf_counter() - t_loop)
+        except Exception as e:
+            replies.put(e)
+
+    # Turn on the Keithley output at zero volts and start measuring in the
+    # dark
+    t_start = time.time()
+    setpoints.put((0, 0, 'OUTP ON'))
+    acquisition = threading.Thread(target=acquire, daemon=True)
+    acquisition.start()
+
+    try:
+        seq = 0
+        t = 0
+        while t < t_track + 3:
+            reply = replies.get()
+            if isinstance(reply, Exception):
+                raise reply
+            seq_reply, t, data, t_put = reply
+            t_parse = time.perf_counter()
+            counters.add('reply queue', t_parse - t_put)
+            data = data.split(',')
+            voltage = float(data[0])
+            current = float(data[1])
+            samples.append(t, voltage, current)
+            t_compute = time.perf_counter()
+            counters.add('parse', t_compute - t_parse)
+
+            # After 3s in the dark, open the shutter of the solar simulator
+            # and measure twice around the seed voltage to initialise the
+            # tracking algorithm. Then start tracking the maximum power point
+            # using only replies measured at the latest setpoint.
+            if (seq == 0) and (t >= 3):
+                seq = 1
+                if shutter:
+                    command = ':SOUR2:TTL 0'  # open the shutter
+                else:
+                    command = None
+                setpoints.put((seq, initial_V - 0.02, command))
+            elif (seq_reply == seq) and (seq > 0):
+                V = algorithm.update(voltage, current)
+                if seq == 1:
+                    V = initial_V
+                seq += 1
+                setpoints.put((seq, V, None))
+            counters.add('compute', time.perf_counter() - t_compute)
+    finally:
+        # Stop the acquisition thread and keep any replies still queued
+        stop.set()
+        acquisition.join()
+        while not replies.empty():
+            reply = replies.get()
+            if isinstance(reply, Exception):
+                continue
+            seq_reply, t, data, t_put = reply
+            data = data.split(',')
+            samples.append(t, float(data[0]), float(data[1]))
+
+
+def run_tracker(keithley,
+                mode,
+                initial_V,
+                t_track,
+                samples,
+                block_size=10,
+                counters=None,
+                shutter=True,
+                algorithm=None):
+    """
+    Track the maximum power point with the Keithley (keithley) using the
+    tracker selected by mode: 'point' for track_max_power, 'buffered' for
+    track_max_power_buffered with blocks of block_size points, or 'pipelined'
+    for track_max_power_pipelined, which adds its stage timings to counters.
+    algorithm is the name of the tracking algorithm in ALGORITHMS, or None
+    for the default of the mode (see default_algorithm).
+    """
+
+    if algorithm is None:
+        algorithm = default_algorithm(mode)
+    algorithm = ALGORITHMS[algorithm]()
+    if mode == 'buffered':
+        track_max_power_buffered(keithley, initial_V, t_track, block_size,
+                                 samples, shutter, algorithm)
+    elif mode == 'pipelined':
+        track_max_power_pipelined(keithley, initial_V, t_track, samples,
+                                  counters, shutter, algorithm)
+    elif mode == 'point':
+        track_max_power(keithley, initial_V, t_track, samples, shutter,
+                        algorithm)
+    else:
+        raise ValueError('Unknown tracking mode: ' + str(mode))
+
+
+def track_max_power_parallel(channels,
+                             t_track,
+                             mode='point',
+                             block_size=10,
+                             algorithm=None):
+    """
+    Track the maximum power point of several solar cells concurrently for a
+    fixed amount of time (t_track), using one thread per Keithley.
+
+    channels is a list with a dictionary for each Keithley containing:
+
+        'keithley' = the instrument
+        'initial_V' = seed voltage for the tracker
+        'samples' = SampleBuffer to add the samples to
+        'counters' = LatencyCounters for the stage timings (pipelined mode)
+        'shutter' = whether this Keithley controls the shutter
+
+    mode and algorithm select the tracker and tracking algorithm used for
+    every channel (see run_tracker). All
+    threads start together so the dark and light phases of every channel line
+    up.
+
+    The number of points ('points'), the time taken ('time'), the points per
+    second ('rate'), and any exception raised while tracking ('error') are
+    added to each channel dictionary. An error on one channel doesn't stop the
+    others. Returns the aggregate points per second of all channels.
+    """
+
+    barrier = threading.Barrier(len(channels))
+
+    def run(channel):
+        # Track a single channel once every thread is ready
+        channel['error'] = None
+        barrier.wait()
+        t_begin = time.time()
+        try:
+            run_tracker(channel['keithley'], mode, channel['initial_V'],
+                        t_track, channel['samples'], block_size,
+                        channel['counters'], channel['shutter'], algorithm)
+        except Exception as e:
+            channel['error'] = e
+        channel['time'] = time.time() - t_begin
+        channel['points'] = len(channel['samples'])
+        channel['rate'] = channel['points'] / channel['time']
+
+    t_begin = time.time()
+    threads = [threading.Thread(target=run, args=(channel, ))
+               for channel in channels]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum([channel['points']
+                for channel in channels]) / (time.time() - t_begin)
+
+
+class MaxPowerPointTracker:
+    """
+    Maximum power point tracker that keeps a Keithley 2400 open and
+    configured between measurements.
+
+    The instrument is opened and configured, including a '*RST', once when
+    the tracker is created. Any number of pixels can then be measured with
+    track() without paying that cost again, either directly from Python or
+    through the command loop of serve() and serve_tcp(). close() turns the
+    display back on and closes the instrument.
+
+    resource = VISA resource name of the Keithley (see open_keithley)
+    mode = tracker to use (see run_tracker)
+    block_size = number of points per buffered transfer
+    algorithm = name of the tracking algorithm in ALGORITHMS, or None for the
+                default of the mode (see default_algorithm)
+    shutter = whether this Keithley controls the shutter
+    flush_points = maximum number of samples held before writing
+    flush_interval = maximum time in seconds between writes
+    fsync = whether to force each write of a data file to disk
+    output_interval = time in s between rows of the data files, or None to
+                      record every sample (see Decimator)
+    aggregates = whether to add min/max columns when output_interval is set
+    settings = keyword arguments passed to configure_keithley
+    """
+
+    def __init__(self,
+                 resource='GPIB0::24::INSTR',
+                 mode='point',
+                 block_size=10,
+                 algorithm=None,
+                 shutter=True,
+                 flush_points=1000,
+                 flush_interval=5,
+                 fsync=False,
+                 output_interval=None,
+                 aggregates=False,
+                 **settings):
+        if (block_size < 2) or (block_size > 100):
+            # The source memory list of the 2400 holds at most 100 points
+            raise ValueError('block_size must be between 2 and 100')
+        if algorithm is None:
+            algorithm = default_algorithm(mode)
+        if algorithm not in ALGORITHMS:
+            raise ValueError('Unknown tracking algorithm: ' + str(algorithm))
+        self.mode = mode
+        self.algorithm = algorithm
+        self.block_size = block_size
+        self.shutter = shutter
+        self.flush_points = flush_points
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.output_interval = output_interval
+        self.aggregates = aggregates
+        self.keithley = open_keithley(resource)
+        configure_keithley(self.keithley, **settings)
+
+    def track(self, path, initial_V, t_track, area, suns):
+        """
+        Track the maximum power point of a pixel with area (cm^2) under suns
+        equivalent illumination intensity, starting at the seed voltage
+        (initial_V) for a fixed amount of time (t_track), and stream the data
+        to a file at path.
+
+        The output is disabled and the shutter closed afterwards, even if
+        tracking fails. Returns a dictionary containing the number of points
+        ('points'), the time taken ('time'), the points per second ('rate'),
+        and the LatencyCounters of the measurement ('counters').
+        """
+
+        if self.output_interval is None:
+            decimator = None
+        else:
+            decimator = Decimator(self.output_interval, self.aggregates)
+        writer = DataWriter(path, fsync=self.fsync, decimator=decimator)
+        samples = SampleBuffer(area,
+                               suns,
+                               writer=writer,
+                               flush_points=self.flush_points,
+                               flush_interval=self.flush_interval)
+        counters = LatencyCounters()
+        t_begin = time.time()
+        try:
+            run_tracker(self.keithley, self.mode, initial_V, t_track, samples,
+                        self.block_size, counters, self.shutter,
+                        self.algorithm)
+        finally:
+            # Turn the output off even if the data can't be written
+            try:
+                samples.flush()
+                writer.close()
+            finally:
+                self.keithley.write('OUTP OFF')  # Disable output
+                if self.shutter:
+                    self.keithley.write(':SOUR2:TTL 1')  # Close shutter
+        t_elapsed = time.time() - t_begin
+
+        return {'points': len(samples),
+                'time': t_elapsed,
+                'rate': len(samples) / t_elapsed,
+                'counters': counters}
+
+    def serve(self, rfile, wfile):
+        """
+        Run a command loop that reads one tab-separated command per line from
+        rfile and writes one tab-separated reply line to wfile for each.
+
+        The commands are:
+
+            track folder_path file_name initial_V t_track area num_of_suns
+                Runs track() with the same arguments as the command line
+                script and replies 'OK points time points/s'.
+            ping
+                Replies 'OK'.
+            quit
+                Replies 'OK' and ends the loop.
+
+        Any failed command replies 'ERROR message' and the loop carries on.
+        Returns True if the loop ended with 'quit' or False if rfile ended.
+        """
+
+        for line in rfile:
+            command = line.rstrip('\r\n').split('\t')
+            try:
+                if command[0] == 'track':
+                    folderpath, filename = command[1:3]
+                    initial_V, t_track, area, suns = [float(arg)
+                                                      for arg in command[3:7]]
+                    result = self.track(folderpath + filename, initial_V,
+                                        t_track, area, suns)
+                    reply = ('OK\t' + str(result['points']) + '\t' +
+                             str(result['time']) + '\t' + str(result['rate']))
+                elif command[0] in ['ping', 'quit']:
+                    reply = 'OK'
+                else:
+                    raise ValueError('Unknown command: ' + command[0])
+            except Exception as e:
+                reply = 'ERROR\t' + str(e).replace('\n', ' ')
+            wfile.write(reply + '\n')
+            wfile.flush()
+            if command[0] == 'quit':
+                return True
+        return False
+
+    def serve_tcp(self, port, host='127.0.0.1'):
+        """
+        Listen for TCP connections on host and port and run the serve()
+        command loop for each client in turn until one sends 'quit'.
+        """
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        try:
+            quit = False
+            while not quit:
+                connection, address = server.accept()
+                with connection:
+                    rfile = connection.makefile('r', encoding='latin-1',
+                                                newline='')
+                    wfile = connection.makefile('w', encoding='latin-1',
+                                                newline='')
+                    quit = self.serve(rfile, wfile)
+                    rfile.close()
+                    wfile.close()
+        finally:
+            server.close()
+
+    def close(self):
+        """
+        Disable the output, close the shutter, turn the display back on, and
+        close the instrument.
+        """
+
+        close_keithley(self.keithley, self.shutter)
+        self.keithley.close()
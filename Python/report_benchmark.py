@@ -0,0 +1,130 @@
+# This script benchmarks the report generation and each of its stages on
+# synthetic experiments of increasing size, so it can be run without any
+# measurement data.
+
+import argparse
+import csv
+import shutil
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import reportgenlib as rgl
+import reportpipeline
+import synthexp
+
+# Parse benchmark settings from command line arguments, e.g.
+# python report_benchmark.py --substrates 10 100 --last_stage compute_yields
+parser = argparse.ArgumentParser(
+    description='Benchmark the report generation on synthetic experiments')
+parser.add_argument('--substrates',
+                    type=int,
+                    nargs='+',
+                    default=[10, 100, 1000],
+                    help='Numbers of substrates of the experiments')
+parser.add_argument('--pixels',
+                    type=int,
+                    default=8,
+                    help='Number of pixels on each substrate')
+parser.add_argument('--scans',
+                    type=int,
+                    default=1,
+                    help='Number of scans per pixel in each condition and '
+                    'direction')
+parser.add_argument('--points',
+                    type=int,
+                    default=101,
+                    help='Number of points in each J-V scan')
+parser.add_argument('--last_stage',
+                    default=reportpipeline.STAGES[-1],
+                    choices=reportpipeline.STAGES,
+                    help='Last stage of the pipeline to run, e.g. to leave '
+                    'out rendering figures for large experiments')
+parser.add_argument('--runs',
+                    type=int,
+                    default=2,
+                    help='Number of runs on each experiment. The first run '
+                    'starts without cached data or figures, later runs reuse '
+                    'them.')
+parser.add_argument('--workers',
+                    type=int,
+                    default=None,
+                    help='Number of processes used to render figures')
+parser.add_argument('--folder',
+                    type=str,
+                    default=None,
+                    help='Folder to write the experiments to, a temporary '
+                    'folder that is deleted afterwards by default')
+parser.add_argument('--output',
+                    type=str,
+                    default=None,
+                    help='Path of a CSV file to also save the results to')
+parser.add_argument('--seed',
+                    type=int,
+                    default=0,
+                    help='Seed for the random number generator')
+args = parser.parse_args()
+
+stages = reportpipeline.STAGES[:reportpipeline.STAGES.index(args.last_stage) +
+                               1]
+if args.folder is None:
+    root = tempfile.mkdtemp()
+else:
+    root = args.folder
+
+# Run the pipeline stage by stage on an experiment of each size and print a
+# table of the wall time, CPU time, and peak RSS of every stage and section
+# of figures
+header = ['Substrates', 'Run', 'Stage', 'Wall time (s)', 'CPU time (s)',
+          'Peak RSS (MB)']
+rows = []
+print('\t'.join(header))
+try:
+    for substrates in args.substrates:
+        start = time.perf_counter()
+        folderpath, log_file_name, weather_log = synthexp.write_experiment(
+            root + '/' + str(substrates),
+            substrates=substrates,
+            pixels=args.pixels,
+            scans=args.scans,
+            points=args.points,
+            seed=args.seed)
+        results = [[substrates, 'all', 'generate',
+                    round(time.perf_counter() - start, 4), None, None]]
+
+        # Start the first run without anything cached in memory
+        rgl.data_cache.clear()
+        for run in range(args.runs):
+            pipeline = reportpipeline.ReportPipeline(folderpath,
+                                                     log_file_name,
+                                                     workers=args.workers,
+                                                     weather_log=weather_log)
+            start = time.perf_counter()
+            for name in stages:
+                getattr(pipeline, name)()
+            total = time.perf_counter() - start
+            for name, timing in pipeline.timings.items():
+                if timing['peak_rss'] is None:
+                    rss = None
+                else:
+                    rss = round(timing['peak_rss'] / 1024**2, 1)
+                results.append([substrates, run, name,
+                                round(timing['wall'], 4),
+                                round(timing['cpu'], 4), rss])
+            results.append([substrates, run, 'total', round(total, 4), None,
+                            None])
+
+        for row in results:
+            print('\t'.join('' if x is None else str(x) for x in row))
+        rows += results
+finally:
+    if args.folder is None:
+        shutil.rmtree(root)
+
+if args.output is not None:
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -1,16 +1,32 @@
 # Library of functions for analysis and plotting of the Automated PV
 # Measurement data output.
 
+import collections
+import hashlib
+import inspect
+import itertools
+import json
 import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from functools import reduce
 
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from matplotlib import gridspec
 from pptx.enum.text import MSO_ANCHOR
 from pptx.util import Inches, Pt
-from scipy import signal
+from scipy import constants, signal, stats
+
+import diodefit
+
+# Size of a figure filling a quarter of a slide, i.e. half the width and
+# height of an A4 page in inches
+HALF_A4 = (5, 3.75)
 
 
 def title_image_slide(prs, title):
@@ -45,6 +61,293 @@ def title_image_slide(prs, title):
     return slide
 
 
+def read_data_file(filepath):
+    """
+
+    Function for reading a tab-separated data file into a 2D array with the
+    C parser of np.loadtxt, which is much faster than np.genfromtxt. Any
+    header lines are skipped and rows containing NaNs are removed, as after
+    reading the file with np.genfromtxt and filtering out NaNs.
+
+    """
+
+    # Count the header lines before the first numeric row
+    skiprows = 0
+    with open(filepath, 'rb') as f:
+        for line in f:
+            try:
+                float(line.split(b'\t')[0])
+                break
+            except ValueError:
+                skiprows += 1
+
+    try:
+        data = np.loadtxt(filepath,
+                          delimiter='\t',
+                          skiprows=skiprows,
+                          ndmin=2)
+    except ValueError:
+        # Fall back on the slower but more forgiving parser for files with
+        # text or missing values in the body
+        data = np.atleast_2d(np.genfromtxt(filepath, delimiter='\t'))
+
+    return data[~np.isnan(data).any(axis=1)]
+
+
+class DataCache:
+    """
+
+    Least recently used cache of data files read with read_data_file, so each
+    file is only parsed once however many figures it is used in.
+
+    Arrays are returned read-only because they are shared between callers.
+    The least recently used arrays are dropped when the arrays held take up
+    more than max_bytes, but the most recent one is always kept. If a
+    SidecarStore is given, files missing from memory are looked up in it
+    before they are parsed, and parsed files are added to it.
+
+    """
+
+    def __init__(self, max_bytes=512 * 1024**2, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def load(self, filepath):
+        """
+        Return the cleaned data in the file at filepath.
+        """
+
+        if filepath in self._data:
+            self.hits += 1
+            self._data.move_to_end(filepath)
+            return self._data[filepath]
+
+        self.misses += 1
+        data = None
+        if self.store is not None:
+            data = self.store.get(filepath)
+        if data is None:
+            data = read_data_file(filepath)
+            if self.store is not None:
+                self.store.put(filepath, data)
+        data.flags.writeable = False
+        self._data[filepath] = data
+        self.nbytes += data.nbytes
+        while (self.nbytes > self.max_bytes) and (len(self._data) > 1):
+            self.nbytes -= self._data.popitem(last=False)[1].nbytes
+        return data
+
+    def clear(self):
+        """
+        Drop all cached data.
+        """
+
+        self._data.clear()
+        self.nbytes = 0
+
+
+class SidecarStore:
+    """
+
+    Binary store of parsed data files and log files kept in a folder beside
+    the experiment data, so they don't have to be parsed again the next time
+    a report is generated.
+
+    Arrays of data files are held in batches of npz files (data_files_0.npz,
+    data_files_1.npz, ...) and parsed log files in logs.pkl. Each entry
+    records the modification time and size of the file it was parsed from
+    and is only used while both are unchanged. Only the npz file and key of
+    each stored array are kept in memory, and arrays are read from their
+    batch when they are requested. New arrays are held in memory until they
+    take up more than batch_bytes, when they are written out as a new batch,
+    so the store never holds more than about batch_bytes of arrays however
+    many files are parsed. Entries of later batches replace those of earlier
+    ones, and batches without any entries in use are deleted. save() writes
+    the remaining new arrays and the log files.
+
+    """
+
+    def __init__(self, folder, batch_bytes=64 * 1024**2):
+        self.folder = folder
+        self.batch_bytes = batch_bytes
+        self.logs_path = os.path.join(folder, 'logs.pkl')
+        self.changed = False
+        self._arrays = {}  # file path: [mtime, size, batch number, npz key]
+        self._batches = collections.OrderedDict()  # batch number: npz file
+        self._pending = {}  # file path: [mtime, size, array]
+        self.pending_bytes = 0
+        self._logs = {}  # file path: [mtime, size, reader arguments, data]
+
+        # Read the index of every batch of stored arrays in the order they
+        # were written, ignoring damaged batches. data_files.npz is the store
+        # of older versions, written as a single batch.
+        numbers = []
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                if name == 'data_files.npz':
+                    numbers.append(-1)
+                elif name.startswith('data_files_') and name.endswith('.npz'):
+                    try:
+                        numbers.append(int(name[len('data_files_'):-4]))
+                    except ValueError:
+                        pass
+        for number in sorted(numbers):
+            try:
+                npz = np.load(self._batch_path(number))
+                for i, (path, mtime, size) in enumerate(
+                        zip(npz['paths'], npz['mtimes'], npz['sizes'])):
+                    self._arrays[str(path)] = [mtime, size, number,
+                                               'arr_' + str(i)]
+                self._batches[number] = npz
+            except (OSError, ValueError, KeyError):
+                pass
+        if os.path.exists(self.logs_path):
+            try:
+                with open(self.logs_path, 'rb') as f:
+                    self._logs = pickle.load(f)
+            except Exception:
+                # e.g. stored by an incompatible version of pandas
+                self._logs = {}
+
+    def _batch_path(self, number):
+        # Return the path of a batch of arrays
+        if number == -1:
+            return os.path.join(self.folder, 'data_files.npz')
+        return os.path.join(self.folder,
+                            'data_files_' + str(number) + '.npz')
+
+    def _stat(self, filepath):
+        # Return the modification time and size of a file
+        st = os.stat(filepath)
+        return st.st_mtime, st.st_size
+
+    def get(self, filepath):
+        """
+        Return the stored array of the data file at filepath, or None if it
+        isn't stored or the file has changed.
+        """
+
+        if filepath in self._pending:
+            mtime, size, data = self._pending[filepath]
+        elif filepath in self._arrays:
+            mtime, size, number, key = self._arrays[filepath]
+            data = None
+        else:
+            return None
+        if self._stat(filepath) != (mtime, size):
+            return None
+        if data is None:
+            data = self._batches[number][key]
+        return data
+
+    def put(self, filepath, data):
+        """
+        Store the array parsed from the data file at filepath, writing a new
+        batch if the arrays not yet written take up more than batch_bytes.
+        """
+
+        mtime, size = self._stat(filepath)
+        if filepath in self._pending:
+            self.pending_bytes -= self._pending[filepath][2].nbytes
+        self._pending[filepath] = [mtime, size, data]
+        self.pending_bytes += data.nbytes
+        if self.pending_bytes > self.batch_bytes:
+            self._write_batch()
+
+    def _write_batch(self):
+        # Write the new arrays to a batch of their own and drop them from
+        # memory
+        if not self._pending:
+            return
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        number = max(list(self._batches) + [-1]) + 1
+        paths = sorted(self._pending)
+        arrays = {'paths': np.array(paths, dtype=str),
+                  'mtimes': np.array([self._pending[p][0] for p in paths]),
+                  'sizes': np.array([self._pending[p][1] for p in paths])}
+        for i, path in enumerate(paths):
+            arrays['arr_' + str(i)] = self._pending[path][2]
+
+        # Write to a temporary file and rename it once complete, so an
+        # interrupted write can't leave a damaged batch
+        path = self._batch_path(number)
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+        self._batches[number] = np.load(path)
+        for i, filepath in enumerate(paths):
+            mtime, size = self._pending[filepath][:2]
+            self._arrays[filepath] = [mtime, size, number, 'arr_' + str(i)]
+        self._pending = {}
+        self.pending_bytes = 0
+
+        # Delete batches whose arrays have all been replaced
+        used = set(entry[2] for entry in self._arrays.values())
+        for number in list(self._batches):
+            if number not in used:
+                self._batches.pop(number).close()
+                os.remove(self._batch_path(number))
+
+    def read_csv(self, filepath, **kwargs):
+        """
+        Return pd.read_csv(filepath, **kwargs) from the store if the file and
+        the arguments are unchanged, otherwise read and store it.
+        """
+
+        mtime, size = self._stat(filepath)
+        entry = self._logs.get(filepath)
+        if (entry is not None) and (entry[:3] == [mtime, size, kwargs]):
+            return entry[3].copy()
+        data = pd.read_csv(filepath, **kwargs)
+        self._logs[filepath] = [mtime, size, kwargs, data.copy()]
+        self.changed = True
+        return data
+
+    def save(self):
+        """
+        Write any new arrays and log files to the folder.
+        """
+
+        self._write_batch()
+        if not self.changed:
+            return
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        with open(self.logs_path + '.tmp', 'wb') as f:
+            pickle.dump(self._logs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.logs_path + '.tmp', self.logs_path)
+        self.changed = False
+
+
+# Cache shared by everything that loads data files with load_data
+data_cache = DataCache()
+
+
+def load_data(filepath):
+    """
+    Return the cleaned data in the file at filepath from the shared cache.
+    """
+
+    return data_cache.load(filepath)
+
+
+# Names of the methods used to find the gradients of J-V curves and to fit
+# them with the single diode model, recorded with cached results so they are
+# recalculated if a method changes
+GRADIENT_METHOD = 'savgol-dI-dV-interp'
+DIODE_FIT_METHOD = 'lambertw-lm'
+
+# Version of the figures saved by ReportFigures, which is part of the key of
+# every figure. Increase it to render every figure again after a change that
+# isn't in the source of the plotting functions, e.g. to matplotlib settings.
+FIGURE_CACHE_VERSION = 1
+
+
 def extra_JV_analysis(filepath, Jsc, Vmp, Voc, Area):
     """
 
@@ -52,7 +355,8 @@ def extra_JV_analysis(filepath, Jsc, Vmp, Voc, Area):
     the basic Jsc, Voc, FF, and PCE:
 
         - Estimates for the series and shunt resistances from the gradients at
-        open-circuit and short-circuit, respectively.
+        open-circuit and short-circuit, respectively (see
+        JV_gradient_resistances).
 
     """
 
@@ -60,83 +364,304 @@ def extra_JV_analysis(filepath, Jsc, Vmp, Voc, Area):
     JV = np.genfromtxt(filepath, delimiter='\t')
     JV = JV[~np.isnan(JV).any(axis=1)]
 
-    # Get indices of Jsc, Vmp, and Voc in data array
-    V = np.around(JV[:, 0], 2)
-    Voc = np.around(Voc, 2)
-    Vmp = np.around(Vmp, 2)
-    Jsc_i = np.where(V == 0)
-    if Vmp > 0:
-        Voc_i = np.where(V == Voc)
+    # Estimate Rs and Rsh from gradients
+    Rs_grad, Rsh_grad = JV_gradient_resistances([JV], [Vmp], [Voc], [Area])
+
+    return [Rs_grad[0], Rsh_grad[0]]
+
+
+def interpolate_rows(x, y, x0):
+    """
+
+    Linearly interpolate each row of the 2D array y at the value in x0 for
+    that row of the 2D array x, which must be monotonic along each row in
+    either direction. Rows of x that don't span their value of x0 give NaN.
+
+    """
+
+    # Find the first segment of each row with x0 between its ends
+    d = x - x0[:, None]
+    spans = d[:, :-1] * d[:, 1:] <= 0
+    found = spans.any(axis=1)
+    rows = np.arange(len(x))
+    k = spans.argmax(axis=1)
+
+    # Interpolate along the segments
+    x_a = x[rows, k]
+    x_b = x[rows, k + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(x_b != x_a, (x0 - x_a) / (x_b - x_a), 0)
+    y0 = y[rows, k] + t * (y[rows, k + 1] - y[rows, k])
+    y0[~found] = np.nan
+    return y0
+
+
+def JV_gradient_resistances(curves, Vmp, Voc, Area, window=15, polyorder=3):
+    """
+
+    Function for estimating the series and shunt resistances of a set of J-V
+    curves at once from the gradients at open-circuit and short-circuit,
+    respectively.
+
+    curves is a list of arrays with columns of voltage (V) and current
+    density (mA/cm^2), and Vmp, Voc, and Area are arrays with one value per
+    curve. Curves with the same number of points are stacked into 2D arrays
+    of voltage and current, which are each differentiated with respect to
+    point number by a single Savitzky-Golay filter (deriv=1) over the whole
+    array. Their ratio is the gradient dI/dV at every point, so the voltages
+    don't have to be evenly spaced. The gradients at short-circuit (V = 0) and
+    open-circuit (V = Voc, or -Voc for curves with Vmp < 0) are interpolated
+    between the points either side. Returns arrays of Rs_grad and Rsh_grad,
+    which are NaN for curves that don't span open-circuit and short-circuit,
+    or have fewer points than the filter window.
+
+    """
+
+    Vmp = np.asarray(Vmp, dtype=float)
+    Voc = np.asarray(Voc, dtype=float)
+    Area = np.asarray(Area, dtype=float)
+    Rs_grad = np.full(len(curves), np.nan)
+    Rsh_grad = np.full(len(curves), np.nan)
+    lengths = np.array([len(JV) for JV in curves], dtype=int)
+    for n in np.unique(lengths):
+        if n < window:
+            # Too short for the Savitzky-Golay filter
+            continue
+        idx = np.flatnonzero(lengths == n)
+        JV = np.stack([curves[i][:, :2] for i in idx])
+
+        # Convert current density (in mA/cm^2) to current (in A) and find
+        # the filtered gradients of current and voltage of every curve with
+        # respect to point number, then divide them to get dI/dV at every
+        # point
+        V = JV[:, :, 0]
+        I = JV[:, :, 1] * Area[idx, None] / 1000
+        dV = signal.savgol_filter(V, window, polyorder, deriv=1, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dI_dV = signal.savgol_filter(
+                I, window, polyorder, deriv=1, axis=1) / dV
+
+            # Interpolate the gradients at open-circuit and short-circuit
+            V_oc = np.where(Vmp[idx] > 0, Voc[idx], -Voc[idx])
+            Rs_grad[idx] = 1 / interpolate_rows(V, dI_dV, V_oc)
+            Rsh_grad[idx] = 1 / interpolate_rows(V, dI_dV, np.zeros(len(idx)))
+
+    return Rs_grad, Rsh_grad
+
+
+def cached_file_analysis(results,
+                         key_columns,
+                         value_columns,
+                         analyse,
+                         cache_file=None):
+    """
+
+    Function for filling in the value_columns of the results dataframe, which
+    has a row for each data file with key_columns saying how it is analysed,
+    e.g. its path, modification time, and the analysis method.
+
+    Results are cached in a tab-separated cache_file, if given, keyed by
+    key_columns. Caches without all of the key columns are ignored. Only the
+    rows without a valid cached result are passed to analyse, a function
+    taking a dataframe of those rows and returning a 2D array with a column
+    for each of value_columns, so re-running the analysis on an unchanged
+    experiment doesn't read any data files. Returns the filled in results.
+
+    """
+
+    # Look up the results of previous runs
+    cache = None
+    if (cache_file is not None) and os.path.exists(cache_file):
+        cache = pd.read_csv(cache_file,
+                            delimiter='\t',
+                            float_precision='round_trip')
+        if not set(key_columns + value_columns).issubset(cache.columns):
+            cache = None
+    if cache is not None:
+        cache = cache[key_columns + value_columns].drop_duplicates(
+            key_columns)
+        cache['Cached'] = True
+        results = results.merge(cache, how='left', on=key_columns)
+        missing = np.flatnonzero(results['Cached'].isnull().values)
+        results = results.drop('Cached', axis=1)
     else:
-        Voc_i = np.where(V == -Voc)
+        for column in value_columns:
+            results[column] = np.nan
+        missing = np.arange(len(results))
 
-# Convert current density (in mA/cm^2) to current (in A) for diode
-# equivalent circuit fitting
-    I = JV[:, 1] * Area / 1000
-    IV = np.column_stack((JV[:, 0], I))
+    # Analyse the files missing from the cache
+    if len(missing) > 0:
+        values = analyse(results.iloc[missing])
+        for i, column in enumerate(value_columns):
+            results.loc[results.index[missing], column] = values[:, i]
+        if cache_file is not None:
+            results[key_columns + value_columns].to_csv(cache_file,
+                                                        sep='\t',
+                                                        index=False)
 
-    # Estimate Rs and Rsh from gradients
-    dI_dV = np.gradient(IV[:, 1], IV[1, 0] - IV[0, 0])
-    dI_dV_sgfilter = signal.savgol_filter(dI_dV, 15, 3)
-    try:
-        Rs_grad = 1 / dI_dV_sgfilter[Voc_i[0][0]]
-        Rsh_grad = 1 / dI_dV_sgfilter[Jsc_i[0][0]]
-    except IndexError:
-        Rs_grad = 0.1
-        Rsh_grad = 0.1
+    return results
+
+
+def batch_JV_analysis(filepaths, Vmp, Voc, Area, cache_file=None):
+    """
+
+    Function for performing the analysis of extra_JV_analysis on a set of J-V
+    data files at once. Files are loaded through the shared data cache.
+
+    Results are cached in cache_file, if given, keyed by the path and
+    modification time of each file, the values of Vmp, Voc, and Area used for
+    it, and GRADIENT_METHOD (see cached_file_analysis). Returns arrays of
+    Rs_grad and Rsh_grad in the order of filepaths.
+
+    """
+
+    results = pd.DataFrame({'File_Path': list(filepaths),
+                            'mtime': [os.path.getmtime(path)
+                                      for path in filepaths],
+                            'Vmp': np.asarray(Vmp, dtype=float),
+                            'Voc': np.asarray(Voc, dtype=float),
+                            'Area': np.asarray(Area, dtype=float),
+                            'Method': GRADIENT_METHOD})
+
+    def analyse(rows):
+        curves = [load_data(path) for path in rows['File_Path']]
+        return np.column_stack(
+            JV_gradient_resistances(curves, rows['Vmp'].values,
+                                    rows['Voc'].values, rows['Area'].values))
+
+    results = cached_file_analysis(
+        results, ['File_Path', 'mtime', 'Vmp', 'Voc', 'Area', 'Method'],
+        ['Rs_grad', 'Rsh_grad'], analyse, cache_file)
+    return results['Rs_grad'].values, results['Rsh_grad'].values
+
+
+def batch_diode_fit(filepaths,
+                    Vmp,
+                    Area,
+                    cache_file=None,
+                    workers=None,
+                    T=300):
+    """
+
+    Function for fitting the single diode model to a set of J-V data files at
+    once (see diodefit.fit_jv_curves). Files are loaded through the shared
+    data cache, and curves with Vmp < 0 are taken to be measured with
+    inverted polarity. Large sets of curves are fitted by a pool of workers
+    processes.
+
+    Results are cached in cache_file, if given, keyed by the path and
+    modification time of each file, its polarity, T, and DIODE_FIT_METHOD
+    (see cached_file_analysis). Returns a dataframe of J0_fit (mA/cm^2),
+    n_fit, Rs_fit (ohms), Rsh_fit (ohms), Jph_fit (mA/cm^2), and RMSE_fit
+    (mA/cm^2) in the order of filepaths.
+
+    """
+
+    columns = [name + '_fit' for name in diodefit.RESULTS]
+    Area = np.asarray(Area, dtype=float)
+    results = pd.DataFrame({'File_Path': list(filepaths),
+                            'mtime': [os.path.getmtime(path)
+                                      for path in filepaths],
+                            'Polarity': np.where(
+                                np.asarray(Vmp, dtype=float) < 0, -1, 1),
+                            'T': float(T),
+                            'Method': DIODE_FIT_METHOD})
+
+    def analyse(rows):
+        curves = [load_data(path) for path in rows['File_Path']]
+        return diodefit.fit_jv_curves(curves, rows['Polarity'].values, T,
+                                      workers)
+
+    results = cached_file_analysis(
+        results, ['File_Path', 'mtime', 'Polarity', 'T', 'Method'], columns,
+        analyse, cache_file)
+
+    # Convert resistances from ohm cm^2 to ohms like the gradient estimates
+    results = results[columns].reset_index(drop=True)
+    results['Rs_fit'] = results['Rs_fit'].values / Area
+    results['Rsh_fit'] = results['Rsh_fit'].values / Area
+    return results
 
-    return [Rs_grad, Rsh_grad]
 
+# Parameters shown in boxplots and the log file columns holding them
+BOXPLOT_PARAMETERS = collections.OrderedDict([('Jsc', 'Jsc'), ('Voc', 'Voc'),
+                                              ('FF', 'FF'), ('PCE', 'PCE'),
+                                              ('Rs', 'Rs_grad'),
+                                              ('Rsh', 'Rsh_grad')])
 
-def boxplotdata(grouped_by_var):
+
+def boxplotdata(data, control='Control'):
     """
 
-    Function for sorting log file data grouped by variable into series for
-    boxplots.
+    Sort log file data into series for boxplots of each variable.
+
+    The data is sorted by variable and value once and each parameter in
+    BOXPLOT_PARAMETERS is kept as one contiguous array under its name, e.g.
+    'Jsc'. The series of each variable are given by the start and stop index
+    of each of its values in those arrays (bounds_var), with their names
+    (names_var) and the name of the variable (var_names). The values of the
+    control variable are added to the end of the series of every other
+    variable, and the control variable gets no series of its own. Use
+    boxplotdata_subset to get the series of one variable as arrays.
 
     """
 
-    Jsc_var = []
-    Voc_var = []
-    FF_var = []
-    PCE_var = []
-    Rs_var = []
-    Rsh_var = []
-    names_var = []
+    # Group rows by variable and value, keeping their order within each
+    # group
+    data = data.dropna(subset=['Variable', 'Value'])
+    data = data.sort_values(['Variable', 'Value'], kind='mergesort')
+    variables = data['Variable'].values
+    values = data['Value'].values
+    new_group = np.ones(len(data), dtype=bool)
+    new_group[1:] = ((variables[1:] != variables[:-1]) |
+                     (values[1:] != values[:-1]))
+    starts = np.flatnonzero(new_group)
+    stops = np.append(starts[1:], len(data)).astype(int)
+    group_variables = variables[starts]
+
+    boxplotdata = collections.OrderedDict()
+    for parameter, column in BOXPLOT_PARAMETERS.items():
+        boxplotdata[parameter] = np.ascontiguousarray(data[column].values,
+                                                      dtype=float)
+
+    # List the groups of each variable, then add the control groups to the
+    # end of every variable
     var_names = []
-    for name, group in grouped_by_var:
-        grouped_by_val = group.groupby('Value')
-        var_names.append(name)
-        Jsc = []
-        Voc = []
-        FF = []
-        PCE = []
-        Rs = []
-        Rsh = []
-        names_val = []
-        for name, group in grouped_by_val:
-            names_val.append(name)
-            Jsc.append(np.array(group['Jsc']))
-            Voc.append(np.array(group['Voc']))
-            FF.append(np.array(group['FF']))
-            PCE.append(np.array(group['PCE']))
-            Rs.append(np.array(group['Rs_grad']))
-            Rsh.append(np.array(group['Rsh_grad']))
-        Jsc_var.append(Jsc)
-        Voc_var.append(Voc)
-        FF_var.append(FF)
-        PCE_var.append(PCE)
-        Rs_var.append(Rs)
-        Rsh_var.append(Rsh)
-        names_var.append(names_val)
-    return {'Jsc_var': Jsc_var,
-            'Voc_var': Voc_var,
-            'FF_var': FF_var,
-            'PCE_var': PCE_var,
-            'Rs_var': Rs_var,
-            'Rsh_var': Rsh_var,
-            'names_var': names_var,
-            'var_names': var_names}
+    bounds_var = []
+    control_bounds = []
+    for start, stop, variable in zip(starts.tolist(), stops.tolist(),
+                                     group_variables):
+        if variable == control:
+            control_bounds.append((start, stop))
+            continue
+        if (len(var_names) == 0) or (variable != var_names[-1]):
+            var_names.append(variable)
+            bounds_var.append([])
+        bounds_var[-1].append((start, stop))
+    bounds_var = [bounds + control_bounds for bounds in bounds_var]
+    names_var = [[values[start] for start, stop in bounds]
+                 for bounds in bounds_var]
+    boxplotdata['var_names'] = var_names
+    boxplotdata['names_var'] = names_var
+    boxplotdata['bounds_var'] = bounds_var
+    return boxplotdata
+
+
+def boxplotdata_subset(boxplotdata, index, parameter):
+    """
+
+    Return the boxplot data of one parameter of the variable at index, as
+    boxplot data holding a list of series (views of the arrays of
+    boxplotdata) for that variable only. Figures plotted from the subset
+    only depend on the data they show, so they can be cached.
+
+    """
+
+    array = boxplotdata[parameter]
+    return {parameter + '_var': [[array[start:stop] for start, stop in
+                                  boxplotdata['bounds_var'][index]]],
+            'names_var': [boxplotdata['names_var'][index]],
+            'var_names': [boxplotdata['var_names'][index]]}
 
 
 def create_figure(rows,
@@ -336,14 +861,21 @@ def create_save_boxplot(
     fig = plt.figure(figsize=(4.75, 3.5625), dpi=300)
     ax = fig.add_subplot(1, 1, 1)
     p = parameter + '_var'
-    ax.boxplot(boxplotdata_HL[p][index], showfliers=showfliers,
+
+    # Leave parameters that couldn't be estimated out of the boxes
+    boxes_HL = [series[~np.isnan(series)]
+                for series in boxplotdata_HL[p][index]]
+    boxes_LH = [series[~np.isnan(series)]
+                for series in boxplotdata_LH[p][index]]
+    ax.boxplot(boxes_HL, showfliers=showfliers,
                labels=boxplotdata_HL['names_var'][index], boxprops=boxprops_HL,
                whiskerprops=whiskerprops_HL, capprops=capprops_HL,
                medianprops=medianprops_HL)
-    ax.boxplot(boxplotdata_LH[p][index], showfliers=showfliers,
+    ax.boxplot(boxes_LH, showfliers=showfliers,
                labels=boxplotdata_LH['names_var'][index], boxprops=boxprops_LH,
                whiskerprops=whiskerprops_LH, capprops=capprops_LH,
                medianprops=medianprops_LH)
+    ax.set_xticks(range(1, len(boxplotdata_HL['names_var'][index]) + 1))
     ax.set_xticklabels(boxplotdata_HL['names_var'][index], rotation=45,
                        ha='right')
     ax.scatter(scatter_x,
@@ -377,6 +909,7 @@ def create_save_boxplot(
     ax.legend(loc='best', fontsize=8, scatterpoints=1)
     fig.tight_layout()
     fig.savefig(image_path)
+    plt.close(fig)
 
     # np.savetxt(
     #     image_path.strip('.png') + '_HL.txt',
@@ -408,6 +941,651 @@ def create_save_barchart(yields, names, index, image_path, title=None):
     ax.set_ylabel('Yield (%)')
     fig.tight_layout()
     fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_jv_curves(image_path,
+                   title,
+                   curves,
+                   jsc_max,
+                   ylim_factor=1.1,
+                   box_width=0.85,
+                   lw=None,
+                   legend_size=None,
+                   xlabel='Applied bias (V)'):
+    """
+    Plot several pairs of J-V scans on the same axes, with a legend outside
+    the plot area, and save the figure to a file.
+
+    curves = list of (legend label, data, paired data) with the scans in the
+             same pair plotted in the same colour
+    jsc_max = Jsc setting the y-axis limits, scaled by ylim_factor
+    box_width = fraction of the figure width used for the plot area
+    lw = line width of the curves
+    legend_size = font size of the legend
+    xlabel = label of the x-axis
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.axhline(0, lw=0.5, c='black')
+    ax.set_title(title)
+
+    # Plot each pair of scans with the next colour in the colormap
+    cmap = plt.get_cmap('rainbow')
+    c_div = 1 / len(curves)
+    for j, (label, data, paired_data) in enumerate(curves):
+        ax.plot(data[:, 0], data[:, 1], label=label, c=cmap(j * c_div), lw=lw)
+        ax.plot(paired_data[:, 0], paired_data[:, 1], c=cmap(j * c_div), lw=lw)
+
+    # Format the axes
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel('J (mA/cm^2)')
+    ax.set_xlim([np.min(paired_data[:, 0]), np.max(paired_data[:, 0])])
+    ax.set_ylim([-jsc_max * ylim_factor, jsc_max * ylim_factor])
+
+    # Adjust plot width to add legend outside plot area
+    box = ax.get_position()
+    ax.set_position([box.x0, box.y0, box.width * box_width, box.height])
+    handles, labels = ax.get_legend_handles_labels()
+    if legend_size is None:
+        prop = None
+    else:
+        prop = {'size': legend_size}
+    lgd = ax.legend(handles,
+                    labels,
+                    loc='upper left',
+                    bbox_to_anchor=(1, 1),
+                    prop=prop)
+    fig.savefig(image_path, bbox_extra_artists=(lgd, ), bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_jv_best(image_path, title, light_LH, light_HL, dark_LH, dark_HL,
+                 jsc):
+    """
+    Plot forward and reverse J-V scans of a pixel in the light and, unless
+    they are None, in the dark, and save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.axhline(0, lw=0.5, c='black')
+    ax.set_title(title)
+    ax.plot(light_LH[:, 0], light_LH[:, 1], label='L->H', c='red', lw=2.0)
+    ax.plot(light_HL[:, 0], light_HL[:, 1], label='H->L', c='green', lw=2.0)
+    if dark_LH is not None:
+        ax.plot(dark_LH[:, 0], dark_LH[:, 1], label='L->H', c='blue', lw=2.0)
+    if dark_HL is not None:
+        ax.plot(dark_HL[:, 0],
+                dark_HL[:, 1],
+                label='H->L',
+                c='orange',
+                lw=2.0)
+
+    # Format the axes
+    ax.set_xlabel('Applied bias (V)')
+    ax.set_ylabel('J (mA/cm^2)')
+    ax.set_xlim([np.min(light_HL[:, 0]), np.max(light_HL[:, 0])])
+    ax.set_ylim([-jsc * 1.1, jsc * 1.1])
+    ax.legend(loc='best')
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_jt(image_path, title, data):
+    """
+    Plot the current density and bias against time of a J-t measurement and
+    save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+
+    # Add axes for current density and format them
+    ax1 = fig.add_subplot(2, 1, 1)
+    ax1.plot(data[:, 0], data[:, 2], 'blue')
+    yticks = calc_ticks(np.min(data[:, 2]), np.max(data[:, 2]))
+    ax1.set_yticks(yticks)
+    ax1.set_yticklabels(yticks)
+    ax1.set_ylim([yticks[0], yticks[-1]])
+    ax1.set_ylabel('J (mA/cm^2)')
+    xticks = calc_ticks(np.min(data[:, 0]), np.max(data[:, 0]))
+    ax1.set_xticks(xticks)
+    ax1.set_xticklabels([])
+    ax1.set_xlim([xticks[0], xticks[-1]])
+    ax1.set_title(title)
+
+    # Add axes for bias and format them
+    ax2 = fig.add_subplot(2, 1, 2)
+    ax2.plot(data[:, 0], data[:, 1], 'black')
+    yticks = calc_ticks(np.min(data[:, 1]), np.max(data[:, 1]))
+    ytick_range = yticks[-1] - yticks[0]
+    ax2.set_yticks(yticks)
+    ax2.set_yticklabels(yticks)
+    ax2.set_ylim(
+        [yticks[0] - 0.05 * ytick_range, yticks[-1] + 0.05 * ytick_range])
+    ax2.set_ylabel('Bias (V)')
+    ax2.set_xticks(xticks)
+    ax2.set_xticklabels(xticks)
+    ax2.set_xlim([xticks[0], xticks[-1]])
+    ax2.set_xlabel('Time (s)')
+
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_mppt(image_path, title, data):
+    """
+    Plot the bias, current density, and efficiency against time of a maximum
+    power stabilisation measurement and save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    min_x = np.min(data[:, 0])
+    max_x = np.max(data[:, 0])
+
+    # Add axes for bias, J, and PCE and format them
+    columns = [(1, 'Bias (V)', 'green'), (3, '|J| (mA/cm^2)', 'red'),
+               (5, 'PCE (%)', 'blue')]
+    for k, (column, ylabel, color) in enumerate(columns):
+        ax = fig.add_subplot(3, 1, k + 1)
+        y = np.absolute(data[:, column])
+        ax.plot(data[:, 0], y, color=color)
+        min_y = np.min(y)
+        max_y = np.max(y)
+        yrange = max_y - min_y
+        ax.set_ylim([min_y - yrange * 0.1, max_y + yrange * 0.1])
+        ax.set_ylabel(ylabel, color=color)
+        ax.set_xlim([min_x, max_x])
+        ax.locator_params(axis='y', tight=False, nbins=4)
+        if k == 0:
+            ax.set_title(title)
+        if k < 2:
+            ax.set_xticklabels([])
+        else:
+            ax.set_xlabel('Time (s)')
+
+    fig.tight_layout()
+    fig.subplots_adjust(hspace=0.05)
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_intensity_jsc(image_path, group_HL, group_LH):
+    """
+    Plot Jsc against light intensity for both scan directions with linear
+    fits and save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    for group, c, direction in [(group_HL, 'blue', 'H->L'),
+                                (group_LH, 'red', 'L->H')]:
+        m, c0, r, p, se = stats.linregress(group['Intensity'] * 100,
+                                           group['Jsc'])
+        ax.scatter(group['Intensity'] * 100,
+                   group['Jsc'],
+                   c=c,
+                   label=direction + ', ' + 'm=' + str(round_sig_fig(m, 3)) +
+                   ', c=' + str(round_sig_fig(c0, 3)) + ', R^2=' +
+                   str(round_sig_fig(r**2, 3)))
+        ax.plot(group['Intensity'] * 100,
+                group['Intensity'] * 100 * m + c0,
+                c=c)
+    ax.legend(loc='upper left', scatterpoints=1, prop={'size': 9})
+
+    # Format axes
+    ax.set_xlabel('Light intensity (mW/cm^2)')
+    ax.set_ylabel('Jsc (mA/cm^2)')
+    ax.set_xlim([0, np.max(group_HL['Intensity'] * 100) * 1.05])
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_intensity_voc(image_path, group_HL, group_LH, T=300):
+    """
+    Plot Voc against ln(Jsc) for both scan directions with linear fits giving
+    the ideality factor and J0 of a single diode equivalent circuit at
+    temperature T (K), and save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    for group, c, direction in [(group_HL, 'blue', 'H->L'),
+                                (group_LH, 'red', 'L->H')]:
+        m, c0, r, p, se = stats.linregress(np.log(group['Jsc']),
+                                           group['Voc'])
+        n = m * constants.elementary_charge / (constants.Boltzmann * T)
+        j0 = np.exp(-c0 / m)
+        ax.scatter(np.log(group['Jsc']),
+                   group['Voc'],
+                   c=c,
+                   label=direction + ', ' + 'n=' + str(round_sig_fig(n, 3)) +
+                   ', J_0=' + ('%.2e' % j0) + ' (mA/cm^2)' + ', R^2=' +
+                   str(round_sig_fig(r**2, 3)))
+        ax.plot(np.log(group['Jsc']), np.log(group['Jsc']) * m + c0, c=c)
+    ax.legend(loc='upper left', scatterpoints=1, prop={'size': 9})
+
+    # Format axes
+    ax.set_xlabel('ln(Jsc) (mA/cm^2)')
+    ax.set_ylabel('Voc (V)')
+    ax.set_ylim(
+        [np.min(group_HL['Voc']) * 0.95, np.max(group_HL['Voc']) * 1.05])
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_intensity_parameter(image_path, group_HL, group_LH, parameter,
+                             ylabel):
+    """
+    Plot a J-V parameter against light intensity for both scan directions and
+    save the figure to a file.
+    """
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.scatter(group_HL['Intensity'] * 100,
+               group_HL[parameter],
+               c='blue',
+               label='H->L')
+    ax.scatter(group_LH['Intensity'] * 100,
+               group_LH[parameter],
+               c='red',
+               label='L->H')
+    ax.legend(loc='best', scatterpoints=1)
+    ax.set_xlabel('Light intensity (mW/cm^2)')
+    ax.set_ylabel(ylabel)
+    ax.set_xlim([0, np.max(group_HL['Intensity'] * 100) * 1.05])
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_eqe(image_path, title, spectra, responsivity=False):
+    """
+    Plot the EQE spectra, or the spectral responsivity if responsivity is
+    True, of several pixels on the same axes and save the figure to a file.
+
+    spectra = list of (pixel, data) with columns of wavelength (nm) and EQE (%)
+    """
+
+    q = constants.elementary_charge
+    h = constants.Planck
+    c = constants.speed_of_light
+
+    fig = plt.figure(figsize=HALF_A4, dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title(title)
+
+    # Plot the spectrum of each pixel with the next colour in the colormap
+    cmap = plt.get_cmap('rainbow')
+    c_div = 1 / len(spectra)
+    for j, (pixel, data) in enumerate(spectra):
+        if responsivity:
+            y = data[:, 1] * data[:, 0] * 1e-9 * q / (100 * h * c)
+        else:
+            y = data[:, 1]
+        ax.plot(data[:, 0], y, c=cmap(j * c_div), label=str(pixel))
+
+    # Format axes
+    ax.legend(loc='best')
+    ax.set_xlabel('Wavelength (nm)')
+    ax.set_xlim([np.min(data[:, 0]), np.max(data[:, 0])])
+    if responsivity:
+        ax.set_ylabel('Responsivity (A/W)')
+        ax.set_ylim([0, np.max(data[:, 0]) * 1e-9 * q / (h * c)])
+    else:
+        ax.set_ylabel('EQE (%)')
+        ax.set_ylim([0, 100])
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def plot_integrated_jsc(image_path, eqe_HL, eqe_LH):
+    """
+    Plot the Jsc integrated from EQE spectra against the Jsc measured with the
+    solar simulator in each scan direction and save the figure to a file.
+
+    eqe_HL, eqe_LH = dataframes with Label, Pixel, SS_Jsc, and Int_Jsc columns
+    """
+
+    # Create markers and colours for measured Jsc against integrated Jsc
+    marker = itertools.cycle((',', 'D', 'x', 'o', '*', '^'))
+    color = itertools.cycle(
+        ('black', 'blue', 'red', 'green', 'purple', 'magenta', 'cyan'))
+
+    fig = plt.figure(figsize=(2 * HALF_A4[0], 2 * HALF_A4[1]), dpi=300)
+    ax = fig.add_subplot(1, 1, 1)
+
+    # Add 1 point for every measured-integrated pair per iteration
+    zipped = zip(eqe_HL['Label'], eqe_HL['Pixel'], eqe_HL['SS_Jsc'],
+                 eqe_HL['Int_Jsc'], eqe_LH['Label'], eqe_LH['Pixel'],
+                 eqe_LH['SS_Jsc'], eqe_LH['Int_Jsc'])
+    for (label_HL, pixel_HL, ss_jsc_HL, int_jsc_HL, label_LH, pixel_LH,
+         ss_jsc_LH, int_jsc_LH) in zipped:
+        ax.scatter(
+            ss_jsc_HL,
+            int_jsc_HL,
+            label=(str(label_HL) + ', pixel ' + str(pixel_HL) + ', H->L'),
+            marker=next(marker),
+            s=30,
+            c=next(color))
+        ax.scatter(
+            ss_jsc_LH,
+            int_jsc_LH,
+            label=(str(label_LH) + ', pixel ' + str(pixel_LH) + ', L->H'),
+            marker=next(marker),
+            s=30,
+            c=next(color))
+
+    # Plot line to indicate where measured Jsc = integrated Jsc
+    ax.plot(eqe_HL['SS_Jsc'],
+            eqe_HL['SS_Jsc'],
+            c='black',
+            label='Int Jsc = SS Jsc')
+
+    # Format axes
+    ax.set_xlabel('Solar simulator Jsc (mA/cm^2)')
+    ax.set_ylabel('Integrated Jsc from EQE (mA/cm^2)')
+
+    # Adjust plot width to add legend outside plot area
+    box = ax.get_position()
+    ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+    handles, labels = ax.get_legend_handles_labels()
+    lgd = ax.legend(handles,
+                    labels,
+                    loc='upper left',
+                    bbox_to_anchor=(1.01, 1),
+                    scatterpoints=1,
+                    prop={'size': 9})
+    fig.savefig(image_path, bbox_extra_artists=(lgd, ), bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_weather(image_path, weather_data):
+    """
+    Plot the temperatures and relative humidities in the weather log and save
+    the figure to a file.
+    """
+
+    fig = plt.figure(figsize=(2 * HALF_A4[0], 2 * HALF_A4[1]), dpi=300)
+    locations = [('Lab', 'Lab'), ('Fume hood', 'Fumehood'),
+                 ('Solar sim', 'Solar sim'), ('Dessicator', 'Dessicator')]
+
+    # Add axes and data for temperature subplot then format
+    ax1 = fig.add_subplot(2, 1, 1)
+    for column, label in locations:
+        ax1.plot_date(weather_data['Date_time'],
+                      weather_data[column + ' T'],
+                      fmt='-',
+                      label=label)
+    ax1.set_xticklabels([])
+    ax1.set_ylim([15, 30])
+    ax1.legend(loc='best')
+    ax1.set_ylabel('Temperature (C)')
+
+    # Add axes and data for humidity subplot then format
+    ax2 = fig.add_subplot(2, 1, 2)
+    for column, label in locations:
+        ax2.plot_date(weather_data['Date_time'],
+                      weather_data[column + ' RH'],
+                      fmt='-',
+                      label=label)
+    ax2.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m/%y %H:%M'))
+    ax2.set_ylim([0, 100])
+    ax2.legend(loc='best')
+    ax2.set_ylabel('Relative humidity (%)')
+    plt.setp(ax2.get_xticklabels(), rotation=40, ha='right')
+
+    fig.tight_layout()
+    fig.savefig(image_path)
+    plt.close(fig)
+
+
+def _init_worker():
+    # Render figures in worker processes without a display
+    plt.switch_backend('Agg')
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process in bytes, or None if it
+    can't be measured on this platform.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        # resource isn't available on Windows, where psutil is used instead
+        # if it's installed
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+def _profile_task(function, args, kwargs):
+    # Run a figure task and return the wall time and CPU time it took and the
+    # peak RSS of the process that ran it
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    function(*args, **kwargs)
+    return (time.perf_counter() - start_wall, time.process_time() - start_cpu,
+            peak_rss())
+
+
+class ReportFigures:
+    """
+
+    Figures of a report and the slides they are placed on.
+
+    Each figure is described by a task, a module level plotting function and
+    its arguments, which can be pickled and run in another process. Slides
+    and figures are recorded with new_slide() and add() in the order they
+    should appear in the presentation. render() then saves all of the images,
+    in parallel in a pool of worker processes, and assemble() adds the slides
+    and images to the presentation in the order they were recorded.
+
+    If a manifest file is given, each figure is keyed by a hash of its task,
+    i.e. the data loaded from its files, the log rows, and the plotting
+    parameters, the source of the module defining the plotting function, and
+    FIGURE_CACHE_VERSION. Figures whose key hasn't changed since they were
+    last rendered are reused from disk. The manifest records the key of every
+    figure and which figures were rebuilt by the last call to render().
+
+    Figures can be grouped into sections by setting section before adding
+    them. If render() is asked to profile, the wall time, CPU time, and peak
+    RSS of the worker rendering each figure are kept in task_profiles.
+
+    """
+
+    def __init__(self, manifest_path=None):
+        self.manifest_path = manifest_path
+        self.slides = []  # [title, [(image_path, position)]]
+        self.tasks = []  # (image_path, function, args, kwargs)
+        self.rebuilt = []
+        self.reused = []
+        self.section = None
+        self.task_sections = []
+        self.task_profiles = {}  # image_path: (wall, cpu, peak_rss)
+        self._sources = {}  # module: source code
+
+    def new_slide(self, title):
+        """
+        Record a new slide with a title and return its index.
+        """
+
+        self.slides.append([title, []])
+        return len(self.slides) - 1
+
+    def add(self, slide, position, image_path, function, *args, **kwargs):
+        """
+        Record a figure saved to image_path by function(*args, **kwargs) and
+        placed on the slide at position, one of '0' to '3' for the quarters
+        of the slide in reading order or 'full' for the whole slide.
+        """
+
+        self.slides[slide][1].append((image_path, position))
+        self.tasks.append((image_path, function, args, kwargs))
+        self.task_sections.append(self.section)
+
+    def task_key(self, task):
+        """
+        Return a hash of everything that determines the image of a task.
+        """
+
+        image_path, function, args, kwargs = task
+
+        # Hash the source of the whole module defining the function, so
+        # changes to the helpers it calls also change the key
+        module = inspect.getmodule(function)
+        if module not in self._sources:
+            self._sources[module] = inspect.getsource(module).encode()
+        key = hashlib.sha1(str(FIGURE_CACHE_VERSION).encode())
+        key.update(self._sources[module])
+        key.update(function.__name__.encode())
+
+        # Pickles of equal DataFrames differ depending on which of their
+        # values are the same object, e.g. after being read from a file or
+        # from the store, so hash DataFrames by their contents as text
+        def contents(arg):
+            if isinstance(arg, pd.DataFrame):
+                return ('DataFrame', arg.to_csv())
+            return arg
+
+        args = tuple(contents(arg) for arg in args)
+        kwargs = sorted((name, contents(arg)) for name, arg in kwargs.items())
+        key.update(pickle.dumps((args, kwargs), protocol=4))
+        return key.hexdigest()
+
+    def load_manifest(self):
+        """
+        Return the keys of the figures recorded in the manifest, or an empty
+        dictionary if there isn't one.
+        """
+
+        if (self.manifest_path is None) or (not os.path.exists(
+                self.manifest_path)):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)['figures']
+        except (ValueError, KeyError):
+            # Rebuild everything if the manifest is unreadable
+            return {}
+
+    def render(self, workers=None, rebuild=False, profile=False):
+        """
+        Save all of the figures using a pool of workers processes, or in this
+        process if workers is 1. Figures that are unchanged since the last
+        render are skipped unless rebuild is True. If profile is True, the
+        resources used to render each figure are recorded in task_profiles.
+        Any error raised while rendering is re-raised once all figures have
+        finished.
+        """
+
+        # Find the figures that have to be rendered
+        old_keys = self.load_manifest()
+        keys = collections.OrderedDict()
+        tasks = []
+        self.rebuilt = []
+        self.reused = []
+        for task in self.tasks:
+            image_path = task[0]
+            if self.manifest_path is not None:
+                # Record images relative to the manifest so the analysis
+                # folder can be moved
+                name = os.path.relpath(image_path,
+                                       os.path.dirname(self.manifest_path))
+                keys[name] = self.task_key(task)
+            if ((not rebuild) and (self.manifest_path is not None) and
+                    (old_keys.get(name) == keys[name]) and
+                    os.path.exists(image_path)):
+                self.reused.append(image_path)
+            else:
+                self.rebuilt.append(image_path)
+                tasks.append(task)
+
+        self.task_profiles = {}
+        if (workers == 1) or (len(tasks) < 2):
+            for image_path, function, args, kwargs in tasks:
+                if profile:
+                    self.task_profiles[image_path] = _profile_task(
+                        function, args, kwargs)
+                else:
+                    function(*args, **kwargs)
+        else:
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_worker) as pool:
+                futures = []
+                for image_path, function, args, kwargs in tasks:
+                    if profile:
+                        futures.append(
+                            pool.submit(_profile_task, function, args,
+                                        kwargs))
+                    else:
+                        futures.append(
+                            pool.submit(function, *args, **kwargs))
+                for (image_path, function, args,
+                     kwargs), future in zip(tasks, futures):
+                    result = future.result()
+                    if profile:
+                        self.task_profiles[image_path] = result
+
+        # Record the figures now on disk. Keep the keys of figures that
+        # aren't part of this report, e.g. those of a variable that has been
+        # removed, so they are still reused if it comes back.
+        if self.manifest_path is not None:
+            old_keys.update(keys)
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(
+                    {
+                        'figures': old_keys,
+                        'rebuilt': [
+                            os.path.relpath(
+                                image_path,
+                                os.path.dirname(self.manifest_path))
+                            for image_path in self.rebuilt
+                        ],
+                        'reused': len(self.reused)
+                    },
+                    f,
+                    indent=1)
+            os.replace(tmp_path, self.manifest_path)
+
+    def assemble(self, prs, lefts, tops, height):
+        """
+        Add the recorded slides and their images to the presentation (prs).
+        Images are positioned using the lefts and tops dictionaries and scaled
+        to height, or twice height for full slide images.
+        """
+
+        for title, images in self.slides:
+            data_slide = title_image_slide(prs, title)
+            for image_path, position in images:
+                if position == 'full':
+                    data_slide.shapes.add_picture(image_path,
+                                                  left=lefts['0'],
+                                                  top=tops['0'],
+                                                  height=height * 2)
+                else:
+                    data_slide.shapes.add_picture(image_path,
+                                                  left=lefts[position],
+                                                  top=tops[position],
+                                                  height=height)
 
 
 def exp_file_list(folderpath):
@@ -523,7 +1701,7 @@ def calc_ticks(data_min, data_max):
             y_range_digs))))
         min_tick = min_digs * 10**max_order
         ticks = np.linspace(min_tick, y_range_digs * 10**max_order + min_tick,
-                            num_ticks + 1)
+                            int(num_ticks) + 1)
     elif min_order > max_order:
         min_digs = np.floor(min_digs * 10)
         max_digs = np.ceil(max_digs * 10**(max_order - min_order + 1))
@@ -536,7 +1714,7 @@ def calc_ticks(data_min, data_max):
             y_range_digs))))
         min_tick = min_digs * 10**min_order
         ticks = np.linspace(min_tick, y_range_digs * 10**min_order + min_tick,
-                            num_ticks + 1)
+                            int(num_ticks) + 1)
     elif max_order == min_order:
         str_min = str(min_digs).replace('.', '').replace('-', '')
         str_max = str(max_digs).replace('.', '').replace('-', '')
@@ -560,6 +1738,6 @@ def calc_ticks(data_min, data_max):
                 y_range_digs))))
             min_tick = min_digs * 10**(min_order - i)
             ticks = np.linspace(min_tick, y_range_digs * 10**
-                                (min_order - i) + min_tick, num_ticks + 1)
+                                (min_order - i) + min_tick, int(num_ticks) + 1)
 
     return ticks
@@ -0,0 +1,1157 @@
+# Pipeline that generates the report of an experiment from the measurement
+# log files, in stages that can be run, timed, and skipped independently.
+
+import collections
+import csv
+import functools
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from pptx import Presentation
+from pptx.util import Inches
+
+import measurementdb
+import reportgenlib as rgl
+
+# Columns of the J-V and intensity dependence log files
+LOG_COLUMNS = ['Label', 'Pixel', 'Condition', 'Variable', 'Value', 'Position',
+               'Jsc', 'Voc', 'PCE', 'FF', 'Area', 'Stabil_Level',
+               'Stabil_time', 'Meas_delay', 'Vmp', 'File_Path', 'Scan_rate',
+               'Scan_direction', 'Intensity']
+
+# Columns of the J-V log used by the report, the types of the numeric ones,
+# and the columns with few distinct values that are stored as categoricals
+JV_LOG_USECOLS = ['Label', 'Pixel', 'Condition', 'Variable', 'Value',
+                  'Position', 'Jsc', 'Voc', 'PCE', 'FF', 'Area', 'Vmp',
+                  'File_Path', 'Scan_rate', 'Scan_direction', 'scan_num']
+JV_LOG_DTYPES = {'Jsc': np.float64, 'Voc': np.float64, 'PCE': np.float64,
+                 'FF': np.float64, 'Area': np.float64, 'Vmp': np.float64,
+                 'Scan_rate': np.float64}
+JV_LOG_CATEGORIES = ['Label', 'Pixel', 'Condition', 'Variable', 'Value',
+                     'Scan_direction', 'Position']
+
+# Columns of the EQE log file
+EQE_LOG_COLUMNS = ['Label', 'Pixel', 'Variable', 'Value', 'Position',
+                   'Int_Jsc', 'Mismatch', 'Area', 'Frequency', 'File_Path']
+
+# Weather log of the lab
+WEATHER_LOG = 'C:/SolarSimData/WeatherData/WxLog.csv'
+
+# Stages of a ReportPipeline in the order they run
+STAGES = ['load_logs', 'derive_parameters', 'filter_data', 'compute_yields',
+          'render_figures', 'assemble_pptx']
+
+# Columns of the profile written by ReportPipeline.write_profile
+PROFILE_COLUMNS = ['Section', 'Wall time (s)', 'CPU time (s)',
+                   'Peak RSS (MB)', 'Figures', 'Figures rendered',
+                   'Render wall time (s)', 'Render CPU time (s)',
+                   'Render peak RSS (MB)']
+
+
+def stage(method):
+    """
+
+    Decorator for the stages of a ReportPipeline that records the wall time,
+    CPU time, and peak RSS of the process at the end of each call in the
+    timings of the pipeline under the name of the stage. Time spent in stages
+    called from inside another stage, e.g. to compute missing inputs, is only
+    counted once, in the inner stage.
+
+    """
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        outer_wall, outer_cpu = self._inner_time
+        self._inner_time = (0, 0)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            inner_wall, inner_cpu = self._inner_time
+            self.timings[method.__name__] = {'wall': wall - inner_wall,
+                                             'cpu': cpu - inner_cpu,
+                                             'peak_rss': rgl.peak_rss()}
+            self._inner_time = (outer_wall + wall, outer_cpu + cpu)
+
+    return timed
+
+
+class ReportPipeline:
+    """
+
+    Generate the report of an experiment in stages.
+
+    The stages are load_logs(), derive_parameters(), filter_data(),
+    compute_yields(), render_figures(), and assemble_pptx(), in that order.
+    Each stage returns its results and also keeps them on the pipeline. The
+    inputs of a stage can be passed in, e.g. from a previous run, otherwise
+    the results of the previous stage are used, running it first if needed.
+    run() runs every stage. The wall time and CPU time taken by each stage,
+    and by each section of figures, and the peak RSS of the process after it
+    are recorded in timings.
+
+    folderpath = path of the experiment folder, using forward slashes
+    log_file_name = name of the master J-V log file
+    workers = number of processes used to render figures (see
+              reportgenlib.ReportFigures.render)
+    rebuild = render every figure, even those unchanged since the last report
+    profile = also record the resources used to render each figure and write
+              a profile of the run next to the report (see write_profile)
+    weather_log = path of the weather log of the lab
+
+    """
+
+    def __init__(self,
+                 folderpath,
+                 log_file_name,
+                 workers=None,
+                 rebuild=False,
+                 profile=False,
+                 weather_log=WEATHER_LOG):
+        self.workers = workers
+        self.rebuild = rebuild
+        self.profile = profile
+        self.weather_log = weather_log
+
+        # Define folder and file paths
+        self.folderpath = folderpath
+        self.folderpath_time = 'Time Dependence/'
+        self.folderpath_maxp = 'Max P Stabilisation/'
+        self.log_file_name = log_file_name
+        self.log_file_jv = folderpath + 'J-V/' + log_file_name
+        self.log_file_intensity = (folderpath + 'Intensity Dependence/' +
+                                   log_file_name)
+        self.log_file_eqe = folderpath + 'EQE/' + '_EQE_LOG.txt'
+
+        # Create folders for storing files generated during analysis
+        self.analysis_folder = folderpath + 'Analysis/'
+        self.image_folder = self.analysis_folder + 'Figures/'
+        if os.path.exists(self.analysis_folder):
+            pass
+        else:
+            os.makedirs(self.analysis_folder)
+        if os.path.exists(self.image_folder):
+            pass
+        else:
+            os.makedirs(self.image_folder)
+
+        # Keep parsed log and data files in a binary store in the analysis
+        # folder so they don't have to be parsed again when the report is
+        # regenerated
+        self.store = rgl.SidecarStore(self.analysis_folder + 'Cache/')
+        rgl.data_cache.store = self.store
+
+        # Keep the rows of the J-V log in an indexed database in the analysis
+        # folder, so only rows added since the last run have to be parsed
+        self.db = measurementdb.MeasurementDB(self.analysis_folder +
+                                              'measurements.db')
+
+        # Results of each stage
+        self.logs = None
+        self.data = None
+        self.filtered = None
+        self.yields = None
+        self.figures = None
+
+        self.timings = collections.OrderedDict()
+        self._inner_time = (0, 0)
+
+    def run(self):
+        """
+        Run every stage of the pipeline and return the path of the report.
+        """
+
+        path = self.assemble_pptx()
+        if self.profile:
+            self.write_profile()
+        return path
+
+    def profile_rows(self):
+        """
+        Return a row of PROFILE_COLUMNS for each stage and section of figures
+        that has run. Render times are summed over the figures of a section
+        rendered by the last call to render_figures() with profiling on, and
+        the render peak RSS is the largest of the processes rendering them.
+        """
+
+        # Collect the resources used to render the figures of each section
+        renders = {}
+        figures = self.figures
+        if figures is not None:
+            for task, section in zip(figures.tasks, figures.task_sections):
+                render = renders.setdefault(section, [0, 0, 0, 0, None])
+                render[0] += 1
+                if task[0] in figures.task_profiles:
+                    wall, cpu, rss = figures.task_profiles[task[0]]
+                    render[1] += 1
+                    render[2] += wall
+                    render[3] += cpu
+                    if rss is not None:
+                        render[4] = max(rss, render[4] or 0)
+
+        rows = []
+        for name, timing in self.timings.items():
+            if timing['peak_rss'] is None:
+                rss = None
+            else:
+                rss = round(timing['peak_rss'] / 1024**2, 1)
+            row = [name, round(timing['wall'], 4), round(timing['cpu'], 4),
+                   rss]
+            if name in renders:
+                count, rendered, wall, cpu, render_rss = renders[name]
+                if render_rss is not None:
+                    render_rss = round(render_rss / 1024**2, 1)
+                row += [count, rendered, round(wall, 4), round(cpu, 4),
+                        render_rss]
+            else:
+                row += [None] * 5
+            rows.append(row)
+        return rows
+
+    def write_profile(self):
+        """
+        Write the profile of the run to JSON and CSV files next to the report
+        and return their paths.
+        """
+
+        rows = self.profile_rows()
+        path = (self.analysis_folder + self.log_file_name.strip('LOG.txt') +
+                'profile')
+        with open(path + '.json', 'w') as f:
+            json.dump([dict(zip(PROFILE_COLUMNS, row)) for row in rows],
+                      f,
+                      indent=1)
+        with open(path + '.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(PROFILE_COLUMNS)
+            writer.writerows(rows)
+        return path + '.json', path + '.csv'
+
+    @stage
+    def load_logs(self):
+        """
+        Read the J-V log, and the intensity dependence and EQE logs if they
+        exist, into a dictionary of DataFrames with keys 'jv', 'intensity',
+        and 'eqe'. Missing logs are None.
+        """
+
+        # Add the rows appended to the JV log since the last run to the
+        # measurement database and read the columns that are used from it,
+        # including the scan numbers of the data files
+        self.db.sync_log(self.log_file_jv)
+        data = self.db.read_log(self.log_file_jv, JV_LOG_USECOLS)
+        data = data.astype(JV_LOG_DTYPES)
+        for column in JV_LOG_CATEGORIES:
+            data[column] = data[column].astype('category')
+
+        # Read the intensity dependence and EQE logs if the experiment
+        # includes them
+        if os.path.exists(self.log_file_intensity):
+            intensity_log = self.store.read_csv(self.log_file_intensity,
+                                                delimiter='\t',
+                                                header=0,
+                                                names=LOG_COLUMNS)
+        else:
+            intensity_log = None
+        if os.path.exists(self.log_file_eqe):
+            eqe_log = self.store.read_csv(self.log_file_eqe,
+                                          delimiter='\t',
+                                          header=0,
+                                          names=EQE_LOG_COLUMNS)
+        else:
+            eqe_log = None
+
+        self.logs = {'jv': data, 'intensity': intensity_log, 'eqe': eqe_log}
+        return self.logs
+
+    @stage
+    def derive_parameters(self, logs=None):
+        """
+        Return a copy of the J-V log with the series and shunt resistances of
+        every light J-V curve estimated from gradients added as Rs_grad and
+        Rsh_grad columns, and the parameters of the single diode model fitted
+        to every J-V curve added as J0_fit, n_fit, Rs_fit, Rsh_fit, Jph_fit,
+        and RMSE_fit columns (see reportgenlib.batch_diode_fit).
+        """
+
+        if logs is None:
+            logs = self.logs if self.logs is not None else self.load_logs()
+        data = logs['jv'].copy()
+
+        # Estimate series and shunt resistances of all light J-V curves at once
+        # and create new series for the dataframe. Results are cached in the
+        # analysis folder, so unchanged data files aren't analysed again.
+        light = data['Condition'] == 'Light'
+        Rs_grad, Rsh_grad = rgl.batch_JV_analysis(
+            data.loc[light, 'File_Path'], data.loc[light, 'Vmp'],
+            data.loc[light, 'Voc'], data.loc[light, 'Area'],
+            self.analysis_folder + 'extra_JV_analysis_cache.txt')
+
+        # Add new series to the dataframe
+        data['Rs_grad'] = 0.0
+        data['Rsh_grad'] = 0.0
+        data.loc[light, 'Rs_grad'] = Rs_grad
+        data.loc[light, 'Rsh_grad'] = Rsh_grad
+
+        # Fit the single diode model to every light and dark J-V curve and
+        # add the fitted parameters as new series. Fits are also cached in
+        # the analysis folder.
+        fits = rgl.batch_diode_fit(
+            data['File_Path'], data['Vmp'], data['Area'],
+            self.analysis_folder + 'diode_fit_cache.txt', self.workers)
+        for column in fits.columns:
+            data[column] = fits[column].values
+
+        self.data = data
+        return self.data
+
+    @stage
+    def filter_data(self, data=None):
+        """
+        Sort the J-V data and filter it down to working pixels. Returns a
+        dictionary holding the sorted data (sorted_data), every working scan
+        of pixels working in both scan directions (working_data), the best
+        scan of every working pixel (filtered_data), and the best scan in
+        each direction of pixels working in both (filtered_data_HL and
+        filtered_data_LH).
+        """
+
+        if data is None:
+            data = (self.data
+                    if self.data is not None else self.derive_parameters())
+
+        # Sort data
+        sorted_data = data.sort_values(
+            ['Variable', 'Value', 'Label', 'Pixel', 'PCE'],
+            ascending=[True, True, True, True, False])
+
+        # Filter data. Find the working light scans once and pivot them on
+        # label, pixel, and scan direction to find the pixels working in
+        # both scan directions.
+        working = sorted_data[(sorted_data.Condition == 'Light')
+                              & (sorted_data.FF > 0.1) &
+                              (sorted_data.FF < 0.9) &
+                              (sorted_data.Jsc > 0.01)]
+        directions = working.groupby(
+            ['Label', 'Pixel', 'Scan_direction'],
+            observed=True).size().unstack('Scan_direction').reindex(
+                columns=['HL', 'LH']).fillna(0)
+        both = directions.index[(directions['HL'] > 0) &
+                                (directions['LH'] > 0)]
+
+        # Drop pixels only working in one scan direction
+        working_data = working[pd.MultiIndex.from_arrays(
+            [working['Label'], working['Pixel']]).isin(both)]
+
+        # Keep the best scan of each working pixel, and of each pixel working
+        # in both directions in each direction
+        filtered_data = working.drop_duplicates(['Label', 'Pixel'])
+        best = working_data.drop_duplicates(
+            ['Label', 'Pixel', 'Scan_direction'])
+        filtered_data_HL = best[best.Scan_direction == 'HL']
+        filtered_data_LH = best[best.Scan_direction == 'LH']
+
+        self.filtered = {'sorted_data': sorted_data,
+                         'working_data': working_data,
+                         'filtered_data': filtered_data,
+                         'filtered_data_HL': filtered_data_HL,
+                         'filtered_data_LH': filtered_data_LH}
+        return self.filtered
+
+    @stage
+    def compute_yields(self, filtered=None):
+        """
+        Calculate the proportion of working pixels for each value of each
+        variable, and for each label of each variable. Returns a dictionary of
+        yields (%) and the names they belong to, with one list per variable,
+        and the names of the variables ('variables').
+        """
+
+        if filtered is None:
+            filtered = (self.filtered
+                        if self.filtered is not None else self.filter_data())
+        sorted_data = filtered['sorted_data']
+        filtered_data_HL = filtered['filtered_data_HL']
+
+        # Calculate proportion of working pixels.
+        # Count all pixels and working pixels in the complete and filtered
+        # dataframes for each value and for each label of each variable, in
+        # one aggregation each. Values and labels without working pixels get
+        # a yield of zero. Only combinations that occur are counted, and
+        # sorted because grouping by several categoricals doesn't sort them.
+        all_pixels = sorted_data.drop_duplicates(['Label', 'Pixel'])
+        working_pixels = filtered_data_HL.drop_duplicates(['Label', 'Pixel'])
+        yields = {}
+        for key in ['Value', 'Label']:
+            total = all_pixels.groupby(['Variable', key],
+                                       observed=True).size().sort_index()
+            working = working_pixels.groupby(['Variable', key],
+                                             observed=True).size()
+            yields[key] = working.reindex(total.index,
+                                          fill_value=0) * 100 / total
+
+        # Split the yields into a list for each variable, with a list of
+        # names for each variable to use as the x-axis on bar charts.
+        variables = []
+        yields_var = []
+        names_yield_var = []
+        for var_key, group in yields['Value'].groupby(level='Variable',
+                                                      observed=True):
+            variables.append(var_key)
+            yields_var.append(list(group.values))
+            names_yield_var.append(list(group.index.get_level_values('Value')))
+        yields_var_lab = []
+        names_yield_var_lab = []
+        for var_key, group in yields['Label'].groupby(level='Variable',
+                                                      observed=True):
+            yields_var_lab.append(list(group.values))
+            names_yield_var_lab.append(
+                list(group.index.get_level_values('Label')))
+
+        self.yields = {'variables': variables,
+                       'yields_var': yields_var,
+                       'names_yield_var': names_yield_var,
+                       'yields_var_lab': yields_var_lab,
+                       'names_yield_var_lab': names_yield_var_lab}
+        return self.yields
+
+    @stage
+    def render_figures(self, filtered=None, yields=None, logs=None):
+        """
+        Describe every figure of the report, section by section, and render
+        them. Returns the reportgenlib.ReportFigures holding the slides and
+        images of the report.
+        """
+
+        if filtered is None:
+            filtered = (self.filtered
+                        if self.filtered is not None else self.filter_data())
+        if yields is None:
+            yields = (self.yields if self.yields is not None else
+                      self.compute_yields(filtered))
+        if logs is None:
+            logs = self.logs if self.logs is not None else self.load_logs()
+
+        # Figures and the slides they go on are described while the data is
+        # analysed and added to the presentation after they are all rendered.
+        # Figures that haven't changed since the last report are reused.
+        figures = rgl.ReportFigures(self.image_folder +
+                                    'figure_manifest.json')
+        sections = [(self.add_boxplots, (filtered, yields)),
+                    (self.add_jv_all, (filtered, )),
+                    (self.add_best_pixels, (filtered, )),
+                    (self.add_repeat_scans, (filtered, )),
+                    (self.add_jt, (filtered, )),
+                    (self.add_mppt, (filtered, )),
+                    (self.add_intensity, (logs['intensity'], )),
+                    (self.add_eqe, (filtered, logs['eqe'])),
+                    (self.add_weather, ())]
+        for add_section, args in sections:
+            figures.section = add_section.__name__
+            add_section(figures, *args)
+        figures.render(self.workers, self.rebuild, self.profile)
+
+        self.figures = figures
+        return self.figures
+
+    @stage
+    def add_boxplots(self, figures, filtered, yields):
+        """
+        Add slides of boxplots of the J-V parameters and bar charts of the
+        yields of each variable.
+        """
+
+        filtered_data_HL = filtered['filtered_data_HL']
+        filtered_data_LH = filtered['filtered_data_LH']
+        yields_var = yields['yields_var']
+        names_yield_var = yields['names_yield_var']
+        yields_var_lab = yields['yields_var_lab']
+        names_yield_var_lab = yields['names_yield_var_lab']
+        variables = yields['variables']
+
+        # To generate box plots the data of each scan direction is sorted by
+        # variable and value into arrays of each parameter, with any
+        # 'Control' sample added to every variable.
+        boxplotdata_HL = rgl.boxplotdata(filtered_data_HL)
+        boxplotdata_LH = rgl.boxplotdata(filtered_data_LH)
+
+        # Iterate through the variables to produce boxplots. Each plot will
+        # contain all data from all values of a variable including a
+        # 'Control' sample if one is given. Multiple plots are created if
+        # there is more than one variable.
+        for i, var_name in enumerate(boxplotdata_HL['var_names']):
+
+            # Build a list of x values for scatter plots that will overlay
+            # boxplots.
+            counts = [stop - start
+                      for start, stop in boxplotdata_HL['bounds_var'][i]]
+            x = list(np.repeat(np.arange(1, len(counts) + 1), counts))
+
+            # Find the yields of the variable
+            j = variables.index(var_name)
+
+            # Create new slide and box plots for PV parameters and add
+            # them to the new slide
+            data_slide = figures.new_slide(var_name + ' basic parameters')
+            params = ['Jsc', 'Voc', 'FF', 'PCE']
+            for ix, p in enumerate(params):
+                image_path = self.image_folder + 'boxplot_' + str(
+                    var_name) + '_' + p + '.png'
+                figures.add(data_slide, str(ix), image_path,
+                            rgl.create_save_boxplot, p,
+                            rgl.boxplotdata_subset(boxplotdata_HL, i, p),
+                            rgl.boxplotdata_subset(boxplotdata_LH, i,
+                                                   p), 0, x, image_path)
+
+            # Create new slide, box plots, and bar charts for parameters
+            # and add them to the new slide
+            data_slide = figures.new_slide(
+                var_name + ' series and shunt resistances; yields')
+            params = ['Rs', 'Rsh', 'yields_var', 'yields_var_lab']
+            for ix, p in enumerate(params):
+                if p.find('yield') == -1:
+                    image_path = self.image_folder + 'boxplot_' + str(
+                        var_name) + '_' + p + '.png'
+                    figures.add(
+                        data_slide, str(ix), image_path,
+                        rgl.create_save_boxplot, p,
+                        rgl.boxplotdata_subset(boxplotdata_HL, i, p),
+                        rgl.boxplotdata_subset(boxplotdata_LH, i,
+                                               p), 0, x, image_path)
+                elif p == 'yields_var':
+                    image_path = self.image_folder + 'barchart_' + str(
+                        var_name) + '_' + p + '.png'
+                    figures.add(data_slide, str(ix), image_path,
+                                rgl.create_save_barchart, [yields_var[j]],
+                                [names_yield_var[j]], 0, image_path)
+                elif p == 'yields_var_lab':
+                    image_path = self.image_folder + 'barchart_' + str(
+                        var_name) + '_' + p + '.png'
+                    figures.add(data_slide, str(ix), image_path,
+                                rgl.create_save_barchart,
+                                [yields_var_lab[j]],
+                                [names_yield_var_lab[j]], 0, image_path)
+
+    @stage
+    def add_jv_all(self, figures, filtered):
+        """
+        Add slides of the J-V curves of every working pixel of each label.
+        """
+
+        filtered_data = filtered['filtered_data']
+
+        # Group data by label and sort ready to plot graph of all pixels per
+        # substrate
+        re_sort_data = filtered_data.sort_values(['Label', 'Pixel'],
+                                                 ascending=[True, True])
+        grouped_by_label = re_sort_data.groupby('Label', observed=True)
+
+        # Create lists of varibales, values, and labels for labelling figures
+        substrates = re_sort_data.drop_duplicates(['Label'])
+        variables = list(substrates['Variable'])
+        values = list(substrates['Value'])
+        labels = list(substrates['Label'])
+
+        # Describe figures and add them to powerpoint slides
+        i = 0
+        for name, group in grouped_by_label:
+
+            # Create a new slide after every four graphs are produced
+            if i % 4 == 0:
+                data_slide = figures.new_slide(
+                    'JV scans of every working pixel, page ' + str(int(i / 4)))
+
+            # Import data for each pixel
+            curves = []
+            for pixel, file in zip(group['Pixel'], group['File_Path']):
+                if '_LH_' in file:
+                    data_LH_path = file
+                    data_HL_path = file.replace('_LH_', '_HL_')
+                else:
+                    data_HL_path = file
+                    data_LH_path = file.replace('_HL_', '_LH_')
+                curves.append((pixel, rgl.load_data(data_LH_path),
+                               rgl.load_data(data_HL_path)))
+
+            image_path = self.image_folder + 'jv_all_' + str(
+                labels[i]) + '.png'
+            figures.add(data_slide,
+                        str(i % 4),
+                        image_path,
+                        rgl.plot_jv_curves,
+                        image_path,
+                        str(labels[i]) + ', ' + str(variables[i]) + ', ' +
+                        str(values[i]),
+                        curves,
+                        max(list(group['Jsc'])),
+                        lw=2.0)
+
+            i += 1
+
+    @stage
+    def add_best_pixels(self, figures, filtered):
+        """
+        Add slides of the light and dark J-V curves of the best pixel of each
+        variable value.
+        """
+
+        filtered_data = filtered['filtered_data']
+
+        # filter dataframe to leave on the best pixel for each variable value
+        sort_best_pixels = filtered_data.sort_values(
+            ['Variable', 'Value', 'PCE'], ascending=[True, True, False])
+        best_pixels = sort_best_pixels.drop_duplicates(['Variable', 'Value'])
+
+        # create lists of labels, varibales and values for labelling figures
+        labels = list(best_pixels['Label'])
+        variables = list(best_pixels['Variable'])
+        values = list(best_pixels['Value'])
+        jscs = list(best_pixels['Jsc'])
+
+        # Loop for iterating through best pixels dataframe and picking out JV
+        # data files. Each plot contains forward and reverse sweeps, both light
+        # and dark.
+        i = 0
+        for file in best_pixels['File_Path']:
+
+            # Create a new slide after every four graphs are produced
+            if i % 4 == 0:
+                data_slide = figures.new_slide('Best pixel JVs, page ' +
+                                               str(int(i / 4)))
+
+            # Import data for each pixel. If the dark data can't be loaded,
+            # just leave it out.
+            if '_LH_' in file:
+                JV_light_LH_path = file
+                JV_light_HL_path = file.replace('_LH_', '_HL_')
+            else:
+                JV_light_HL_path = file
+                JV_light_LH_path = file.replace('_HL_', '_LH_')
+            JV_light_LH_data = rgl.load_data(JV_light_LH_path)
+            JV_light_HL_data = rgl.load_data(JV_light_HL_path)
+            try:
+                JV_dark_LH_data = rgl.load_data(
+                    JV_light_LH_path.replace('Light', 'Dark'))
+                JV_dark_HL_data = rgl.load_data(
+                    JV_light_HL_path.replace('Light', 'Dark'))
+            except OSError:
+                JV_dark_LH_data = None
+                JV_dark_HL_data = None
+
+            image_path = self.image_folder + 'jv_best_' + str(
+                variables[i]) + '_' + str(values[i]) + '.png'
+            figures.add(data_slide, str(i % 4), image_path, rgl.plot_jv_best,
+                        image_path,
+                        str(labels[i]) + ', ' + str(variables[i]) + ', ' +
+                        str(values[i]), JV_light_LH_data, JV_light_HL_data,
+                        JV_dark_LH_data, JV_dark_HL_data, jscs[i])
+
+            i += 1
+
+    @stage
+    def add_repeat_scans(self, figures, filtered):
+        """
+        Add slides of the J-V curves of pixels that were scanned more than
+        once.
+        """
+
+        working_data = filtered['working_data']
+
+        # Sort the working scans of pixels working in both scan directions
+        # ready for plotting different scan rates/repeat scans
+        sorted_data_scan = working_data.sort_values(
+            ['Variable', 'Value', 'Label', 'Pixel', 'scan_num'],
+            ascending=[True, True, True, True, True])
+        filtered_scan_HL = sorted_data_scan[
+            sorted_data_scan.Scan_direction == 'HL']
+        filtered_scan_LH = sorted_data_scan[
+            sorted_data_scan.Scan_direction == 'LH']
+
+        # Create groups of data for each pixel for a given label
+        group_by_label_pixel_HL = filtered_scan_HL.groupby(['Label', 'Pixel'],
+                                                           observed=True)
+        group_by_label_pixel_LH = filtered_scan_LH.groupby(['Label', 'Pixel'],
+                                                           observed=True)
+
+        # Iterate through these groups in order of label and pixel and plot JV
+        # curves if more than one scan has been performed
+        i = 0
+        for iHL, iLH in zip(sorted(group_by_label_pixel_HL.indices),
+                            sorted(group_by_label_pixel_LH.indices)):
+            group_HL = group_by_label_pixel_HL.get_group(iHL)
+            group_LH = group_by_label_pixel_LH.get_group(iLH)
+
+            # Scans without a scan number in their file name have a NaN
+            # scan_num and aren't counted as repeats
+            if (group_HL['scan_num'] > 0).any():
+
+                # Get label, variable, value, and pixel for title and image
+                # path
+                label = group_HL['Label'].unique()[0]
+                variable = group_HL['Variable'].unique()[0]
+                value = group_HL['Value'].unique()[0]
+                pixel = group_HL['Pixel'].unique()[0]
+
+                # Find maximum Jsc of the group for y-axis limits
+                jsc_max = max(max(group_HL['Jsc']), max(group_LH['Jsc']))
+
+                # Start a new slide after every 4th figure
+                if i % 4 == 0:
+                    data_slide = figures.new_slide(
+                        'Repeat scan/scan rate variation JV curves, page ' +
+                        str(int(i / 4)))
+
+                # Open data files for a JV curve of each scan
+                curves = []
+                for path_HL, path_LH, scan_rate_HL, scan_num_HL in zip(
+                        group_HL['File_Path'], group_LH['File_Path'],
+                        group_HL['Scan_rate'], group_HL['scan_num']):
+                    curves.append(
+                        (str(scan_num_HL) + ', ' + str(scan_rate_HL) + ' V/s',
+                         rgl.load_data(path_HL), rgl.load_data(path_LH)))
+
+                image_path = self.image_folder + 'jv_repeats_' + str(
+                    label) + '_' + str(variable) + '_' + str(
+                        value) + '_' + str(pixel) + '.png'
+                figures.add(data_slide,
+                            str(i % 4),
+                            image_path,
+                            rgl.plot_jv_curves,
+                            image_path,
+                            str(label) + ', ' + str(variable) + ', ' +
+                            str(value),
+                            curves,
+                            jsc_max,
+                            box_width=0.8)
+
+                i += 1
+
+    @stage
+    def add_jt(self, figures, filtered):
+        """
+        Add slides of the time dependence measurements.
+        """
+
+        sorted_data = filtered['sorted_data']
+
+        # Build a time dependence log dataframe from file paths and J-V log
+        # file.
+        time_files = rgl.exp_file_list(self.folderpath + self.folderpath_time)
+        if time_files['exists']:
+            time_files_df = rgl.build_log_df(time_files, sorted_data)
+
+            sorted_time_files = time_files_df.sort_values(
+                ['Label', 'Pixel', 'Scan_direction'],
+                ascending=[True, True, True])
+            sorted_time_files = sorted_time_files.drop_duplicates(
+                ['Label', 'Pixel'])
+
+            i = 0
+            for index, row in sorted_time_files.iterrows():
+
+                # Get label, variable, value, and pixel for title and image
+                # path
+                label = row['Label']
+                variable = row['Variable']
+                value = row['Value']
+                pixel = row['Pixel']
+
+                # Start a new slide after every 4th figure
+                if i % 4 == 0:
+                    data_slide = figures.new_slide('J-t characterics, page ' +
+                                                   str(int(i / 4)))
+
+                # Open the data files
+                path_HL = row['File_Path']
+                path_LH = path_HL.replace('HL', 'LH')
+                data_jt = np.vstack([rgl.load_data(path_HL),
+                                     rgl.load_data(path_LH)])
+
+                image_path = self.image_folder + 'jt_' + str(
+                    label) + '_' + str(variable) + '_' + str(
+                        value) + '_' + str(pixel) + '.png'
+                figures.add(data_slide, str(i % 4), image_path, rgl.plot_jt,
+                            image_path,
+                            str(label) + ', pixel ' + str(pixel) + ', ' +
+                            str(variable) + ', ' + str(value), data_jt)
+
+                i += 1
+
+    @stage
+    def add_mppt(self, figures, filtered):
+        """
+        Add slides of the maximum power stabilisation measurements.
+        """
+
+        sorted_data = filtered['sorted_data']
+
+        # Build a max power stabilisation log dataframe from file paths and J-V
+        # log file.
+        maxp_files = rgl.exp_file_list(self.folderpath + self.folderpath_maxp)
+        if maxp_files['exists']:
+            maxp_files_df = rgl.build_log_df(maxp_files, sorted_data)
+
+            i = 0
+            for index, row in maxp_files_df.iterrows():
+
+                # Get label, variable, value, and pixel for title and image
+                # path
+                label = row['Label']
+                variable = row['Variable']
+                value = row['Value']
+                pixel = row['Pixel']
+
+                # Start a new slide after every 4th figure
+                if i % 4 == 0:
+                    data_slide = figures.new_slide(
+                        'Maximum power stabilisation, page ' + str(int(i / 4)))
+
+                image_path = self.image_folder + 'mppt_' + str(
+                    label) + '_' + str(variable) + '_' + str(
+                        value) + '_' + str(pixel) + '.png'
+                figures.add(data_slide, str(i % 4), image_path, rgl.plot_mppt,
+                            image_path,
+                            str(label) + ', pixel ' + str(pixel) + ', ' +
+                            str(variable) + ', ' + str(value),
+                            rgl.load_data(row['File_Path']))
+
+                i += 1
+
+    @stage
+    def add_intensity(self, figures, intensity_log):
+        """
+        Add slides of the intensity dependence measurements if there are any.
+        """
+
+        # Plot inensity dependent graphs if experiment data exists
+        if intensity_log is not None:
+
+            # Sort, filter, and group intensity dependent data
+            sorted_data_int = intensity_log.sort_values(
+                ['Label', 'Pixel', 'Intensity', 'PCE'],
+                ascending=[True, True, True, False])
+            filtered_data_int_HL = sorted_data_int[(
+                sorted_data_int.Scan_direction == 'HL')]
+            filtered_data_int_LH = sorted_data_int[(
+                sorted_data_int.Scan_direction == 'LH')]
+            filtered_data_int_HL = filtered_data_int_HL.drop_duplicates(
+                ['Label', 'Pixel', 'Intensity'])
+            filtered_data_int_LH = filtered_data_int_LH.drop_duplicates(
+                ['Label', 'Pixel', 'Intensity'])
+            group_by_label_pixel_HL = filtered_data_int_HL.groupby(
+                ['Label', 'Pixel'])
+            group_by_label_pixel_LH = filtered_data_int_LH.groupby(
+                ['Label', 'Pixel'])
+
+            # Plot intensity dependent JV curve parameters
+            for ng_HL, ng_LH in zip(group_by_label_pixel_HL,
+                                    group_by_label_pixel_LH):
+
+                # Unpack group data
+                group_HL = ng_HL[1]
+                group_LH = ng_LH[1]
+
+                # Get label, variable, value, and pixel for title and image
+                # path
+                label = group_HL['Label'].unique()[0]
+                variable = group_HL['Variable'].unique()[0]
+                value = group_HL['Value'].unique()[0]
+                pixel = group_HL['Pixel'].unique()[0]
+                name = str(label) + '_' + str(variable) + '_' + str(
+                    value) + '_' + str(pixel) + '.png'
+
+                # Create new slide (do this every iteration of the loop because
+                # each loop creates four graphs)
+                data_slide = figures.new_slide('Intensity dependence ' +
+                                               str(label) + ', ' +
+                                               str(variable) + ', ' +
+                                               str(value) + ', pixel ' +
+                                               str(pixel))
+
+                # Intensity dependence of Jsc with linear fits, ln(Jsc)
+                # dependence of Voc with linear fits estimating n and J0
+                # assuming a single diode equivalent circuit, and intensity
+                # dependence of FF and PCE
+                image_path = self.image_folder + 'intensity_jsc_' + name
+                figures.add(data_slide, '0', image_path,
+                            rgl.plot_intensity_jsc, image_path, group_HL,
+                            group_LH)
+                image_path = self.image_folder + 'intensity_voc_' + name
+                figures.add(data_slide, '1', image_path,
+                            rgl.plot_intensity_voc, image_path, group_HL,
+                            group_LH)
+                image_path = self.image_folder + 'intensity_ff_' + name
+                figures.add(data_slide, '2', image_path,
+                            rgl.plot_intensity_parameter, image_path, group_HL,
+                            group_LH, 'FF', 'FF')
+                image_path = self.image_folder + 'intensity_pce_' + name
+                figures.add(data_slide, '3', image_path,
+                            rgl.plot_intensity_parameter, image_path, group_HL,
+                            group_LH, 'PCE', 'PCE (%)')
+
+            # Plot intensity dependent JV curves
+            i = 0
+            for ng_HL, ng_LH in zip(group_by_label_pixel_HL,
+                                    group_by_label_pixel_LH):
+
+                # Unpack group data
+                group_HL = ng_HL[1]
+                group_LH = ng_LH[1]
+
+                # Get label, variable, value, and pixel for title and image
+                # path
+                label = group_HL['Label'].unique()[0]
+                variable = group_HL['Variable'].unique()[0]
+                value = group_HL['Value'].unique()[0]
+                pixel = group_HL['Pixel'].unique()[0]
+
+                # Find maximum Jsc of the group for y-axis limits
+                jsc_max = max(max(group_HL['Jsc']), max(group_LH['Jsc']))
+
+                # Start a new slide after every 4th figure
+                if i % 4 == 0:
+                    data_slide = figures.new_slide(
+                        'Intensity dependent JV curves, page ' +
+                        str(int(i / 4)))
+
+                # Open data files for a JV curve of each intensity
+                curves = []
+                for path_HL, path_LH, intensity_HL in zip(
+                        group_HL['File_Path'], group_LH['File_Path'],
+                        group_HL['Intensity']):
+                    curves.append((str(round(intensity_HL * 100, 1)) +
+                                   ' mW/cm^2', rgl.load_data(path_HL),
+                                   rgl.load_data(path_LH)))
+
+                image_path = self.image_folder + 'jv_intensity_' + str(
+                    label) + '_' + str(variable) + '_' + str(
+                        value) + '_' + str(pixel) + '.png'
+                figures.add(data_slide,
+                            str(i % 4),
+                            image_path,
+                            rgl.plot_jv_curves,
+                            image_path,
+                            str(label) + ', pixel ' + str(pixel) + ', ' +
+                            str(variable) + ', ' + str(value),
+                            curves,
+                            jsc_max,
+                            ylim_factor=1.05,
+                            box_width=0.7,
+                            legend_size=9,
+                            xlabel='Applied voltage (V)')
+
+                i += 1
+
+    @stage
+    def add_eqe(self, figures, filtered, eqe_log):
+        """
+        Add slides of the EQE measurements if there are any.
+        """
+
+        filtered_data_HL = filtered['filtered_data_HL']
+        filtered_data_LH = filtered['filtered_data_LH']
+
+        # Plot eqe graphs if experiment data exists
+        if eqe_log is not None:
+
+            # Sort, filter, and group data
+            sorted_data_eqe = eqe_log.sort_values(
+                ['Variable', 'Value', 'Label', 'Pixel', 'Int_Jsc'],
+                ascending=[True, True, True, True, False])
+            sorted_data_eqe = sorted_data_eqe.drop_duplicates(
+                ['Label', 'Pixel'])
+            filtered_data_HL_temp = pd.merge(filtered_data_HL,
+                                             sorted_data_eqe,
+                                             on=['Label', 'Pixel'],
+                                             how='inner')
+            filtered_data_LH_temp = pd.merge(filtered_data_LH,
+                                             sorted_data_eqe,
+                                             on=['Label', 'Pixel'],
+                                             how='inner')
+            sorted_data_eqe_HL = sorted_data_eqe
+            sorted_data_eqe_LH = sorted_data_eqe
+            sorted_data_eqe_HL['SS_Jsc'] = list(filtered_data_HL_temp['Jsc'])
+            sorted_data_eqe_LH['SS_Jsc'] = list(filtered_data_LH_temp['Jsc'])
+            grouped_by_label = sorted_data_eqe.groupby(['Label'])
+
+            # Plot EQE and spectral responsivity graphs with all pixels on the
+            # same device on the same plot
+            for responsivity, name, title in [
+                    (False, 'eqe_', 'External quantum efficiency, page '),
+                    (True, 'responsivity_', 'Spectral responsivity, page ')]:
+                i = 0
+                for key, group in grouped_by_label:
+
+                    # Get label, variable, and value for title and image path
+                    label = group['Label'].unique()[0]
+                    variable = group['Variable'].unique()[0]
+                    value = group['Value'].unique()[0]
+
+                    # Start a new slide after every 4th figure
+                    if i % 4 == 0:
+                        data_slide = figures.new_slide(title + str(int(i / 4)))
+
+                    # Load the EQE spectra of each pixel
+                    spectra = [(pixel, rgl.load_data(path))
+                               for path, pixel in zip(group['File_Path'],
+                                                      group['Pixel'])]
+
+                    image_path = self.image_folder + name + str(
+                        label) + '_' + str(variable) + '_' + str(
+                            value) + '.png'
+                    figures.add(data_slide,
+                                str(i % 4),
+                                image_path,
+                                rgl.plot_eqe,
+                                image_path,
+                                str(label) + ', ' + str(variable) + ', ' +
+                                str(value),
+                                spectra,
+                                responsivity=responsivity)
+
+                    i += 1
+
+            # Add measured vs. integrated Jsc scatter plot to a new slide
+            data_slide = figures.new_slide('Measured vs. Integrated Jsc')
+            image_path = self.image_folder + 'eqe_integrated_vs_ss' + '.png'
+            figures.add(data_slide, 'full', image_path,
+                        rgl.plot_integrated_jsc, image_path,
+                        sorted_data_eqe_HL, sorted_data_eqe_LH)
+
+    @stage
+    def add_weather(self, figures):
+        """
+        Add a slide of the weather log of the last 7 days.
+        """
+
+        # Get weather data and add to dataframe
+        weather_data = pd.read_csv(
+            self.weather_log,
+            delimiter=',',
+            skiprows=5,
+            header=0,
+            usecols=[0, 1, 11, 13, 14, 16, 17, 19, 20, 22],
+            parse_dates=[[0, 1]],
+            names=[
+                'Date', 'time', 'Lab T', 'Lab RH', 'Fume hood T',
+                'Fume hood RH', 'Solar sim T', 'Solar sim RH', 'Dessicator T',
+                'Dessicator RH'
+            ])
+
+        # Filter dataframe to leave only data from last 7 days
+        one_week_ago = pd.Timestamp(date.today() - timedelta(days=7))
+        weather_data = weather_data.loc[weather_data.Date_time > one_week_ago]
+
+        # Add the weather report to a new slide
+        data_slide = figures.new_slide('Weather report for the last 7 days')
+        figures.add(data_slide, 'full',
+                    self.image_folder + 'weather_report.png', rgl.plot_weather,
+                    self.image_folder + 'weather_report.png', weather_data)
+
+    @stage
+    def assemble_pptx(self, figures=None, filtered=None):
+        """
+        Build the presentation from the rendered figures, save it next to the
+        analysis, and return its path.
+        """
+
+        if filtered is None:
+            filtered = (self.filtered
+                        if self.filtered is not None else self.filter_data())
+        if figures is None:
+            figures = (self.figures if self.figures is not None else
+                       self.render_figures(filtered))
+        sorted_data = filtered['sorted_data']
+
+        # Get username, date, and experiment title from folderpath for the
+        # title page of the powerpoint version of the report.
+        # The experiment folder is username/year/month/date title/
+        folderpath_split = self.folderpath.rstrip('/').split('/')
+        username = folderpath_split[-4]
+        date_title_split = folderpath_split[-1].split(' ')
+        exp_date = date_title_split[0]
+        experiment_title = ' '.join(date_title_split[1:])
+
+        # Create a powerpoint presentation to add figures to.
+        prs = Presentation()
+
+        # Add title page with experiment title, date, and username.
+        title_slide_layout = prs.slide_layouts[0]
+        slide = prs.slides.add_slide(title_slide_layout)
+        title = slide.shapes.title
+        subtitle = slide.placeholders[1]
+        title.text = experiment_title
+        subtitle.text = exp_date + ', ' + username
+
+        # Add slides with tables for manual completion of experimental
+        # details, with up to 16 labels on each slide
+        rows = 17
+        cols = 6
+        labels = sorted(sorted_data['Label'].unique())
+        blank_slide_layout = prs.slide_layouts[6]
+        for start in range(0, max(len(labels), 1), rows - 1):
+            slide = prs.slides.add_slide(blank_slide_layout)
+            shapes = slide.shapes
+            left = Inches(0.15)
+            top = Inches(0.02)
+            width = prs.slide_width - Inches(0.25)
+            height = prs.slide_height - Inches(0.05)
+            table = shapes.add_table(rows, cols, left, top, width,
+                                     height).table
+
+            # set column widths
+            table.columns[0].width = Inches(0.8)
+            table.columns[1].width = Inches(1.2)
+            table.columns[2].width = Inches(2.0)
+            table.columns[3].width = Inches(2.0)
+            table.columns[4].width = Inches(2.0)
+            table.columns[5].width = Inches(1.7)
+
+            # write column headings
+            table.cell(0, 0).text = 'Label'
+            table.cell(0, 1).text = 'Substrate'
+            table.cell(0, 2).text = 'Bottom contact'
+            table.cell(0, 3).text = 'Perovskite'
+            table.cell(0, 4).text = 'Top contact'
+            table.cell(0, 5).text = 'Top electrode'
+
+            # Fill in label column of device info table in ppt
+            i = 1
+            for item in labels[start:start + rows - 1]:
+                table.cell(i, 0).text = str(item)
+                i += 1
+
+        # Define dimensions used for adding images to slides
+        height = prs.slide_height * 0.95 / 2
+        width = prs.slide_width * 0.95 / 2
+
+        # Create dictionaries that define where to put images on slides
+        # in the powerpoint presentation.
+        lefts = {'0': Inches(0),
+                 '1': prs.slide_width - width,
+                 '2': Inches(0),
+                 '3': prs.slide_width - width}
+        tops = {'0': prs.slide_height * 0.05,
+                '1': prs.slide_height * 0.05,
+                '2': prs.slide_height - height,
+                '3': prs.slide_height - height}
+
+        # Add the slides and images of the figures in the order they were
+        # described
+        figures.assemble(prs, lefts, tops, height)
+
+        # Save any newly parsed files to the binary store
+        self.store.save()
+
+        # Save powerpoint presentation
+        path = (self.analysis_folder + self.log_file_name.strip('LOG.txt') +
+                'summary.pptx')
+        prs.save(path)
+        return path
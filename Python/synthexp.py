@@ -0,0 +1,338 @@
+# Generator of synthetic experiment folders for testing and benchmarking the
+# report generation without measurement data.
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+import keithleysim
+
+# Columns of the J-V and intensity dependence log files
+LOG_COLUMNS = ['Label', 'Pixel', 'Condition', 'Variable', 'Value', 'Position',
+               'Jsc', 'Voc', 'PCE', 'FF', 'Area', 'Stabil_Level',
+               'Stabil_time', 'Meas_delay', 'Vmp', 'File_Path', 'Scan_rate',
+               'Scan_direction', 'Intensity']
+
+# Columns of the EQE log file
+EQE_LOG_COLUMNS = ['Label', 'Pixel', 'Variable', 'Value', 'Position',
+                   'Int_Jsc', 'Mismatch', 'Area', 'Frequency', 'File_Path']
+
+# Number of columns in the weather log and the columns holding the
+# temperature and relative humidity of each location
+WEATHER_COLUMNS = 23
+WEATHER_DATA_COLUMNS = [11, 13, 14, 16, 17, 19, 20, 22]
+
+
+def save_data(path, data, header):
+    # Save columns of data with a header line like the measurement software
+    np.savetxt(path,
+               data,
+               fmt='%.6e',
+               delimiter='\t',
+               header=header,
+               comments='',
+               newline='\r\n')
+
+
+def write_log(path, columns, rows):
+    # Write a tab separated log file with a header line
+    with open(path, 'w') as f:
+        f.write('\t'.join(columns) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(x) for x in row) + '\n')
+
+
+def jv_parameters(V, J, suns=1):
+    """
+    Return the Jsc (mA/cm^2), Voc (V), PCE (%), FF, and Vmp (V) of a light J-V
+    curve with J in the sign convention of the Keithley, i.e. negative when
+    the cell generates power. Curves that don't generate power return zeros.
+    """
+
+    order = np.argsort(V)
+    V = V[order]
+    J = J[order]
+    jsc = -np.interp(0, V, J)
+    if (jsc <= 0) or (J[-1] < 0):
+        return 0, 0, 0, 0, 0
+    voc = np.interp(0, J, V)
+    P = -V * J
+    i = np.argmax(P)
+    return jsc, voc, P[i] / suns, P[i] / (jsc * voc), V[i]
+
+
+def experiment_folder(root, user, exp_date, title):
+    """
+    Return the path of an experiment folder in root, laid out like
+    SolarSimData/user/year/month/date title/.
+    """
+
+    return (root.rstrip('/') + '/SolarSimData/' + user + '/' +
+            exp_date.strftime('%Y') + '/' + exp_date.strftime('%m-%b') + '/' +
+            exp_date.strftime('%d-%m-%Y') + ' ' + title + '/')
+
+
+def write_experiment(root,
+                     substrates=10,
+                     pixels=8,
+                     scans=1,
+                     points=101,
+                     variables=3,
+                     values=2,
+                     control=False,
+                     dead=0.1,
+                     intensities=(0.1, 0.3, 0.5, 0.7, 1.0),
+                     jt_points=100,
+                     mppt_points=500,
+                     eqe_points=56,
+                     weather_days=10,
+                     log_file_name='synthetic_LOG.txt',
+                     user='Synthetic',
+                     title='Synthetic experiment',
+                     seed=0):
+    """
+
+    Write a synthetic experiment to an experiment folder in root, with every
+    log and data file the report generation reads: the master J-V log and
+    J-V scans, time dependence, max power stabilisation, intensity dependence,
+    and EQE measurements, and a weather log (WxLog.csv) in the experiment
+    folder. Returns the path of the experiment folder, the name of the master
+    log file, and the path of the weather log.
+
+    Every pixel is a single diode with parameters that vary from pixel to
+    pixel, simulated by keithleysim.SimulatedKeithley2400. Each substrate is
+    assigned one of variables variables, cycling through values values of it.
+
+    substrates = number of substrates
+    pixels = number of pixels on each substrate
+    scans = number of light and dark scans in each direction per pixel, at
+            increasing scan rates
+    points = number of points in each J-V scan
+    variables = number of experimental variables
+    values = number of values of each variable
+    control = make every substrate after the variables have been cycled
+              through once a control substrate
+    dead = fraction of pixels that don't work
+    intensities = light intensities (suns) of the intensity dependence
+    jt_points, mppt_points, eqe_points = number of points in each time
+                                         dependence, max power stabilisation,
+                                         and EQE measurement
+    weather_days = number of days covered by the weather log, up to now
+    seed = seed for the random number generator
+
+    The time dependence, max power stabilisation, intensity dependence, and
+    EQE measurements are made on the first working pixel of each substrate.
+
+    """
+
+    rng = np.random.RandomState(seed)
+    now = datetime.datetime.now()
+    folderpath = experiment_folder(root, user, now.date(), title)
+    folders = {}
+    for name in ['J-V', 'Time Dependence', 'Max P Stabilisation',
+                 'Intensity Dependence', 'EQE']:
+        folders[name] = folderpath + name + '/'
+        if not os.path.exists(folders[name]):
+            os.makedirs(folders[name])
+
+    area = 0.15
+    V_LH = np.linspace(-0.2, 1.3, points)
+    rows = []
+    intensity_rows = []
+    eqe_rows = []
+    for s in range(substrates):
+        label = 'S' + str(s)
+        if control and (s >= variables * values):
+            variable = 'Control'
+            value = 'Control'
+        else:
+            variable = 'Var' + str(s % variables)
+            value = str(100 * (1 + (s // variables) % values))
+
+        extra_done = False
+        for pixel in range(1, pixels + 1):
+
+            # Every pixel is a slightly different diode, or a dead one
+            working = rng.rand() >= dead
+            if working:
+                device = keithleysim.SimulatedKeithley2400(
+                    jsc=20 * (1 + 0.05 * rng.randn()),
+                    j0=1e-11 * np.exp(0.3 * rng.randn()),
+                    n=1.5 + 0.03 * rng.randn(),
+                    rs=2 * np.exp(0.3 * rng.randn()),
+                    rsh=2000 * np.exp(0.3 * rng.randn()),
+                    area=area)
+            else:
+                device = keithleysim.SimulatedKeithley2400(jsc=0.005,
+                                                           rsh=5,
+                                                           area=area)
+            noise = 0.01 * area / 1000
+
+            # J-V scans in the light and dark in both directions
+            for scan in range(scans):
+                scan_rate = round(0.1 * 2**scan, 3)
+                for condition in ['Light', 'Dark']:
+                    device.shutter_open = condition == 'Light'
+                    for direction in ['LH', 'HL']:
+                        V = V_LH if direction == 'LH' else V_LH[::-1]
+                        I = device.current(V) + noise * rng.randn(points)
+                        J = I * 1000 / area
+                        path = (folders['J-V'] + label + '_' + str(pixel) +
+                                '_' + condition + '_' + direction + '_scan' +
+                                str(scan) + '.txt')
+                        save_data(path, np.column_stack((V, J, I)),
+                                  'V (V)\tJ (mA/cm^2)\tI (A)')
+                        if condition == 'Light':
+                            jsc, voc, pce, ff, vmp = jv_parameters(V, J)
+                        else:
+                            jsc, voc, pce, ff, vmp = 0, 0, 0, 0, 0
+                        rows.append([label, pixel, condition, variable,
+                                     value, pixel, jsc, voc, pce, ff, area,
+                                     0, 0, 0, vmp, path, scan_rate, direction,
+                                     1])
+
+            if (not working) or extra_done:
+                continue
+            device.shutter_open = True
+            jsc, voc, pce, ff, vmp = jv_parameters(
+                V_LH, device.current(V_LH) * 1000 / area)
+            if pce == 0:
+                continue
+            extra_done = True
+            name = label + '_' + str(pixel) + '_Light_'
+
+            # Current transients at the max power point voltage after
+            # stepping from each scan direction
+            t = np.linspace(0, 10, jt_points)
+            for direction, sign in [('HL', 1), ('LH', -1)]:
+                J = device.current(np.full(jt_points, vmp)) * 1000 / area
+                J = J * (1 + sign * 0.05 * np.exp(-t / 2))
+                save_data(folders['Time Dependence'] + name + direction +
+                          '_jt.txt',
+                          np.column_stack((t, np.full(jt_points, vmp), J)),
+                          't (s)\tV (V)\tJ (mA/cm^2)')
+
+            # Max power stabilisation around the max power point
+            t = np.linspace(0, 60, mppt_points)
+            V = vmp + 0.01 * rng.randn(mppt_points)
+            I = device.current(V)
+            J = I * 1000 / area
+            save_data(folders['Max P Stabilisation'] + name +
+                      'scan0_MaxPStab.txt',
+                      np.column_stack((t, V, I, J, V * I,
+                                       np.absolute(V * J))),
+                      't (s)\tV (V)\tI (A)\tJ (mA/cm^2)\tP (W)\tPCE (%)')
+
+            # J-V scans at each light intensity
+            Iph = device.Iph
+            for k, suns in enumerate(intensities):
+                device.Iph = Iph * suns
+                for direction in ['LH', 'HL']:
+                    V = V_LH if direction == 'LH' else V_LH[::-1]
+                    J = device.current(V) * 1000 / area
+                    path = (folders['Intensity Dependence'] + name +
+                            direction + '_int' + str(k) + '.txt')
+                    save_data(path, np.column_stack((V, J)),
+                              'V (V)\tJ (mA/cm^2)')
+                    int_jsc, int_voc, int_pce, int_ff, int_vmp = (
+                        jv_parameters(V, J, suns))
+                    intensity_rows.append([label, pixel, 'Light', variable,
+                                           value, pixel, int_jsc, int_voc,
+                                           int_pce, int_ff, area, 0, 0, 0,
+                                           int_vmp, path, 0.1, direction,
+                                           suns])
+
+            # EQE spectrum with an absorption edge near 780 nm
+            wavelength = np.linspace(300, 850, eqe_points)
+            eqe = 85 / (1 + np.exp((wavelength - 780) / 10))
+            path = folders['EQE'] + label + '_' + str(pixel) + '_EQE.txt'
+            save_data(path, np.column_stack((wavelength, eqe)),
+                      'Wavelength (nm)\tEQE (%)')
+            eqe_rows.append([label, pixel, variable, value, pixel,
+                             jsc * (1 + 0.02 * rng.randn()), 1.0, area, 500,
+                             path])
+
+    write_log(folders['J-V'] + log_file_name, LOG_COLUMNS, rows)
+    write_log(folders['Intensity Dependence'] + log_file_name, LOG_COLUMNS,
+              intensity_rows)
+    write_log(folders['EQE'] + '_EQE_LOG.txt', EQE_LOG_COLUMNS, eqe_rows)
+
+    # Hourly weather log with 5 lines of preamble and a header line
+    weather_log = folderpath + 'WxLog.csv'
+    with open(weather_log, 'w') as f:
+        for i in range(5):
+            f.write('Synthetic weather log\n')
+        f.write(','.join('Column ' + str(i)
+                         for i in range(WEATHER_COLUMNS)) + '\n')
+        for hour in range(weather_days * 24, -1, -1):
+            t = now - datetime.timedelta(hours=hour)
+            row = [t.strftime('%d/%m/%Y'), t.strftime('%H:%M')]
+            for column in range(2, WEATHER_COLUMNS):
+                if column not in WEATHER_DATA_COLUMNS:
+                    row.append('0')
+                elif WEATHER_DATA_COLUMNS.index(column) % 2 == 0:
+                    row.append(str(round(22 + 2 * rng.randn(), 2)))
+                else:
+                    row.append(str(round(40 + 5 * rng.randn(), 2)))
+            f.write(','.join(row) + '\n')
+
+    return folderpath, log_file_name, weather_log
+
+
+def main(argv=None):
+    """
+    Write a synthetic experiment with the settings given by the command line
+    arguments in argv (sys.argv by default) and print its folder.
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic experiment folder')
+    parser.add_argument('root',
+                        type=str,
+                        help='Folder to write the experiment folder to')
+    parser.add_argument('--substrates',
+                        type=int,
+                        default=10,
+                        help='Number of substrates')
+    parser.add_argument('--pixels',
+                        type=int,
+                        default=8,
+                        help='Number of pixels on each substrate')
+    parser.add_argument('--scans',
+                        type=int,
+                        default=1,
+                        help='Number of scans per pixel in each condition '
+                        'and direction')
+    parser.add_argument('--points',
+                        type=int,
+                        default=101,
+                        help='Number of points in each J-V scan')
+    parser.add_argument('--variables',
+                        type=int,
+                        default=3,
+                        help='Number of experimental variables')
+    parser.add_argument('--control',
+                        action='store_true',
+                        help='Include control substrates')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='Seed for the random number generator')
+    args = parser.parse_args(argv)
+
+    folderpath, log_file_name, weather_log = write_experiment(
+        args.root,
+        substrates=args.substrates,
+        pixels=args.pixels,
+        scans=args.scans,
+        points=args.points,
+        variables=args.variables,
+        control=args.control,
+        seed=args.seed)
+    print(folderpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+# Make the modules in the Python folder importable from the tests, which are
+# run with e.g. python -m pytest tests from the Python folder.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
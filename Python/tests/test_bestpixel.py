@@ -0,0 +1,96 @@
+# Tests of the best pixel index and service.
+
+import io
+import os
+
+import bestpixel
+import measurementdb
+from test_measurementdb import HEADER, log_row, write
+
+
+def test_index_updates_with_new_rows(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0, 0.7) + log_row('A', 2, 9.0))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        index = bestpixel.BestPixelIndex(db, log)
+        assert index.sync() == 2
+        assert index.best_pixel('A')['Pixel'] == 1
+        assert index.best_pixel('A', 'Thickness', 100)['Pixel'] == 1
+        assert index.best_pixel('B') is None
+
+        # Better scans appended later replace the indexed ones, and dark
+        # scans are ignored
+        write(log, log_row('A', 2, 12.0, 0.85, 'HL') +
+              log_row('A', 1, 30.0, 0.1, condition='Dark'), 'a')
+        assert index.sync() == 2
+        assert index.best_pixel('A')['Pixel'] == 2
+        assert index.max_power_voltage('A', 1) == 0.7
+        assert index.max_power_voltage('A', 2) == 0.85
+        assert index.max_power_voltage('A', 3) is None
+
+
+def test_index_rebuilds_replaced_log(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0, 0.7) + log_row('A', 2, 9.0))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        index = bestpixel.BestPixelIndex(db, log)
+        index.sync()
+
+        # A new log with as many rows, whose rows get new ids, so the index
+        # doesn't keep the scans of the old one
+        write(log, HEADER + log_row('A', 1, 5.0, 0.6) + log_row('A', 2, 8.0))
+        stat = os.stat(log)
+        os.utime(log, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert index.sync() == 2
+        assert index.best_pixel('A')['Pixel'] == 2
+        assert index.max_power_voltage('A', 1) == 0.6
+
+
+def test_service_commands(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    service = bestpixel.BestPixelService(str(tmpdir.join('m.db')))
+    commands = [
+        'append\t' + log + '\t' + log_row('A', 1, 10.0, 0.7).rstrip('\n'),
+        'best\t' + log + '\tA', 'best\t' + log + '\tB',
+        'vmp\t' + log + '\tA\t1', 'sync\t' + log, 'unknown', 'quit', 'ping'
+    ]
+    wfile = io.StringIO()
+    try:
+        assert service.serve(io.StringIO('\n'.join(commands) + '\n'), wfile)
+    finally:
+        service.close()
+    assert wfile.getvalue().split('\n') == [
+        'OK\t1', 'OK\t1\t0.7\t10.0', 'NONE', 'OK\t0.7', 'OK\t0',
+        'ERROR\tUnknown command: unknown', 'OK', ''
+    ]
+
+
+def test_service_matches_numbers_in_columns_with_text(tmpdir):
+    # A Control substrate makes the Value column hold text, so the value 100
+    # is read as '100' but given as a number to lookups
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('C', 1, 8.0, variable='Control',
+                                value='Control') +
+          log_row('S1', 1, 10.0, 0.7, variable='Temp', value=100) +
+          log_row('S2', 1, 11.0, 0.75, variable='Temp', value=150.5))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        index = bestpixel.BestPixelIndex(db, log)
+        index.sync()
+        assert index.best_pixel('S1', 'Temp', 100)['Pixel'] == 1
+        assert index.best_pixel('S2', 'Temp', 150.5)['Pixel'] == 1
+        assert index.best_pixel('C', 'Control', 'Control')['Pixel'] == 1
+
+    service = bestpixel.BestPixelService(str(tmpdir.join('m2.db')))
+    commands = ['best\t' + log + '\tS1\tTemp\t100',
+                'best\t' + log + '\tS2\tTemp\t150.5',
+                'best\t' + log + '\tC\tControl\tControl',
+                'best\t' + log + '\tS1\tTemp\t150.5']
+    wfile = io.StringIO()
+    try:
+        service.serve(io.StringIO('\n'.join(commands) + '\n'), wfile)
+    finally:
+        service.close()
+    assert wfile.getvalue().split('\n') == [
+        'OK\t1\t0.7\t10.0', 'OK\t1\t0.75\t11.0', 'OK\t1\t0.8\t8.0',
+        'NONE', ''
+    ]
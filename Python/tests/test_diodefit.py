@@ -0,0 +1,57 @@
+# Tests of the vectorised single diode model fit.
+
+import numpy as np
+
+import diodefit
+
+# Parameters of two typical cells, as J0 (A/cm^2), n, Rs (ohm cm^2),
+# Rsh (ohm cm^2), and Jph (A/cm^2)
+CELLS = np.array([[1e-12, 1.5, 2.0, 2000.0, 0.02],
+                  [1e-9, 1.8, 5.0, 500.0, 0.015]])
+
+
+def log_parameters(cells):
+    # Return the parameters of diode_current for rows of CELLS
+    return np.column_stack((np.log(cells[:, 0]), cells[:, 1],
+                            np.log(cells[:, 2]), np.log(cells[:, 3]),
+                            cells[:, 4]))
+
+
+def test_jacobian_matches_finite_differences():
+    V = np.tile(np.linspace(-0.2, 1.1, 40), (len(CELLS), 1))
+    p = log_parameters(CELLS)
+    state = diodefit.diode_current(V, p)[1]
+    jac = diodefit.diode_jacobian(state)
+    for k in range(p.shape[1]):
+        h = 1e-6 * max(1, abs(p[0, k]))
+        step = np.zeros_like(p)
+        step[:, k] = h
+        J_plus = diodefit.diode_current(V, p + step)[0]
+        J_minus = diodefit.diode_current(V, p - step)[0]
+        dJ = (J_plus - J_minus) / (2 * h)
+        assert np.allclose(jac[:, :, k], dJ, rtol=1e-4,
+                           atol=1e-6 * np.abs(dJ).max())
+
+
+def test_fit_recovers_parameters():
+    V = np.tile(np.linspace(-0.2, 1.1, 60), (len(CELLS), 1))
+    J = diodefit.diode_current(V, log_parameters(CELLS))[0]
+    results = diodefit.fit_curves(V, J)
+    assert results.shape == (len(CELLS), len(diodefit.RESULTS))
+    assert np.allclose(results[:, :5], CELLS, rtol=1e-3)
+    assert np.all(results[:, 5] < 1e-8)
+
+
+def test_fit_jv_curves_converts_units_and_polarity():
+    # Curves in mA/cm^2 in the sign convention of the Keithley, the second
+    # measured with inverted polarity, and one too short to fit
+    V = np.linspace(-0.2, 1.1, 60)
+    J = diodefit.diode_current(np.tile(V, (len(CELLS), 1)),
+                               log_parameters(CELLS))[0]
+    curves = [np.column_stack((V, -J[0] * 1000)),
+              np.column_stack((-V, J[1] * 1000)),
+              np.column_stack((V[:4], -J[0, :4] * 1000))]
+    results = diodefit.fit_jv_curves(curves, [1, -1, 1], workers=1)
+    expected = CELLS * [1000, 1, 1, 1, 1000]
+    assert np.allclose(results[:2, :5], expected, rtol=1e-3)
+    assert np.all(np.isnan(results[2]))
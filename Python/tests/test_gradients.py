@@ -0,0 +1,68 @@
+# Tests of the gradient estimates of series and shunt resistance.
+
+import numpy as np
+
+import reportgenlib as rgl
+
+# Coefficients of a cubic J-V curve, J (mA/cm^2) = a + b V + c V^2 + d V^3,
+# which a third order Savitzky-Golay filter differentiates exactly
+COEFFICIENTS = [-20.0, 2.0, 5.0, 30.0]
+AREA = 0.1
+
+
+def cubic_curve(V):
+    # Return a J-V curve array of the cubic at voltages V
+    a, b, c, d = COEFFICIENTS
+    return np.column_stack((V, a + b * V + c * V**2 + d * V**3))
+
+
+def resistance(V):
+    # Return the inverse gradient (ohms) of the cubic at voltage V
+    a, b, c, d = COEFFICIENTS
+    return 1000 / ((b + 2 * c * V + 3 * d * V**2) * AREA)
+
+
+def test_interpolate_rows():
+    x = np.array([[0.0, 1.0, 2.0], [2.0, 1.0, 0.0], [0.0, 1.0, 2.0]])
+    y = np.array([[0.0, 10.0, 20.0], [0.0, 10.0, 20.0], [1.0, 1.0, 1.0]])
+    y0 = rgl.interpolate_rows(x, y, np.array([1.5, 0.5, 3.0]))
+    assert np.allclose(y0[:2], [15.0, 15.0])
+    assert np.isnan(y0[2])
+
+
+def test_gradient_resistances_of_cubic_curves():
+    V = np.linspace(-0.2, 1.2, 57)
+    curves = [cubic_curve(V), cubic_curve(V[::-1]), cubic_curve(-V)]
+    Voc = [0.9, 0.9, 0.9]
+    Vmp = [0.7, 0.7, -0.7]
+    Rs, Rsh = rgl.JV_gradient_resistances(curves, Vmp, Voc, [AREA] * 3)
+
+    # Forward and reverse scans give the same resistances, and a curve with
+    # Vmp < 0 is evaluated at -Voc
+    assert np.allclose(Rs, [resistance(0.9)] * 2 + [resistance(-0.9)])
+    assert np.allclose(Rsh, resistance(0))
+
+
+def test_gradient_resistances_of_unevenly_spaced_curves():
+    # Voltage steps growing from 7.5 mV to 42.5 mV along the scan, in both
+    # scan directions
+    u = np.linspace(0, 1, 57)
+    V = -0.2 + 1.4 * (0.3 * u + 0.7 * u**2)
+    curves = [cubic_curve(V), cubic_curve(V[::-1])]
+    Rs, Rsh = rgl.JV_gradient_resistances(curves, [0.7, 0.7], [0.9, 0.9],
+                                          [AREA, AREA])
+    assert np.allclose(Rs, resistance(0.9), rtol=0.01)
+    assert np.allclose(Rsh, resistance(0), rtol=0.01)
+
+
+def test_gradient_resistances_of_unusable_curves():
+    V = np.linspace(0, 0.5, 30)
+    curves = [cubic_curve(V), cubic_curve(V[:10])]
+    Rs, Rsh = rgl.JV_gradient_resistances(curves, [0.4, 0.4], [0.9, 0.9],
+                                          [AREA, AREA])
+
+    # A curve that stops before open-circuit has no Rs, and one shorter than
+    # the filter window has neither
+    assert np.isnan(Rs[0])
+    assert np.isclose(Rsh[0], resistance(0))
+    assert np.isnan(Rs[1]) and np.isnan(Rsh[1])
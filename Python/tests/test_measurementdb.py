@@ -0,0 +1,138 @@
+# Tests of the measurement database of J-V log rows.
+
+import os
+import sqlite3
+
+import measurementdb
+
+HEADER = '\t'.join(measurementdb.LOG_COLUMNS) + '\n'
+
+
+def log_row(label, pixel, PCE, Vmp=0.8, direction='LH', condition='Light',
+            scan=0, variable='Thickness', value=100):
+    # Return a line of a J-V log
+    return '\t'.join(str(x) for x in [
+        label, pixel, condition, variable, value, 'A', 20.0, 1.0, PCE, 0.7,
+        0.15, 0, 0, 0, Vmp, 'C:/data/' + label + '_' + str(pixel) + '_scan' +
+        str(scan) + '.txt', 50.0, direction, 1.0
+    ]) + '\n'
+
+
+def write(path, text, mode='w'):
+    # Write text to a file without translating line endings
+    with open(path, mode, newline='') as f:
+        f.write(text)
+
+
+def touch_later(path):
+    # Move the modification time of a file on, like a later write would
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_sync_reads_new_rows_once(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0) + log_row('A', 2, 12.0))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        assert db.sync_log(log) == 2
+        assert db.sync_log(log) == 0
+
+        # Only the rows appended are read, and a last line without a line
+        # ending is left until it is complete
+        write(log, log_row('B', 1, 11.0, scan=1) + 'B\t2\tLight', 'a')
+        assert db.sync_log(log) == 1
+        write(log, log_row('B', 2, 9.0)[len('B\t2\tLight'):], 'a')
+        assert db.sync_log(log) == 1
+        rows = db.read_log(log)
+        assert list(rows['Label']) == ['A', 'A', 'B', 'B']
+        assert list(rows['scan_num']) == [0, 0, 1, 0]
+
+
+def test_sync_rebuilds_replaced_log(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        db.sync_log(log)
+
+        # A new log with the same header and more rows replaces the old rows
+        # instead of adding to them
+        write(log, HEADER + log_row('C', 1, 15.0) + log_row('C', 2, 14.0))
+        touch_later(log)
+        assert db.sync_log(log) == 2
+        assert list(db.read_log(log)['Label']) == ['C', 'C']
+
+        # So does one of the same size copied with an earlier modification
+        # time
+        stat = os.stat(log)
+        write(log, HEADER + log_row('D', 1, 15.0) + log_row('D', 2, 14.0))
+        os.utime(log, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+        assert db.sync_log(log) == 2
+        assert list(db.read_log(log)['Label']) == ['D', 'D']
+
+
+def test_sync_compares_the_end_of_long_logs(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    rows = [log_row('A', i, 10.0) for i in range(200)]
+    assert len(''.join(rows)) > 2 * measurementdb.DIGEST_WINDOW
+    write(log, HEADER + ''.join(rows))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        assert db.sync_log(log) == 200
+
+        # Rows appended to a log longer than the window are read on their
+        # own, including after a short append
+        write(log, log_row('B', 1, 11.0), 'a')
+        assert db.sync_log(log) == 1
+        write(log, log_row('B', 2, 12.0) + log_row('B', 3, 13.0), 'a')
+        assert db.sync_log(log) == 2
+
+        # A copy with a different last row read is a new log
+        rows += [log_row('B', 1, 11.0), log_row('B', 2, 12.0),
+                 log_row('C', 3, 13.0)]
+        write(log, HEADER + ''.join(rows))
+        touch_later(log)
+        assert db.sync_log(log) == 203
+        assert list(db.read_log(log)['Label'])[-2:] == ['B', 'C']
+
+
+def test_append_ends_last_line(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        assert db.append(log, [log_row('A', 1, 10.0)]) == 1
+
+        # A complete row without a line ending, e.g. written by hand, is
+        # read before the new row is appended on a line of its own
+        write(log, log_row('A', 2, 12.0).rstrip('\n'), 'a')
+        assert db.append(log, [log_row('A', 3, 11.0)]) == 1
+        with open(log) as f:
+            assert f.read() == HEADER + log_row('A', 1, 10.0) + log_row(
+                'A', 2, 12.0) + log_row('A', 3, 11.0)
+        assert list(db.read_log(log)['Pixel']) == [1, 2, 3]
+
+
+def test_lookups(tmpdir):
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0, 0.7) +
+          log_row('A', 2, 12.0, 0.8, 'HL') +
+          log_row('A', 2, 11.0, 0.9, 'LH') +
+          log_row('A', 3, 20.0, 0.1, condition='Dark'))
+    with measurementdb.MeasurementDB(str(tmpdir.join('m.db'))) as db:
+        db.sync_log(log)
+        assert db.best_pixel('A')['Pixel'] == 2
+        assert db.best_pixel('A', source='other') is None
+        assert db.max_power_voltage('A', 2) == 0.8
+        assert db.max_power_voltage('A', 2, scan_direction='LH') == 0.9
+        assert db.max_power_voltage('A', 3) is None
+
+
+def test_old_databases_are_rebuilt(tmpdir):
+    path = str(tmpdir.join('m.db'))
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE sources (path TEXT PRIMARY KEY, '
+                       'header TEXT, offset INTEGER)')
+    connection.commit()
+    connection.close()
+
+    log = str(tmpdir.join('LOG.txt'))
+    write(log, HEADER + log_row('A', 1, 10.0))
+    with measurementdb.MeasurementDB(path) as db:
+        assert db.sync_log(log) == 1
@@ -0,0 +1,175 @@
+# Tests of the max power point tracking library. Instruments are simulated
+# Keithley 2400s.
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import mpptlib
+
+
+class FailingQueries:
+    # Wrap a simulated Keithley so that queries fail after a number of them,
+    # like a VISA timeout
+
+    def __init__(self, keithley, queries):
+        self.keithley = keithley
+        self.queries = queries
+
+    def write(self, message):
+        self.keithley.write(message)
+
+    def query(self, message):
+        self.queries -= 1
+        if self.queries < 0:
+            raise TimeoutError('VI_ERROR_TMO')
+        return self.keithley.query(message)
+
+
+def test_pipelined_tracker_raises_instrument_errors(tmpdir):
+    tracker = mpptlib.MaxPowerPointTracker('SIM::seed=0::latency=0.0001',
+                                           mode='pipelined',
+                                           shutter=False)
+    keithley = tracker.keithley
+    tracker.keithley = FailingQueries(keithley, 20)
+    errors = []
+
+    def track():
+        try:
+            tracker.track(str(tmpdir.join('mppt.txt')), 0.7, 2, 0.15, 1)
+        except Exception as e:
+            errors.append(e)
+
+    # The error has to reach the caller instead of leaving it waiting for
+    # replies, and the output has to be turned off afterwards
+    thread = threading.Thread(target=track, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    assert isinstance(errors[0], TimeoutError)
+    assert not keithley.output
+
+
+def test_tracker_checks_the_data_path_before_tracking(tmpdir):
+    tracker = mpptlib.MaxPowerPointTracker('SIM::seed=0::latency=0.0001')
+    path = str(tmpdir.join('missing', 'mppt.txt'))
+
+    # A path that can't be written raises straight away instead of after
+    # tracking, before the output is turned on
+    t_begin = time.time()
+    with pytest.raises(IOError):
+        tracker.track(path, 0.7, 30, 0.15, 1)
+    assert time.time() - t_begin < 5
+    assert not tracker.keithley.output
+    assert not tracker.keithley.shutter_open
+    tracker.close()
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'),
+                    reason='needs a device that fails every write')
+def test_tracker_turns_output_off_if_writing_fails():
+    tracker = mpptlib.MaxPowerPointTracker('SIM::seed=0::latency=0.0001')
+
+    # The error writing the data is raised after the output is turned off
+    # and the shutter closed
+    with pytest.raises(OSError):
+        tracker.track('/dev/full', 0.7, 1, 0.15, 1)
+    assert not tracker.keithley.output
+    assert not tracker.keithley.shutter_open
+    tracker.close()
+
+
+def test_pipelined_tracker_defaults_to_scaled_steps(tmpdir):
+    # Pipelined tracking only uses every other reply, so it defaults to an
+    # algorithm that converges in a few setpoints
+    tracker = mpptlib.MaxPowerPointTracker('SIM::seed=0::latency=0.0001',
+                                           mode='pipelined')
+    assert tracker.algorithm == 'inccond'
+    assert mpptlib.default_algorithm('point') == 'steepest'
+
+    # The voltage ends close to the maximum power point of the simulated
+    # cell
+    path = str(tmpdir.join('mppt.txt'))
+    tracker.track(path, 0.7, 1, 0.15, 1)
+    tracker.close()
+    data = np.genfromtxt(path, delimiter='\t', skip_header=1)
+    V_mpp, P_mpp = tracker.keithley.max_power()
+    assert abs(np.mean(data[-20:, 1]) - V_mpp) < 0.01
+
+
+class BlockWriter:
+    # Collect the blocks a SampleBuffer hands to its writer
+
+    def __init__(self):
+        self.blocks = []
+
+    def write(self, block):
+        self.blocks.append(block)
+
+
+def test_sample_buffer_spans_chunks():
+    samples = mpptlib.SampleBuffer(0.5, 2, chunk_size=4)
+    t = np.arange(10.0)
+    for i in range(3):
+        samples.append(t[i], 0.1 * t[i], -0.01 * t[i])
+    samples.extend(t[3:], 0.1 * t[3:], -0.01 * t[3:])
+    assert len(samples) == 10
+    assert np.array_equal(samples.raw(), [t, 0.1 * t, -0.01 * t])
+
+    # Derived columns of J (mA/cm^2), P (W), and PCE (%)
+    data = samples.derived(8)
+    V = 0.1 * t[8:]
+    I = -0.01 * t[8:]
+    assert np.allclose(data[:, 3], I * 1000 / 0.5)
+    assert np.allclose(data[:, 4], V * I)
+    assert np.allclose(data[:, 5], np.absolute(V * I) * 1000 / (2 * 0.5))
+
+
+def test_sample_buffer_flushes_and_releases_chunks():
+    writer = BlockWriter()
+    samples = mpptlib.SampleBuffer(0.15,
+                                   1,
+                                   chunk_size=4,
+                                   writer=writer,
+                                   flush_points=5,
+                                   flush_interval=1e9)
+    for i in range(12):
+        samples.append(i, 0.5, -0.001)
+    samples.flush()
+
+    # Every sample is written once, in order, and only the last chunk is
+    # still held in memory
+    written = np.concatenate(writer.blocks)
+    assert np.array_equal(written[:, 0], np.arange(12))
+    assert len(samples) == 12
+    assert len(samples._chunks) == 1
+
+
+def test_decimator_holds_back_the_last_interval():
+    decimator = mpptlib.Decimator(1.0)
+    block = np.column_stack((np.arange(0, 2.5, 0.25), np.arange(10.0)))
+
+    # Intervals [0, 1) and [1, 2) are complete, [2, 3) may get more samples
+    rows = decimator.reduce(block)
+    assert np.allclose(rows, [[0.5, 1.5], [1.5, 5.5]])
+    rows = decimator.reduce(np.array([[2.75, 11.0]]), final=True)
+    assert np.allclose(rows, [[2.5, (8 + 9 + 11) / 3]])
+    assert decimator.reduce(None).size == 0
+
+
+def test_decimator_aggregates():
+    decimator = mpptlib.Decimator(2.0, aggregates=True)
+    block = np.column_stack((np.arange(4.0), [1.0, 3.0, -2.0, 6.0],
+                             [0.0, 0.0, 1.0, 1.0]))
+    rows = decimator.reduce(block, final=True)
+
+    # Mean columns, then the minimum and maximum of every column but time,
+    # then the number of samples
+    assert np.allclose(rows, [[1, 2, 0, 1, 0, 3, 0, 2],
+                              [3, 2, 1, -2, 1, 6, 1, 2]])
+    header = decimator.header('Time (s)\tV\tI (A)')
+    assert len(header.split('\t')) == rows.shape[1]
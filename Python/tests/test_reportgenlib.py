@@ -0,0 +1,205 @@
+# Tests of the report generation library.
+
+import importlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import reportgenlib as rgl
+
+PLOT_MODULE = """
+def helper(x):
+    return x + {}
+
+
+def plot(image_path, data=None):
+    return helper(1)
+"""
+
+
+def write_plot_module(tmpdir, offset):
+    # Write a module with a plotting function that calls a helper
+    tmpdir.join('plotmodule.py').write(PLOT_MODULE.format(offset))
+
+
+@pytest.fixture
+def plotmodule(tmpdir):
+    # Import the module written by write_plot_module, and remove it again
+    # after the test
+    write_plot_module(tmpdir, 0)
+    sys.path.insert(0, str(tmpdir))
+    try:
+        yield importlib.import_module('plotmodule')
+    finally:
+        sys.path.remove(str(tmpdir))
+        sys.modules.pop('plotmodule', None)
+
+
+def test_task_key_hashes_dataframe_kwargs_by_contents(plotmodule):
+    figures = rgl.ReportFigures()
+    data = pd.DataFrame({'Label': ['a', 'b'], 'PCE': [1.0, 2.0]})
+
+    def key(data):
+        return figures.task_key(('x.png', plotmodule.plot, (), {
+            'data': data
+        }))
+
+    assert key(data) == key(data.copy())
+    changed = data.copy()
+    changed.loc[1, 'PCE'] = 3.0
+    assert key(data) != key(changed)
+
+
+def test_task_key_changes_with_helpers_and_version(plotmodule, tmpdir,
+                                                   monkeypatch):
+    task = ('x.png', plotmodule.plot, (1, ), {})
+    key = rgl.ReportFigures().task_key(task)
+
+    # Changing a helper of the plotting function changes the key
+    write_plot_module(tmpdir, 1)
+    plotmodule = importlib.reload(plotmodule)
+    task = ('x.png', plotmodule.plot, (1, ), {})
+    new_key = rgl.ReportFigures().task_key(task)
+    assert new_key != key
+
+    # So does the version of the figures
+    monkeypatch.setattr(rgl, 'FIGURE_CACHE_VERSION',
+                        rgl.FIGURE_CACHE_VERSION + 1)
+    assert rgl.ReportFigures().task_key(task) != new_key
+
+
+def write_data_files(tmpdir, count, offset=0):
+    # Write data files of 100 rows of 4 columns, and return their paths and
+    # the arrays in them
+    paths = []
+    arrays = []
+    for i in range(count):
+        data = np.arange(400, dtype=float).reshape(100, 4) + i + offset
+        path = str(tmpdir.join('data' + str(i) + '.txt'))
+        np.savetxt(path, data, delimiter='\t')
+        paths.append(path)
+        arrays.append(data)
+    return paths, arrays
+
+
+def test_sidecar_store_bounds_memory_on_a_cold_cache(tmpdir):
+    folder = str(tmpdir.join('Cache'))
+    paths, arrays = write_data_files(tmpdir, 20)
+    nbytes = arrays[0].nbytes
+
+    # Parsed arrays are written out in batches as they are added, so the
+    # cache and the store together hold about their limits
+    store = rgl.SidecarStore(folder, batch_bytes=4 * nbytes)
+    cache = rgl.DataCache(max_bytes=4 * nbytes, store=store)
+    for path in paths:
+        cache.load(path)
+        assert cache.nbytes + store.pending_bytes <= 8 * nbytes
+    assert len(os.listdir(folder)) == 4
+    store.save()
+
+    # A new store reads every array back from the batches
+    store = rgl.SidecarStore(folder, batch_bytes=4 * nbytes)
+    for path, data in zip(paths, arrays):
+        assert np.array_equal(store.get(path), data)
+
+    # Batches whose files have all changed are deleted
+    paths, arrays = write_data_files(tmpdir, 10, offset=1)
+    for path, data in zip(paths, arrays):
+        os.utime(path, (1, 1))
+        assert store.get(path) is None
+        store.put(path, data)
+    store.save()
+    assert len(os.listdir(folder)) == 4
+    store = rgl.SidecarStore(folder)
+    for path, data in zip(paths, arrays):
+        assert np.array_equal(store.get(path), data)
+
+
+def baseline_boxplotdata(data):
+    # Build boxplot data the way the report script did before boxplotdata
+    # kept each parameter in one array: a list of series per variable and
+    # value, with the series of the Control variable appended to every other
+    # variable and the Control variable then left out
+    boxplotdata = {'var_names': [], 'names_var': []}
+    for parameter in rgl.BOXPLOT_PARAMETERS:
+        boxplotdata[parameter + '_var'] = []
+    for variable, group in data.groupby('Variable'):
+        boxplotdata['var_names'].append(variable)
+        boxplotdata['names_var'].append([])
+        for parameter in rgl.BOXPLOT_PARAMETERS:
+            boxplotdata[parameter + '_var'].append([])
+        for value, group in group.groupby('Value'):
+            boxplotdata['names_var'][-1].append(value)
+            for parameter, column in rgl.BOXPLOT_PARAMETERS.items():
+                boxplotdata[parameter + '_var'][-1].append(
+                    np.array(group[column]))
+    keys = ['names_var'] + [p + '_var' for p in rgl.BOXPLOT_PARAMETERS]
+    if 'Control' in boxplotdata['var_names']:
+        j = boxplotdata['var_names'].index('Control')
+        for key in ['var_names'] + keys:
+            control = boxplotdata[key].pop(j)
+            if key != 'var_names':
+                for series in boxplotdata[key]:
+                    series.extend(control)
+    return boxplotdata
+
+
+def boxplot_rows(values, direction):
+    # Return filtered log rows of one scan direction, with a row for each
+    # (variable, value, number of pixels) and parameters that differ between
+    # rows, with text values like a log file with a control read by pandas
+    rows = []
+    for variable, value, count in values:
+        for i in range(count):
+            x = len(rows) + (0.5 if direction == 'LH' else 0)
+            rows.append([variable, value, 'S' + str(len(rows)), 20 + x,
+                         1 + x, 0.7 + x, 10 + x, 5 + x, 1000 + x])
+    return pd.DataFrame(rows, columns=['Variable', 'Value', 'Label', 'Jsc',
+                                       'Voc', 'FF', 'PCE', 'Rs_grad',
+                                       'Rsh_grad'])
+
+
+def test_boxplotdata_matches_the_baseline_series():
+    # Two variables and a control in both scan directions, where value
+    # '300' of Thickness only has pixels working in the HL direction and
+    # one row has no value
+    values = [('Thickness', '200', 2), ('Anneal', '150', 1),
+              ('Control', 'Control', 2), ('Thickness', '100', 3),
+              ('Anneal', '120', 2), ('Thickness', None, 1)]
+    data = {'HL': boxplot_rows(values + [('Thickness', '300', 2)], 'HL'),
+            'LH': boxplot_rows(values, 'LH')}
+
+    for direction, rows in data.items():
+        expected = baseline_boxplotdata(rows)
+
+        # The same series with plain and categorical columns, like the
+        # columns of log files loaded by the report pipeline
+        categorical = rows.copy()
+        for column in ['Variable', 'Value', 'Label']:
+            categorical[column] = categorical[column].astype('category')
+        for frame in [rows, categorical]:
+            boxplotdata = rgl.boxplotdata(frame)
+            assert boxplotdata['var_names'] == expected['var_names']
+            for i in range(len(expected['var_names'])):
+                for parameter in rgl.BOXPLOT_PARAMETERS:
+                    subset = rgl.boxplotdata_subset(boxplotdata, i,
+                                                    parameter)
+                    assert subset['var_names'] == [
+                        expected['var_names'][i]]
+                    assert subset['names_var'] == [
+                        expected['names_var'][i]]
+                    series = subset[parameter + '_var'][0]
+                    expected_series = expected[parameter + '_var'][i]
+                    assert len(series) == len(expected_series)
+                    for a, b in zip(series, expected_series):
+                        assert np.array_equal(a, b)
+
+    # The control is added to the end of every variable, and the value
+    # missing from the LH scans is only in the HL series
+    assert rgl.boxplotdata(data['HL'])['names_var'] == [
+        ['120', '150', 'Control'], ['100', '200', '300', 'Control']]
+    assert rgl.boxplotdata(data['LH'])['names_var'] == [
+        ['120', '150', 'Control'], ['100', '200', 'Control']]
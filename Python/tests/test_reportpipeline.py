@@ -0,0 +1,148 @@
+# Tests of the stages of the report pipeline that work on the J-V log.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import reportgenlib as rgl
+import reportpipeline
+import synthexp
+
+# Pixels of a J-V log, as (Label, Value, Pixel, working scan directions).
+# Substrates A and B have Thickness 100 and C has 200. A2 and C2 never work
+# and C1 only works in the HL direction.
+PIXELS = [('A', 100, 1, ['HL', 'LH']), ('A', 100, 2, []),
+          ('B', 100, 1, ['HL', 'LH']), ('B', 100, 2, ['HL', 'LH']),
+          ('C', 200, 1, ['HL']), ('C', 200, 2, [])]
+
+
+def jv_data(pixels=PIXELS):
+    # Return J-V data with a light scan in each direction and a dark scan of
+    # every pixel, with categorical columns like reportpipeline.load_logs
+    rows = []
+    for label, value, pixel, directions in pixels:
+        for direction, PCE in [('HL', 10.0 + pixel), ('LH', 9.0 + pixel)]:
+            FF = 0.7 if direction in directions else 0.05
+            rows.append([label, pixel, 'Light', 'Thickness', value, 'A',
+                         20.0, 1.0, PCE, FF, direction])
+        rows.append([label, pixel, 'Dark', 'Thickness', value, 'A', 0.0,
+                     0.0, 0.0, 0.0, 'LH'])
+    data = pd.DataFrame(rows,
+                        columns=['Label', 'Pixel', 'Condition', 'Variable',
+                                 'Value', 'Position', 'Jsc', 'Voc', 'PCE',
+                                 'FF', 'Scan_direction'])
+    for column in reportpipeline.JV_LOG_CATEGORIES:
+        data[column] = data[column].astype('category')
+
+    # A category without any rows, like a label only in the dark
+    data['Label'] = data['Label'].cat.add_categories(['D'])
+    return data
+
+
+@pytest.fixture
+def pipeline(tmpdir):
+    return reportpipeline.ReportPipeline(str(tmpdir) + '/', 'LOG.txt')
+
+
+def test_load_logs(tmpdir):
+    folder, log_file_name, weather_log = synthexp.write_experiment(
+        str(tmpdir), substrates=2, pixels=2, scans=2, points=21, variables=1,
+        jt_points=10, mppt_points=10, eqe_points=5, weather_days=1)
+    log_file = folder + 'J-V/' + log_file_name
+    expected = pd.read_csv(log_file, delimiter='\t')
+    data = reportpipeline.ReportPipeline(folder, log_file_name,
+                                         weather_log=weather_log).load_logs()
+    data = data['jv']
+
+    # The rows of the log in order, with categorical columns and the scan
+    # number of each data file
+    assert list(data.columns) == reportpipeline.JV_LOG_USECOLS
+    for column in reportpipeline.JV_LOG_CATEGORIES:
+        assert data[column].dtype.name == 'category'
+    assert list(data['Label']) == list(expected['Label'])
+    assert np.allclose(data['PCE'], expected['PCE'])
+    assert list(data['scan_num']) == ([0] * 4 + [1] * 4) * 4
+
+    # A row appended to the log is read by the next run
+    row = expected.iloc[-1].astype(str).tolist()
+    row[0] = 'S9'
+    with open(log_file, 'a') as f:
+        f.write('\t'.join(row) + '\n')
+    data = reportpipeline.ReportPipeline(folder, log_file_name,
+                                         weather_log=weather_log).load_logs()
+    data = data['jv']
+    assert len(data) == len(expected) + 1
+    assert data['Label'].iloc[-1] == 'S9'
+
+
+def test_compute_yields(pipeline):
+    filtered = pipeline.filter_data(jv_data())
+    yields = pipeline.compute_yields(filtered)
+
+    # Working pixels are those working in both scan directions, and values
+    # and labels without any get a yield of zero
+    assert yields['variables'] == ['Thickness']
+    assert yields['names_yield_var'] == [[100, 200]]
+    assert np.allclose(yields['yields_var'], [[75, 0]])
+    assert yields['names_yield_var_lab'] == [['A', 'B', 'C']]
+    assert np.allclose(yields['yields_var_lab'], [[50, 100, 0]])
+
+
+def pixels(data):
+    # Return the (Label, Pixel) pairs of the rows of data in order
+    return list(zip(data['Label'], data['Pixel']))
+
+
+def test_filter_data(pipeline):
+    # A second working HL scan of B1, worse than the first
+    data = jv_data()
+    extra = data.iloc[[6]].copy()
+    extra['PCE'] = 5.0
+    data = pd.concat([data, extra], ignore_index=True)
+    filtered = pipeline.filter_data(data)
+
+    # Sorted by PCE within each pixel
+    sorted_data = filtered['sorted_data']
+    assert len(sorted_data) == len(data)
+    assert list(sorted_data['PCE'].iloc[:3]) == [11.0, 10.0, 0.0]
+
+    # Every working scan of the pixels working in both directions
+    working = filtered['working_data']
+    assert pixels(working) == [('A', 1)] * 2 + [('B', 1)] * 3 + [('B', 2)] * 2
+    assert list(working['PCE'].iloc[2:5]) == [11.0, 10.0, 5.0]
+
+    # The best scan of every working pixel, including those only working in
+    # one direction, and the best scan in each direction of the others
+    assert pixels(filtered['filtered_data']) == [('A', 1), ('B', 1),
+                                                 ('B', 2), ('C', 1)]
+    for direction, PCE in [('HL', [11.0, 11.0, 12.0]),
+                           ('LH', [10.0, 10.0, 11.0])]:
+        best = filtered['filtered_data_' + direction]
+        assert pixels(best) == [('A', 1), ('B', 1), ('B', 2)]
+        assert list(best['PCE']) == PCE
+        assert set(best['Scan_direction']) == {direction}
+
+
+def test_add_repeat_scans(pipeline, tmpdir):
+    # Pixel A1 was scanned twice, and B1 once by a file without a scan number
+    rows = []
+    for label, scans in [('A', [0, 1]), ('B', [np.nan])]:
+        for scan in scans:
+            for direction in ['HL', 'LH']:
+                path = str(tmpdir.join(label + str(scan) + direction + '.txt'))
+                np.savetxt(path, [[0.0, -20.0], [1.0, 5.0]], delimiter='\t')
+                rows.append([label, 1, 'Thickness', 100, scan, direction,
+                             path, 0.1, 20.0])
+    working_data = pd.DataFrame(rows, columns=[
+        'Label', 'Pixel', 'Variable', 'Value', 'scan_num', 'Scan_direction',
+        'File_Path', 'Scan_rate', 'Jsc'
+    ])
+
+    # Only the pixel with repeat scans gets a figure, with a curve per scan
+    figures = rgl.ReportFigures()
+    pipeline.add_repeat_scans(figures, {'working_data': working_data})
+    assert len(figures.tasks) == 1
+    image_path, function, args, kwargs = figures.tasks[0]
+    assert image_path.endswith('jv_repeats_A_Thickness_100_1.png')
+    assert [curve[0] for curve in args[2]] == ['0.0, 0.1 V/s',
+                                               '1.0, 0.1 V/s']